@@ -0,0 +1,182 @@
+#!/usr/bin/python
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_bailout.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# contingency card: the plan with each travel or deco gas lost, and with a deeper and longer bottom
+#
+# usage: python pydplan_bailout.py --depth 45 --time 25 [--gf 30/80] [--tanks JSON] [-o text]
+#
+# each scenario is a plan definition like in the batch planner, and the scenarios are calculated with
+# planOne() of pydplan_cli.py in a pool of worker processes. the results are printed side by side.
+import argparse
+import copy
+import json
+import os
+import sys
+from functools import partial
+from multiprocessing import Pool
+
+from pydplan_classes import ModelEngine, TankType
+from pydplan_cli import planOne
+from pydplan_core import newPlan
+
+# tanks that can be lost, the bottom gas is always breathed
+LOST_TANKS = (TankType.TRAVEL, TankType.DECO1, TankType.DECO2)
+# the bottom phase of the extended scenarios is this much deeper and longer
+EXTRA_DEPTH = 3.0
+EXTRA_TIME = 3.0
+# ScubaTank attributes copied from a DivePlan into the plan definitions
+TANK_SETTINGS = ('use', 'o2', 'he', 'changeDepth', 'liters', 'bar', 'SAC', 'ppo2max')
+
+
+def planRecord(diveplan):
+    '''
+    a plan definition like in the batch planner input, with the settings of a DivePlan
+
+    :param diveplan: the dive plan, like the one of the GUI
+    :type diveplan: DivePlan
+    :return: depth and time in meters and minutes, GF, rates in m/min and all tanks
+    :rtype: dict
+    '''
+    tanks = {}
+    for iTank, tank in diveplan.tankList.items():
+        tanks[iTank.name] = {setting: getattr(tank, setting) for setting in TANK_SETTINGS}
+    return {'depth': diveplan.bottomDepth, 'time': diveplan.bottomTime / 60.0,
+            'gflow': diveplan.GFlow, 'gfhigh': diveplan.GFhigh,
+            'descent': diveplan.descRate * 60.0, 'asctodeco': diveplan.ascRateToDeco * 60.0,
+            'ascatdeco': diveplan.ascRateAtDeco * 60.0, 'asctosurface': diveplan.ascRateToSurface * 60.0,
+            'tanks': tanks}
+
+
+def scenarioRecords(record):
+    '''
+    the contingency scenarios of a plan: the plan itself, then for each used travel or deco tank the plan
+    without it, each also with the bottom EXTRA_DEPTH deeper and EXTRA_TIME longer
+
+    :param record: plan definition like in the batch planner input
+    :type record: dict
+    :return: (label, plan definition) of each scenario
+    :rtype: list
+    '''
+    reference = newPlan(record['depth'], record['time'], tanks=record.get('tanks'))
+    losses = [(None, 'plan')]
+    for iTank in LOST_TANKS:
+        tank = reference.tankList[iTank]
+        if tank.use:
+            losses.append((iTank, 'lost {}'.format(tank.name)))
+    scenarios = []
+    for iTank, label in losses:
+        lost = copy.deepcopy(record)
+        if iTank is not None:
+            lost.setdefault('tanks', {}).setdefault(iTank.name, {})['use'] = False
+        scenarios.append((label, lost))
+        extended = copy.deepcopy(lost)
+        extended['depth'] = record['depth'] + EXTRA_DEPTH
+        extended['time'] = record['time'] + EXTRA_TIME
+        scenarios.append(('{} +{:g}m +{:g}min'.format(label, EXTRA_DEPTH, EXTRA_TIME), extended))
+    return scenarios
+
+
+class BailoutCard():
+    """
+    results of the contingency scenarios of one plan, in the order of scenarioRecords()
+    """
+    def __init__(self, labels, results):
+        '''
+        :param labels: name of each scenario
+        :type labels: list
+        :param results: planSummary() of each scenario, or {'error': message}
+        :type results: list
+        '''
+        self.labels = list(labels)
+        self.results = list(results)
+
+    def writeJsonl(self, outFile):
+        for label, result in zip(self.labels, self.results):
+            outFile.write(json.dumps(dict(result, scenario=label)) + '\n')
+
+    def writeText(self, outFile):
+        '''
+        the scenarios side by side, one column each
+        '''
+        tankNames = []
+        for result in self.results:
+            for name in result.get('tanks', {}):
+                if name not in tankNames:
+                    tankNames.append(name)
+        rows = [('runtime min', lambda r: '{:.0f}'.format(r['runtime'])),
+                ('first stop m', lambda r: '{:.0f}'.format(r['stops'][0]['depth']) if r['stops'] else '-'),
+                ('deco min', lambda r: '{:.0f}'.format(sum(stop['time'] for stop in r['stops'])))]
+        for name in tankNames:
+            rows.append(('{} bar'.format(name),
+                         lambda r, name=name: '{:.0f}'.format(r['tanks'][name]) if name in r['tanks'] else '-'))
+        rows.append(('max ppO2', lambda r: '{:.2f}'.format(r['maxPPoxygen'])))
+
+        widths = [len(label) + 2 for label in self.labels]
+        outFile.write('{:<14}'.format('') +
+                      ''.join('{:>{}}'.format(label, width) for label, width in zip(self.labels, widths)) + '\n')
+        for title, cell in rows:
+            outFile.write('{:<14}'.format(title) +
+                          ''.join('{:>{}}'.format('error' if 'error' in result else cell(result), width)
+                                  for result, width in zip(self.results, widths)) + '\n')
+        for label, result in zip(self.labels, self.results):
+            if 'error' in result:
+                outFile.write('{}: {}\n'.format(label, result['error']))
+
+
+def bailoutCard(record, workers = 1, chunksize = 1, engine = ModelEngine.Lazy.value):
+    '''
+    calculate all contingency scenarios of a plan
+
+    :param record: plan definition like in the batch planner input, see planRecord() for a DivePlan
+    :type record: dict
+    :param workers: number of worker processes, 1 calculates in this process
+    :type workers: int
+    :param chunksize: number of scenarios sent to a worker at a time
+    :type chunksize: int
+    :param engine: ModelEngine value
+    :type engine: int
+    :return: the card
+    :rtype: BailoutCard
+    '''
+    scenarios = scenarioRecords(record)
+    jobs = list(enumerate(lost for label, lost in scenarios))
+    plan = partial(planOne, engine=engine)
+    if workers > 1:
+        with Pool(min(workers, len(jobs))) as pool:
+            results = pool.map(plan, jobs, chunksize=max(chunksize, 1))
+    else:
+        results = list(map(plan, jobs))
+    for result in results:
+        result.pop('id', None)
+    return BailoutCard([label for label, lost in scenarios], results)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='PYDPLAN lost gas contingency card')
+    parser.add_argument('--depth', type=float, required=True, help='bottom depth in meters')
+    parser.add_argument('--time', type=float, required=True, help='bottom time in minutes')
+    parser.add_argument('--gf', default='30/80', help='GF pair as low/high in percent')
+    parser.add_argument('--tanks', default=None,
+                        help='JSON of changes to the default tanks, like {"TRAVEL": {"use": true}}')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('-o', '--output-format', choices=['text', 'jsonl'], default='text',
+                        help='text prints the scenarios side by side, jsonl one line per scenario')
+    args = parser.parse_args(argv)
+
+    GFlow, GFhigh = (float(x) / 100.0 for x in args.gf.split('/'))
+    record = {'depth': args.depth, 'time': args.time, 'gflow': GFlow, 'gfhigh': GFhigh}
+    if args.tanks:
+        record['tanks'] = json.loads(args.tanks)
+    try:
+        card = bailoutCard(record, workers=args.workers)
+    except ValueError as error:
+        parser.exit(1, '{}\n'.format(error))
+    if args.output_format == 'jsonl':
+        card.writeJsonl(sys.stdout)
+    else:
+        card.writeText(sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_batchmodel.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# batched Bühlmann kernel, advances N independent dive plans at once
+#
+# the tissue state of N plans is stored as (N plans x 16 compartments) NumPy arrays,
+# each segment has its own begin/end depth, duration and gas fractions per plan.
+# one call of ModelBatch.advance() replaces N calls of ModelPoint.calculateAllTissuesDepth()
+import numpy as np
+
+from pydplan_buhlmann import Constants, modelTable
+from pydplan_vector import ModelPointVector, coefficientArrays
+from pydplan_expcache import decayFactors
+
+
+class ModelBatch():
+    """
+    Buhlmann model state of N dive plans, 16 tissue compartments each
+    """
+    COMPS = 16
+
+    def __init__(self, plans, modelUsed = None, modelName = 'ZHL16c'):
+        '''
+        :param plans: number of plans N calculated together
+        :type plans: int
+        :param modelUsed: the model coefficients list, one tcCoefficients object per compartment,
+                          if None then taken from modelTable(modelName)
+        :type modelUsed: Buhlmann.model
+        :param modelName: name of the model variant, like 'ZHL16c'
+        :type modelName: str
+        '''
+        if modelUsed is None:
+            modelUsed = modelTable(modelName).modelUsed
+        self.plans = plans
+        self.modelUsed = modelUsed
+        self.modelName = modelName
+        self.coefficients = coefficientArrays(modelUsed)
+        self.waterVapor = Constants.WaterVaporSurface
+
+        self.heliumPressure = np.zeros((plans, self.COMPS))
+        self.nitrogenPressure = np.zeros((plans, self.COMPS))
+        self.ambient = np.full(plans, Constants.surfacePressure)
+        self.depth = np.zeros(plans)
+        self.runtime = np.zeros(plans) # in minutes
+        # plans that are still calculated, surfaced plans are masked out
+        self.active = np.ones(plans, dtype=bool)
+
+    def initSurface(self):
+        '''
+        all plans start saturated at surface, like ModelPoint.initSurface()
+        '''
+        self.heliumPressure[:] = 0.0
+        self.nitrogenPressure[:] = Constants.initN2
+        self.ambient[:] = Constants.surfacePressure
+        self.depth[:] = 0.0
+        self.runtime[:] = 0.0
+        self.active[:] = True
+
+    def setModelPoint(self, plan, model):
+        '''
+        copy the state of one ModelPoint or ModelPointVector into the batch
+        :param plan: index of the plan in the batch
+        :type plan: int
+        :param model: the model state to copy
+        :type model: ModelPoint
+        '''
+        if isinstance(model, ModelPointVector):
+            self.heliumPressure[plan] = model.heliumPressure
+            self.nitrogenPressure[plan] = model.nitrogenPressure
+        else:
+            self.heliumPressure[plan] = [comp.heliumPressure for comp in model.tissues]
+            self.nitrogenPressure[plan] = [comp.nitrogenPressure for comp in model.tissues]
+        self.ambient[plan] = model.ambient
+
+    def modelPoint(self, plan, gfNow = 1.0):
+        '''
+        build a ModelPointVector of one plan in the batch, with its ceilings for gfNow
+        :param plan: index of the plan in the batch
+        :type plan: int
+        :param gfNow: gradient factor for the ceilings
+        :type gfNow: float
+        :return: the model state of the plan
+        :rtype: ModelPointVector
+        '''
+        point = ModelPointVector(self.modelName)
+        point.coefficients = self.coefficients
+        point.setNewPressures(heliumPressure=self.heliumPressure[plan].copy(),
+                              nitrogenPressure=self.nitrogenPressure[plan].copy())
+        point.ambient = float(self.ambient[plan])
+        point.gfNow = gfNow
+        point.ambTolP = point.ambient / point.HeliumNitrogenB + point.HeliumNitrogenA
+        ceilings = (point.get_max_amb(gfNow) - Constants.surfacePressure) * 10.0
+        point.ceilings = ceilings.tolist()
+        point.leadTissue = int(np.argmax(ceilings))
+        point.leadCeilingMeters = point.ceilings[point.leadTissue]
+        point.leadMaxAmbBars = point.leadCeilingMeters / 10.0
+        point.leadCeilingStop = int(np.ceil(point.leadCeilingMeters / 3.0) * 3.0)
+        point.maxNitrogenPressure = float(point.nitrogenPressure.max())
+        point.maxHeliumPressure = float(point.heliumPressure.max())
+        return point
+
+    def advance(self, beginDepth, endDepth, intervalMinutes, heliumFraction, nitrogenFraction):
+        '''
+        calculate one segment for all active plans, same equations as ModelPoint.calculateAllTissues()
+        all arguments are either scalars, or arrays with one value per plan
+        :param beginDepth: depth in meters at begin of the segment
+        :type beginDepth: numpy.ndarray
+        :param endDepth: depth in meters at end of the segment
+        :type endDepth: numpy.ndarray
+        :param intervalMinutes: minutes of exposure of the segment
+        :type intervalMinutes: numpy.ndarray
+        :param heliumFraction: fraction of Helium, 1.0 = 100%, 0.0 = no helium
+        :type heliumFraction: numpy.ndarray
+        :param nitrogenFraction: fraction of Nitrogen
+        :type nitrogenFraction: numpy.ndarray
+        :return: nothing
+        :rtype: None
+        '''
+        c = self.coefficients
+        shape = (self.plans,)
+        beginDepth = np.broadcast_to(np.asarray(beginDepth, dtype=float), shape)
+        endDepth = np.broadcast_to(np.asarray(endDepth, dtype=float), shape)
+        minutes = np.broadcast_to(np.asarray(intervalMinutes, dtype=float), shape)
+        heliumFraction = np.broadcast_to(np.asarray(heliumFraction, dtype=float), shape)
+        nitrogenFraction = np.broadcast_to(np.asarray(nitrogenFraction, dtype=float), shape)
+
+        # surfaced plans and zero length segments are not calculated
+        run = self.active & (minutes > 0.0)
+        beginPressure = Constants.surfacePressure + beginDepth / 10.0
+        endPressure = Constants.surfacePressure + endDepth / 10.0
+        heliumInspired = ((beginPressure - self.waterVapor) * heliumFraction)[:, None]
+        nitrogenInspired = ((beginPressure - self.waterVapor) * nitrogenFraction)[:, None]
+        barPerMin = np.where(run, (endPressure - beginPressure) / np.where(run, minutes, 1.0), 0.0)
+        heliumRate = (barPerMin * heliumFraction)[:, None]
+        nitrogenRate = (barPerMin * nitrogenFraction)[:, None]
+        t = minutes[:, None]
+
+        # the plans usually have only a few different segment lengths, the factors come from the shared cache
+        expHe = decayFactors.rows(c, 'He', minutes)
+        expN2 = decayFactors.rows(c, 'N2', minutes)
+        # Schreiner equation for the plans changing depth, Haldane for plans at constant depth
+        schreiner = ((heliumRate != 0) | (nitrogenRate != 0))
+        heliumNew = np.where(schreiner,
+                             heliumInspired + heliumRate * (t - 1.0 / c.HeliumK) -
+                             (heliumInspired - self.heliumPressure - heliumRate / c.HeliumK) * expHe,
+                             self.heliumPressure + (heliumInspired - self.heliumPressure) * (1.0 - expHe))
+        nitrogenNew = np.where(schreiner,
+                               nitrogenInspired + nitrogenRate * (t - 1.0 / c.NitrogenK) -
+                               (nitrogenInspired - self.nitrogenPressure - nitrogenRate / c.NitrogenK) * expN2,
+                               self.nitrogenPressure + (nitrogenInspired - self.nitrogenPressure) * (1.0 - expN2))
+
+        rows = run[:, None]
+        self.heliumPressure = np.where(rows, heliumNew, self.heliumPressure)
+        self.nitrogenPressure = np.where(rows, nitrogenNew, self.nitrogenPressure)
+        self.ambient = np.where(run, endPressure, self.ambient)
+        self.depth = np.where(run, endDepth, self.depth)
+        self.runtime = np.where(run, self.runtime + minutes, self.runtime)
+        # a plan that came up to the surface is done, mask it out
+        self.active = self.active & ~(run & (beginDepth > 0.0) & (endDepth <= 0.0))
+
+    def advanceSegments(self, beginDepths, endDepths, intervalMinutes, heliumFractions, nitrogenFractions):
+        '''
+        calculate S segments one after another, arguments have shape (S, N), or broadcast to it
+        '''
+        beginDepths = np.atleast_1d(beginDepths)
+        for s in range(len(beginDepths)):
+            self.advance(beginDepths[s], np.atleast_1d(endDepths)[s], np.atleast_1d(intervalMinutes)[s],
+                         np.atleast_1d(heliumFractions)[s], np.atleast_1d(nitrogenFractions)[s])
+
+    def deactivate(self, mask):
+        '''
+        mask out plans that should not be calculated anymore
+        :param mask: True for each plan to mask out
+        :type mask: numpy.ndarray
+        '''
+        self.active = self.active & ~np.asarray(mask, dtype=bool)
+
+    def HeliumNitrogenAB(self):
+        '''
+        :return: combined Helium-Nitrogen A and B coefficients, (N, 16) arrays each
+        :rtype: tuple
+        '''
+        c = self.coefficients
+        total = self.heliumPressure + self.nitrogenPressure
+        a = (c.HeliumA * self.heliumPressure + c.NitrogenA * self.nitrogenPressure) / total
+        b = (c.HeliumB * self.heliumPressure + c.NitrogenB * self.nitrogenPressure) / total
+        return a, b
+
+    def get_max_amb(self, gf):
+        '''
+        :param gf: gradient factor, scalar or one per plan
+        :type gf: numpy.ndarray
+        :return: tolerated ambient pressures, (N, 16) array
+        :rtype: numpy.ndarray
+        '''
+        gf = np.broadcast_to(np.asarray(gf, dtype=float), (self.plans,))[:, None]
+        a, b = self.HeliumNitrogenAB()
+        return ((self.heliumPressure + self.nitrogenPressure) - a * gf) / (gf / b - gf + 1.0)
+
+    def ceilings(self, gf):
+        '''
+        :return: ceiling depths in meters of all compartments of all plans, (N, 16) array
+        :rtype: numpy.ndarray
+        '''
+        return (self.get_max_amb(gf) - Constants.surfacePressure) * 10.0
+
+    def leadCeiling(self, gf):
+        '''
+        :return: leading tissue, its ceiling in meters and the ceiling rounded to a 3 m stop, one per plan
+        :rtype: tuple
+        '''
+        ceilings = self.ceilings(gf)
+        leadTissue = np.argmax(ceilings, axis=1)
+        leadCeilingMeters = ceilings[np.arange(self.plans), leadTissue]
+        leadCeilingStop = (np.ceil(leadCeilingMeters / 3.0) * 3.0).astype(int)
+        return leadTissue, leadCeilingMeters, leadCeilingStop
@@ -6,6 +6,9 @@
 #
 import math
 import copy
+import numpy as np
+
+from pydplan_expcache import decayFactors
 
 
 class Constants ():
@@ -24,221 +27,15 @@ class Constants ():
     WaterVaporSurface = 0.0627   # decotengu, used in OSTC
     initN2 = 0.745
 
-class Buhlmann():
-    """
-    object that stores all the coefficients for all variants of the Buhlmann decompression models
-    "ZHL16a", "ZHL16b", "ZHL16c"
-    the coefficients are generated by a separate Python script from text copied from source literature
-    """
-    model = dict()
-
-    def __init__(self):
-        self.model = {
-            "ZHL16a": [
-                tcCoefficients(name='1',
-                               NitrogenHT=5.00, HeliumHT=1.88,
-                               NitrogenA=1.1696, NitrogenB=0.5578,
-                               HeliumA=1.6189, HeliumB=0.4770),
-                tcCoefficients(name='2',
-                               NitrogenHT=8.00, HeliumHT=3.02,
-                               NitrogenA=1.0000, NitrogenB=0.6514,
-                               HeliumA=1.3830, HeliumB=0.5747),
-                tcCoefficients(name='3',
-                               NitrogenHT=12.50, HeliumHT=4.72,
-                               NitrogenA=0.8618, NitrogenB=0.7222,
-                               HeliumA=1.1919, HeliumB=0.6527),
-                tcCoefficients(name='4',
-                               NitrogenHT=18.50, HeliumHT=6.99,
-                               NitrogenA=0.7562, NitrogenB=0.7825,
-                               HeliumA=1.0458, HeliumB=0.7223),
-                tcCoefficients(name='5',
-                               NitrogenHT=27.00, HeliumHT=10.21,
-                               NitrogenA=0.6667, NitrogenB=0.8126,
-                               HeliumA=0.9220, HeliumB=0.7582),
-                tcCoefficients(name='6',
-                               NitrogenHT=38.30, HeliumHT=14.48,
-                               NitrogenA=0.5933, NitrogenB=0.8434,
-                               HeliumA=0.8205, HeliumB=0.7957),
-                tcCoefficients(name='7',
-                               NitrogenHT=54.30, HeliumHT=20.53,
-                               NitrogenA=0.5282, NitrogenB=0.8693,
-                               HeliumA=0.7305, HeliumB=0.8279),
-                tcCoefficients(name='8',
-                               NitrogenHT=77.00, HeliumHT=29.11,
-                               NitrogenA=0.4710, NitrogenB=0.8910,
-                               HeliumA=0.6502, HeliumB=0.8553),
-                tcCoefficients(name='9',
-                               NitrogenHT=109.00, HeliumHT=41.20,
-                               NitrogenA=0.4187, NitrogenB=0.9092,
-                               HeliumA=0.5950, HeliumB=0.8757),
-                tcCoefficients(name='10',
-                               NitrogenHT=146.00, HeliumHT=55.19,
-                               NitrogenA=0.3798, NitrogenB=0.9222,
-                               HeliumA=0.5545, HeliumB=0.8903),
-                tcCoefficients(name='11',
-                               NitrogenHT=187.00, HeliumHT=70.69,
-                               NitrogenA=0.3497, NitrogenB=0.9319,
-                               HeliumA=0.5333, HeliumB=0.8997),
-                tcCoefficients(name='12',
-                               NitrogenHT=239.00, HeliumHT=90.34,
-                               NitrogenA=0.3223, NitrogenB=0.9403,
-                               HeliumA=0.5189, HeliumB=0.9073),
-                tcCoefficients(name='13',
-                               NitrogenHT=305.00, HeliumHT=115.29,
-                               NitrogenA=0.2971, NitrogenB=0.9477,
-                               HeliumA=0.5181, HeliumB=0.9122),
-                tcCoefficients(name='14',
-                               NitrogenHT=390.00, HeliumHT=147.42,
-                               NitrogenA=0.2737, NitrogenB=0.9544,
-                               HeliumA=0.5176, HeliumB=0.9171),
-                tcCoefficients(name='15',
-                               NitrogenHT=498.00, HeliumHT=188.24,
-                               NitrogenA=0.2523, NitrogenB=0.9602,
-                               HeliumA=0.5172, HeliumB=0.9217),
-                tcCoefficients(name='16',
-                               NitrogenHT=635.00, HeliumHT=240.03,
-                               NitrogenA=0.2327, NitrogenB=0.9653,
-                               HeliumA=0.5119, HeliumB=0.9267),
-            ],
-            "ZHL16b": [
-                tcCoefficients(name='1',
-                               NitrogenHT=5.00, HeliumHT=1.88,
-                               NitrogenA=1.1696, NitrogenB=0.5578,
-                               HeliumA=1.6189, HeliumB=0.4770),
-                tcCoefficients(name='2',
-                               NitrogenHT=8.00, HeliumHT=3.02,
-                               NitrogenA=1.0000, NitrogenB=0.6514,
-                               HeliumA=1.3830, HeliumB=0.5747),
-                tcCoefficients(name='3',
-                               NitrogenHT=12.50, HeliumHT=4.72,
-                               NitrogenA=0.8618, NitrogenB=0.7222,
-                               HeliumA=1.1919, HeliumB=0.6527),
-                tcCoefficients(name='4',
-                               NitrogenHT=18.50, HeliumHT=6.99,
-                               NitrogenA=0.7562, NitrogenB=0.7825,
-                               HeliumA=1.0458, HeliumB=0.7223),
-                tcCoefficients(name='5',
-                               NitrogenHT=27.00, HeliumHT=10.21,
-                               NitrogenA=0.6667, NitrogenB=0.8126,
-                               HeliumA=0.9220, HeliumB=0.7582),
-                tcCoefficients(name='6',
-                               NitrogenHT=38.30, HeliumHT=14.48,
-                               NitrogenA=0.5600, NitrogenB=0.8434,
-                               HeliumA=0.8205, HeliumB=0.7957),
-                tcCoefficients(name='7',
-                               NitrogenHT=54.30, HeliumHT=20.53,
-                               NitrogenA=0.4947, NitrogenB=0.8693,
-                               HeliumA=0.7305, HeliumB=0.8279),
-                tcCoefficients(name='8',
-                               NitrogenHT=77.00, HeliumHT=29.11,
-                               NitrogenA=0.4500, NitrogenB=0.8910,
-                               HeliumA=0.6502, HeliumB=0.8553),
-                tcCoefficients(name='9',
-                               NitrogenHT=109.00, HeliumHT=41.20,
-                               NitrogenA=0.4187, NitrogenB=0.9092,
-                               HeliumA=0.5950, HeliumB=0.8757),
-                tcCoefficients(name='10',
-                               NitrogenHT=146.00, HeliumHT=55.19,
-                               NitrogenA=0.3798, NitrogenB=0.9222,
-                               HeliumA=0.5545, HeliumB=0.8903),
-                tcCoefficients(name='11',
-                               NitrogenHT=187.00, HeliumHT=70.69,
-                               NitrogenA=0.3497, NitrogenB=0.9319,
-                               HeliumA=0.5333, HeliumB=0.8997),
-                tcCoefficients(name='12',
-                               NitrogenHT=239.00, HeliumHT=90.34,
-                               NitrogenA=0.3223, NitrogenB=0.9403,
-                               HeliumA=0.5189, HeliumB=0.9073),
-                tcCoefficients(name='13',
-                               NitrogenHT=305.00, HeliumHT=115.29,
-                               NitrogenA=0.2850, NitrogenB=0.9477,
-                               HeliumA=0.5181, HeliumB=0.9122),
-                tcCoefficients(name='14',
-                               NitrogenHT=390.00, HeliumHT=147.42,
-                               NitrogenA=0.2737, NitrogenB=0.9544,
-                               HeliumA=0.5176, HeliumB=0.9171),
-                tcCoefficients(name='15',
-                               NitrogenHT=498.00, HeliumHT=188.24,
-                               NitrogenA=0.2523, NitrogenB=0.9602,
-                               HeliumA=0.5172, HeliumB=0.9217),
-                tcCoefficients(name='16',
-                               NitrogenHT=635.00, HeliumHT=240.03,
-                               NitrogenA=0.2327, NitrogenB=0.9653,
-                               HeliumA=0.5119, HeliumB=0.9267),
-            ],
-            "ZHL16c": [
-                tcCoefficients(name='1',
-                               NitrogenHT=5.00, HeliumHT=1.88,
-                               NitrogenA=1.1696, NitrogenB=0.5578,
-                               HeliumA=1.6189, HeliumB=0.4770),
-                tcCoefficients(name='2',
-                               NitrogenHT=8.00, HeliumHT=3.02,
-                               NitrogenA=1.0000, NitrogenB=0.6514,
-                               HeliumA=1.3830, HeliumB=0.5747),
-                tcCoefficients(name='3',
-                               NitrogenHT=12.50, HeliumHT=4.72,
-                               NitrogenA=0.8618, NitrogenB=0.7222,
-                               HeliumA=1.1919, HeliumB=0.6527),
-                tcCoefficients(name='4',
-                               NitrogenHT=18.50, HeliumHT=6.99,
-                               NitrogenA=0.7562, NitrogenB=0.7825,
-                               HeliumA=1.0458, HeliumB=0.7223),
-                tcCoefficients(name='5',
-                               NitrogenHT=27.00, HeliumHT=10.21,
-                               NitrogenA=0.6200, NitrogenB=0.8126,
-                               HeliumA=0.9220, HeliumB=0.7582),
-                tcCoefficients(name='6',
-                               NitrogenHT=38.30, HeliumHT=14.48,
-                               NitrogenA=0.5043, NitrogenB=0.8434,
-                               HeliumA=0.8205, HeliumB=0.7957),
-                tcCoefficients(name='7',
-                               NitrogenHT=54.30, HeliumHT=20.53,
-                               NitrogenA=0.4410, NitrogenB=0.8693,
-                               HeliumA=0.7305, HeliumB=0.8279),
-                tcCoefficients(name='8',
-                               NitrogenHT=77.00, HeliumHT=29.11,
-                               NitrogenA=0.4000, NitrogenB=0.8910,
-                               HeliumA=0.6502, HeliumB=0.8553),
-                tcCoefficients(name='9',
-                               NitrogenHT=109.00, HeliumHT=41.20,
-                               NitrogenA=0.3750, NitrogenB=0.9092,
-                               HeliumA=0.5950, HeliumB=0.8757),
-                tcCoefficients(name='10',
-                               NitrogenHT=146.00, HeliumHT=55.19,
-                               NitrogenA=0.3500, NitrogenB=0.9222,
-                               HeliumA=0.5545, HeliumB=0.8903),
-                tcCoefficients(name='11',
-                               NitrogenHT=187.00, HeliumHT=70.69,
-                               NitrogenA=0.3295, NitrogenB=0.9319,
-                               HeliumA=0.5333, HeliumB=0.8997),
-                tcCoefficients(name='12',
-                               NitrogenHT=239.00, HeliumHT=90.34,
-                               NitrogenA=0.3065, NitrogenB=0.9403,
-                               HeliumA=0.5189, HeliumB=0.9073),
-                tcCoefficients(name='13',
-                               NitrogenHT=305.00, HeliumHT=115.29,
-                               NitrogenA=0.2835, NitrogenB=0.9477,
-                               HeliumA=0.5181, HeliumB=0.9122),
-                tcCoefficients(name='14',
-                               NitrogenHT=390.00, HeliumHT=147.42,
-                               NitrogenA=0.2610, NitrogenB=0.9544,
-                               HeliumA=0.5176, HeliumB=0.9171),
-                tcCoefficients(name='15',
-                               NitrogenHT=498.00, HeliumHT=188.24,
-                               NitrogenA=0.2480, NitrogenB=0.9602,
-                               HeliumA=0.5172, HeliumB=0.9217),
-                tcCoefficients(name='16',
-                               NitrogenHT=635.00, HeliumHT=240.03,
-                               NitrogenA=0.2327, NitrogenB=0.9653,
-                               HeliumA=0.5119, HeliumB=0.9267),
-            ],
-        }
-
 
 class tcCoefficients():
     """
     Object that stores coefficients for one Buhlmann model compartment
     """
+    # no per object __dict__, the 48 objects are shared by all Buhlmann objects
+    __slots__ = ('name', 'NitrogenHT', 'HeliumHT', 'NitrogenA', 'NitrogenB', 'HeliumA', 'HeliumB',
+                 'NitrogenK', 'HeliumK')
+
     def __init__(self, name,
                  NitrogenHT, HeliumHT,  # Nitrogen and Helium half times
                  NitrogenA, NitrogenB,  # a coefficients
@@ -254,6 +51,131 @@ class tcCoefficients():
         self.NitrogenK  = math.log(2) / NitrogenHT
         self.HeliumK    = math.log(2) / HeliumHT
 
+# the coefficients of the Buhlmann decompression model variants, generated by a separate Python script
+# from text copied from source literature. one row per compartment:
+# (NitrogenHT, HeliumHT, NitrogenA, NitrogenB, HeliumA, HeliumB), half times in minutes
+ZHL16_COEFFICIENTS = {
+    "ZHL16a": (
+        (5.00, 1.88, 1.1696, 0.5578, 1.6189, 0.4770),
+        (8.00, 3.02, 1.0000, 0.6514, 1.3830, 0.5747),
+        (12.50, 4.72, 0.8618, 0.7222, 1.1919, 0.6527),
+        (18.50, 6.99, 0.7562, 0.7825, 1.0458, 0.7223),
+        (27.00, 10.21, 0.6667, 0.8126, 0.9220, 0.7582),
+        (38.30, 14.48, 0.5933, 0.8434, 0.8205, 0.7957),
+        (54.30, 20.53, 0.5282, 0.8693, 0.7305, 0.8279),
+        (77.00, 29.11, 0.4710, 0.8910, 0.6502, 0.8553),
+        (109.00, 41.20, 0.4187, 0.9092, 0.5950, 0.8757),
+        (146.00, 55.19, 0.3798, 0.9222, 0.5545, 0.8903),
+        (187.00, 70.69, 0.3497, 0.9319, 0.5333, 0.8997),
+        (239.00, 90.34, 0.3223, 0.9403, 0.5189, 0.9073),
+        (305.00, 115.29, 0.2971, 0.9477, 0.5181, 0.9122),
+        (390.00, 147.42, 0.2737, 0.9544, 0.5176, 0.9171),
+        (498.00, 188.24, 0.2523, 0.9602, 0.5172, 0.9217),
+        (635.00, 240.03, 0.2327, 0.9653, 0.5119, 0.9267),
+    ),
+    "ZHL16b": (
+        (5.00, 1.88, 1.1696, 0.5578, 1.6189, 0.4770),
+        (8.00, 3.02, 1.0000, 0.6514, 1.3830, 0.5747),
+        (12.50, 4.72, 0.8618, 0.7222, 1.1919, 0.6527),
+        (18.50, 6.99, 0.7562, 0.7825, 1.0458, 0.7223),
+        (27.00, 10.21, 0.6667, 0.8126, 0.9220, 0.7582),
+        (38.30, 14.48, 0.5600, 0.8434, 0.8205, 0.7957),
+        (54.30, 20.53, 0.4947, 0.8693, 0.7305, 0.8279),
+        (77.00, 29.11, 0.4500, 0.8910, 0.6502, 0.8553),
+        (109.00, 41.20, 0.4187, 0.9092, 0.5950, 0.8757),
+        (146.00, 55.19, 0.3798, 0.9222, 0.5545, 0.8903),
+        (187.00, 70.69, 0.3497, 0.9319, 0.5333, 0.8997),
+        (239.00, 90.34, 0.3223, 0.9403, 0.5189, 0.9073),
+        (305.00, 115.29, 0.2850, 0.9477, 0.5181, 0.9122),
+        (390.00, 147.42, 0.2737, 0.9544, 0.5176, 0.9171),
+        (498.00, 188.24, 0.2523, 0.9602, 0.5172, 0.9217),
+        (635.00, 240.03, 0.2327, 0.9653, 0.5119, 0.9267),
+    ),
+    "ZHL16c": (
+        (5.00, 1.88, 1.1696, 0.5578, 1.6189, 0.4770),
+        (8.00, 3.02, 1.0000, 0.6514, 1.3830, 0.5747),
+        (12.50, 4.72, 0.8618, 0.7222, 1.1919, 0.6527),
+        (18.50, 6.99, 0.7562, 0.7825, 1.0458, 0.7223),
+        (27.00, 10.21, 0.6200, 0.8126, 0.9220, 0.7582),
+        (38.30, 14.48, 0.5043, 0.8434, 0.8205, 0.7957),
+        (54.30, 20.53, 0.4410, 0.8693, 0.7305, 0.8279),
+        (77.00, 29.11, 0.4000, 0.8910, 0.6502, 0.8553),
+        (109.00, 41.20, 0.3750, 0.9092, 0.5950, 0.8757),
+        (146.00, 55.19, 0.3500, 0.9222, 0.5545, 0.8903),
+        (187.00, 70.69, 0.3295, 0.9319, 0.5333, 0.8997),
+        (239.00, 90.34, 0.3065, 0.9403, 0.5189, 0.9073),
+        (305.00, 115.29, 0.2835, 0.9477, 0.5181, 0.9122),
+        (390.00, 147.42, 0.2610, 0.9544, 0.5176, 0.9171),
+        (498.00, 188.24, 0.2480, 0.9602, 0.5172, 0.9217),
+        (635.00, 240.03, 0.2327, 0.9653, 0.5119, 0.9267),
+    ),
+}
+
+
+class ModelTable():
+    """
+    read-only coefficients of one Buhlmann model variant as 16 element NumPy arrays,
+    built once when the module is imported and shared by all plans
+    """
+    def __init__(self, name, rows):
+        '''
+        :param name: name of the model variant, like 'ZHL16c'
+        :type name: str
+        :param rows: one (NitrogenHT, HeliumHT, NitrogenA, NitrogenB, HeliumA, HeliumB) tuple per compartment
+        :type rows: tuple
+        '''
+        def column(values):
+            array = np.array(values, dtype=float)
+            array.setflags(write=False)
+            return array
+        self.name = name
+        self.NitrogenHT, self.HeliumHT, self.NitrogenA, self.NitrogenB, self.HeliumA, self.HeliumB = \
+            [column(values) for values in zip(*rows)]
+        self.NitrogenK = column(math.log(2) / self.NitrogenHT)
+        self.HeliumK = column(math.log(2) / self.HeliumHT)
+        # the same coefficients as one tcCoefficients object per compartment, used by ModelPoint
+        self.modelUsed = tuple(tcCoefficients(str(index + 1), *row) for index, row in enumerate(rows))
+
+
+# all model variants, by name
+MODEL_TABLES = {name: ModelTable(name, rows) for name, rows in ZHL16_COEFFICIENTS.items()}
+
+
+def modelTable(name):
+    '''
+    :param name: name of the model variant, "ZHL16a", "ZHL16b" or "ZHL16c"
+    :type name: str
+    :return: the coefficient table of the model variant
+    :rtype: ModelTable
+    '''
+    table = MODEL_TABLES.get(name)
+    if table is None:
+        raise ValueError('unknown model {}, use one of {}'.format(name, ', '.join(MODEL_TABLES)))
+    return table
+
+
+def tableOfModel(modelUsed):
+    '''
+    :param modelUsed: a model coefficients list
+    :type modelUsed: Buhlmann.model
+    :return: the shared table the list belongs to, None if it is not one of the module tables
+    :rtype: ModelTable
+    '''
+    for table in MODEL_TABLES.values():
+        if table.modelUsed is modelUsed:
+            return table
+    return None
+
+
+class Buhlmann():
+    """
+    object that stores all the coefficients for all variants of the Buhlmann decompression models
+    "ZHL16a", "ZHL16b", "ZHL16c"
+    the coefficients are in MODEL_TABLES, this is a view of them as one tcCoefficients object per compartment
+    """
+    model = {name: table.modelUsed for name, table in MODEL_TABLES.items()}
+
+
 class ModelPoint():
     """
     object that stores a Buhlmann model state for 16 tissue compartments
@@ -407,10 +329,20 @@ class ModelPoint():
         maxHeliumP_now = 0.0
         maxNitrogenP_now = 0.0
         self.gfNow = gfNow
+        # exp(-k * t) of all compartments from the shared cache, if the model is one of the module tables
+        table = tableOfModel(modelUsed)
+        if table is not None:
+            heliumDecay = decayFactors.get(table, 'He', intervalMinutes).values
+            nitrogenDecay = decayFactors.get(table, 'N2', intervalMinutes).values
         for compartment in self.tissues:
             coefficients: tcCoefficients = modelUsed[compartment.index]
-            compartment.calculateCompartment(coefficients, heliumInspired, nitrogenInspired,
-                                      heliumBarPerMin, nitrogenBarPerMin, intervalMinutes)
+            if table is not None:
+                compartment.calculateCompartment(coefficients, heliumInspired, nitrogenInspired,
+                                          heliumBarPerMin, nitrogenBarPerMin, intervalMinutes,
+                                          heliumDecay[compartment.index], nitrogenDecay[compartment.index])
+            else:
+                compartment.calculateCompartment(coefficients, heliumInspired, nitrogenInspired,
+                                          heliumBarPerMin, nitrogenBarPerMin, intervalMinutes)
             compartment.ambTolP = compartment.ambientToleratedPressure(endAmbientPressure)
 
             # the actual ceiling to use, based on gfNow
@@ -470,6 +402,10 @@ class Compartment():
     '''
     tissue compartment object
     '''
+    # no per object __dict__, 16 of these are created for every model state
+    __slots__ = ('index', 'heliumPressure', 'nitrogenPressure', 'HeliumNitrogenA', 'HeliumNitrogenB',
+                 'mv', 'ambTolP')
+
     def __init__(self, index):
         self.index = index
 
@@ -482,11 +418,6 @@ class Compartment():
         self.mv = 0.0
         self.ambTolP = 0.0
 
-        self.const_exp_const_depth_he = None
-        self.const_exp_const_depth_n2 = None
-        self.old_k_he = None
-        self.old_seg_time = None
-
     def __deepcopy__(self, memo):
         newobj = Compartment(self.index)
 
@@ -497,10 +428,6 @@ class Compartment():
         newobj.HeliumNitrogenB = self.HeliumNitrogenB
         newobj.mv = self.mv
         newobj.ambTolP = self.ambTolP
-        newobj.const_exp_const_depth_he = self.const_exp_const_depth_he
-        newobj.const_exp_const_depth_n2 = self.const_exp_const_depth_n2
-        newobj.old_k_he = self.old_k_he
-        newobj.old_seg_time = self.old_seg_time
         return newobj
 
     ####
@@ -527,7 +454,7 @@ class Compartment():
 
     ####
     def calculateCompartment(self, coefficient, heliumInspired, nitrogenInspired,
-                             heliumRate, nitrogenRate, minutes):
+                             heliumRate, nitrogenRate, minutes, heliumDecay = None, nitrogenDecay = None):
         '''calculate for one tissue compartment the new partial pressures for Nitrogen and Helium
             then store the new values into the compartment
         :param coefficient: coefficients of Buhlmann model to be used
@@ -542,11 +469,19 @@ class Compartment():
         :type nitrogenRate:float
         :param minutes:
         :type minutes:float
+        :param heliumDecay: exp(-HeliumK * minutes) if already known, from the shared factor cache
+        :type heliumDecay:float
+        :param nitrogenDecay: exp(-NitrogenK * minutes) if already known
+        :type nitrogenDecay:float
         :return: does not return anything, calls setNewPressures()
         :rtype: None
         '''
+        if heliumDecay is None:
+            heliumDecay = math.exp(-coefficient.HeliumK * minutes)
+        if nitrogenDecay is None:
+            nitrogenDecay = math.exp(-coefficient.NitrogenK * minutes)
         # first check if we are staying at constant depth or ascending/descending
-        if heliumRate != 0 and nitrogenRate != 0 :
+        if heliumRate != 0 or nitrogenRate != 0 :
             # ascending or descending -> we use Schreiner equation
             # heliumRate, nitrogenRate units are BAR/min
             heliumNewPressure = \
@@ -554,31 +489,28 @@ class Compartment():
                                           constK= coefficient.HeliumK,
                                           gasInspired= heliumInspired,
                                           gasRate= heliumRate,
-                                          minutes= minutes)
+                                          minutes= minutes,
+                                          decay= heliumDecay)
             nitrogenNewPressure = \
                 self.newPressureSchreiner(oldPressure= self.nitrogenPressure,
                                           constK= coefficient.NitrogenK,
                                           gasInspired= nitrogenInspired,
                                           gasRate= nitrogenRate,
-                                          minutes= minutes)
+                                          minutes= minutes,
+                                          decay= nitrogenDecay)
         else:
             # at constant depth -> we use simplified Haldane or the instantaneous equation
-            # we can also reuse the previously calculated component, no need to calculate it again
-            if self.old_seg_time is None or self.old_seg_time != minutes:
-                self.old_seg_time = minutes
-                self.const_exp_const_depth_he = (1 - math.exp(-coefficient.HeliumK   * minutes))
-                self.const_exp_const_depth_n2 = (1 - math.exp(-coefficient.NitrogenK * minutes ))
             heliumNewPressure = \
-                self.heliumPressure + ((heliumInspired - self.heliumPressure) * self.const_exp_const_depth_he)
+                self.heliumPressure + ((heliumInspired - self.heliumPressure) * (1 - heliumDecay))
             nitrogenNewPressure = \
-                self.nitrogenPressure + ((nitrogenInspired - self.nitrogenPressure) * self.const_exp_const_depth_n2)
+                self.nitrogenPressure + ((nitrogenInspired - self.nitrogenPressure) * (1 - nitrogenDecay))
 
         self.setNewPressures(coefficient,
                              heliumPressure= heliumNewPressure,
                              nitrogenPressure= nitrogenNewPressure)
 
 
-    def newPressureSchreiner(self, oldPressure, constK, gasInspired, gasRate, minutes):
+    def newPressureSchreiner(self, oldPressure, constK, gasInspired, gasRate, minutes, decay = None):
         '''Schreiner equation, used when depth is changing
 
         :param oldPressure: the previous partial pressure for the given gas
@@ -591,14 +523,18 @@ class Compartment():
         :type gasRate: float
         :param minutes:
         :type minutes: float
+        :param decay: exp(-constK * minutes) if already known
+        :type decay: float
         :return: the new tissue partial pressure for the given gas
         :rtype: float
         '''
+        if decay is None:
+            decay = math.exp(-constK * minutes)
         pressure = (gasInspired +
                     gasRate * (minutes - (1.0 / constK)) -
                     (gasInspired - oldPressure -
                     (gasRate / constK)) *
-                    math.exp(-constK * minutes))
+                    decay)
         return pressure
 
     def ambientToleratedPressure(self, pressure):
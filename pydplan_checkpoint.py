@@ -0,0 +1,172 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_checkpoint.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# prefix checkpoints for calculatePlan()
+#
+# calculatePlan() saves the tissue, tank and profile state at the end of the descent and at the
+# end of the bottom time. the checkpoints are keyed by the plan inputs that affect the dive up to
+# that point, so when only GF high or a deco gas is changed, the next calculatePlan() resumes from
+# the end of the bottom time instead of calculating the whole dive again from the surface.
+from collections import OrderedDict
+from copy import copy, deepcopy
+
+from pydplan_classes import TankType
+
+# names of the checkpoints, from the longest prefix to the shortest
+PREFIXES = ['bottom', 'descent']
+
+
+def tankKey(tank, full = True):
+    '''
+    :param tank: the tank
+    :type tank: ScubaTank
+    :param full: True if the tank is breathed in the prefix, False if only its use and change depth matter
+    :type full: bool
+    :return: the tank settings that affect the dive prefix, the gas use is calculated after the dive
+             so the size, fill pressure and SAC of the tank are not needed
+    :rtype: tuple
+    '''
+    if full:
+        return (tank.use, tank.o2, tank.he, tank.changeDepth)
+    return (tank.use, tank.changeDepth)
+
+
+def prefixKey(diveplan, prefix):
+    '''
+    key of a checkpoint, contains all inputs that affect the dive up to the checkpoint.
+    GF low is included, because the ceilings stored before the first stop are calculated with it.
+    GF high, ascent rates and deco gases other than their use and change depth are not included,
+    they only affect the dive after the bottom time.
+
+    :param diveplan: the dive plan
+    :type diveplan: DivePlan
+    :param prefix: 'descent' or 'bottom'
+    :type prefix: str
+    :return: the key
+    :rtype: tuple
+    '''
+    tanks = diveplan.tankList
+    key = (prefix, diveplan.engine, diveplan.bottomDepth, diveplan.descTime, diveplan.GFlow,
+           tankKey(tanks[TankType.BOTTOM]), tankKey(tanks[TankType.TRAVEL]),
+           tankKey(tanks[TankType.DECO1], full=False), tankKey(tanks[TankType.DECO2], full=False))
+    if prefix == 'bottom':
+        key += (diveplan.bottomTime,)
+    return key
+
+
+def tankType(diveplan, tank):
+    '''
+    :return: the TankType of a tank in diveplan.tankList, None if tank is None
+    :rtype: TankType
+    '''
+    for iTank, listed in diveplan.tankList.items():
+        if listed is tank:
+            return iTank
+    return None
+
+
+class PlanCheckpoint():
+    """
+    state of calculatePlan() at a phase boundary, everything is copied so that
+    the checkpoint can be restored any number of times
+    """
+    # tank attributes changed by tanksCheck()
+    TANK_STATE = ['pressure', 'useFromTime', 'useFromTime2', 'useUntilTime', 'useUntilTime2']
+    # diveplan attributes updated by calculatePlan()
+    PLAN_STATE = ['changeDepth', 'ascentBegins', 'maxPPoxygen', 'maxPPhelium', 'maxPPnitrogen',
+                  'maxPPanyGas', 'maxTCnitrogen', 'maxTChelium']
+
+    def __init__(self, diveplan, model, trajectory, profile, loopState):
+        '''
+        :param diveplan: the dive plan being calculated
+        :type diveplan: DivePlan
+        :param model: the current model state
+        :type model: ModelPoint
+        :param trajectory: the model states calculated so far
+        :type trajectory: ModelTrajectory
+        :param profile: the DiveProfilePoint objects calculated so far
+        :type profile: list
+        :param loopState: local variables of calculatePlan() needed to continue
+        :type loopState: dict
+        '''
+        self.model = deepcopy(model)
+        self.trajectory = trajectory.copy()
+        self.profile = [copy(point) for point in profile]
+        self.profileTanks = [tankType(diveplan, point.tank) for point in profile]
+        self.loopState = dict(loopState)
+        self.tanks = {iTank: {name: getattr(tank, name) for name in self.TANK_STATE}
+                      for iTank, tank in diveplan.tankList.items()}
+        self.currentTank = tankType(diveplan, diveplan.currentTank)
+        self.nextTank = tankType(diveplan, diveplan.nextTank)
+        self.plan = {name: getattr(diveplan, name, 0.0) for name in self.PLAN_STATE}
+
+    def restore(self, diveplan):
+        '''
+        restore the tanks and diveplan attributes, and return copies of the rest of the state
+        :param diveplan: the dive plan being calculated
+        :type diveplan: DivePlan
+        :return: model, trajectory, profile and the local variables of calculatePlan()
+        :rtype: tuple
+        '''
+        for iTank, state in self.tanks.items():
+            for name, value in state.items():
+                setattr(diveplan.tankList[iTank], name, value)
+        diveplan.currentTank = diveplan.tankList[self.currentTank] if self.currentTank else None
+        diveplan.nextTank = diveplan.tankList[self.nextTank] if self.nextTank else None
+        for name, value in self.plan.items():
+            setattr(diveplan, name, value)
+
+        model = deepcopy(self.model)
+        trajectory = self.trajectory.copy()
+        profile = []
+        for point, iTank in zip(self.profile, self.profileTanks):
+            newPoint = copy(point)
+            newPoint.tank = diveplan.tankList[iTank] if iTank else None
+            newPoint.setModelRow(trajectory, point.modelRow)
+            profile.append(newPoint)
+        return model, trajectory, profile, dict(self.loopState)
+
+
+class CheckpointCache():
+    """
+    bounded cache of PlanCheckpoint objects, the least recently used checkpoint is dropped first
+    """
+    def __init__(self, maxSize = 32):
+        self.maxSize = maxSize
+        self.checkpoints = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, key, checkpoint):
+        self.checkpoints[key] = checkpoint
+        self.checkpoints.move_to_end(key)
+        while len(self.checkpoints) > self.maxSize:
+            self.checkpoints.popitem(last=False)
+
+    def find(self, diveplan):
+        '''
+        find the longest valid checkpoint for the dive plan
+        :param diveplan: the dive plan
+        :type diveplan: DivePlan
+        :return: the prefix name and the checkpoint, or (None, None)
+        :rtype: tuple
+        '''
+        for prefix in PREFIXES:
+            key = prefixKey(diveplan, prefix)
+            checkpoint = self.checkpoints.get(key)
+            if checkpoint is not None:
+                self.checkpoints.move_to_end(key)
+                self.hits += 1
+                return prefix, checkpoint
+        self.misses += 1
+        return None, None
+
+    def clear(self):
+        self.checkpoints.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# the cache used by calculatePlan() by default
+prefixCheckpoints = CheckpointCache()
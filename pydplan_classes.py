@@ -1,4 +1,3 @@
-from PyQt5.QtCore import Qt
 from pydplan_buhlmann import Buhlmann
 
 from enum import Enum, auto
@@ -9,6 +8,11 @@ class PlanMode(Enum):
     Calculate = 0
     Import = 2
 
+class ModelEngine(Enum):
+    Scalar = 0
+    Vector = 1
+    Lazy = 2
+
 class TankType(Enum):
     BOTTOM = auto()
     DECO1 = auto()
@@ -20,8 +24,12 @@ class DivePlan():
         self.GFhigh = 1.0
         self.GFlow = 1.0
         self.planMode = PlanMode.Calculate.value
-        self.widgetsCtrl = dict()
-        self.objectOfWidget = dict()
+        self.engine = ModelEngine.Scalar.value
+        # dive log replayed in Import mode, CSV or UDDF, and seconds between the profile points kept from it
+        self.importFile = None
+        self.importInterval = 30.0
+        # time to surface at each exit time of the bottom phase, TtsCurve, drawn over the profile plot
+        self.ttsCurve = None
         # profileSegments = []
         self.profileSampled = []
         self.stopListUI = dict()
@@ -82,7 +90,7 @@ class DivePlan():
                           SAC = 15, ppo2max = 1.4,
                           liters=24.0, bar=200.0, pressure=200.0,
                           useFromTime= 0, useUntilTime=0,
-                          type='bottom', useOrder = 1, color = Qt.magenta),
+                          type='bottom', useOrder = 1),
             TankType.DECO1:
                 ScubaTank(label = 'deco 1', name ='D1', use=True,
                           o2 = 50, he= 0,
@@ -90,7 +98,7 @@ class DivePlan():
                           SAC=13, ppo2max=1.6,
                           liters=7.0, bar=200.0, pressure=200.0,
                           useFromTime= 0, useUntilTime=0,
-                          type='deco', useOrder = 2, color = Qt.cyan),
+                          type='deco', useOrder = 2),
             TankType.DECO2:
                 ScubaTank(label = 'deco 2', name ='D2', use=True,
                           o2 = 100, he= 0,
@@ -98,7 +106,7 @@ class DivePlan():
                           SAC=13, ppo2max=1.6,
                           liters=7.0, bar=200.0, pressure=200.0,
                           useFromTime= 0, useUntilTime=0,
-                          type='deco', useOrder = 3, color = Qt.darkGray),
+                          type='deco', useOrder = 3),
             TankType.TRAVEL:
                 ScubaTank(label = 'travel 1', name ='T1', use=False,
                           o2 = 21, he= 25,
@@ -107,7 +115,7 @@ class DivePlan():
                           liters=11.0, bar=200.0, pressure=200.0,
                           useFromTime= 0, useUntilTime=0,
                           useFromTime2=0, useUntilTime2=0,
-                          type='travel', useOrder = 0, color = Qt.yellow),
+                          type='travel', useOrder = 0),
         }
         self.rates = {
             'descent' : {'label': 'descent rate, surface to bottom', 'default': 20},
@@ -118,6 +126,8 @@ class DivePlan():
         }
 
 class DecoStop():
+    __slots__ = ('depth', 'time', 'number', 'done', 'runtime')
+
     def __init__(self, depth, time, number):
         self.depth = depth
         self.time = time
@@ -129,7 +139,7 @@ class ScubaTank():
     def __init__(self, label, name, use,  o2, he,
                  liters, bar, pressure, SAC, ppo2max,
                  useFromTime, useUntilTime,
-                 type, useOrder, color,
+                 type, useOrder, color = None,
                  changeDepth = 0.0,
                  useFromTime2=0.0, useUntilTime2=0.0,
                  ):
@@ -152,7 +162,7 @@ class ScubaTank():
 
         self.type = type
         self.useOrder = useOrder
-        self.color = color
+        self.color = color # set by the GUI, see pydplan_plot.tankColors
     def setO2(self, new):
         self.o2 = new
     def setHe(self, new):
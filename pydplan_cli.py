@@ -0,0 +1,223 @@
+#!/usr/bin/python
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_cli.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# command line batch planner, calculates many dive plans in parallel without the GUI
+#
+# usage: python pydplan_cli.py plans.jsonl [-o results.jsonl] [--workers N] [--chunksize N]
+# see doc/batchplan.md for the input and output formats
+import argparse
+import csv
+import json
+import os
+import sys
+from functools import partial
+from multiprocessing import Pool
+
+from pydplan_classes import DivePlan, ModelEngine
+from pydplan_core import newPlan, runPlan, planSummary
+from pydplan_profilestore import ProfileStoreWriter, profileRows
+
+# plan settings that can be given in the input, and the newPlan() argument each one sets
+PLAN_FIELDS = {
+    'depth': 'depth', 'time': 'bottomTime',
+    'gflow': 'GFlow', 'gfhigh': 'GFhigh',
+    'descent': 'descRate', 'asctodeco': 'ascRateToDeco',
+    'ascatdeco': 'ascRateAtDeco', 'asctosurface': 'ascRateToSurface',
+}
+
+
+def parseValue(text):
+    '''
+    convert a CSV cell to bool or float, empty cells are None
+    '''
+    text = text.strip()
+    if text == '':
+        return None
+    if text.lower() in ['true', 'yes']:
+        return True
+    if text.lower() in ['false', 'no']:
+        return False
+    return float(text)
+
+
+def readPlans(path, fileFormat = None):
+    '''
+    read plan definitions from a JSON lines or CSV file, one plan per line or row.
+    in CSV files the tank settings are columns like BOTTOM.o2 or DECO2.use,
+    in JSON lines they can also be given as {"tanks": {"BOTTOM": {"o2": 18}}}.
+    a line or row that cannot be read is given as {'error': message}, so one bad plan does not stop the batch
+
+    :param path: file name, '-' reads standard input
+    :type path: str
+    :param fileFormat: 'jsonl' or 'csv', if None then decided by the file name extension
+    :type fileFormat: str
+    :return: generator of plan definitions as dicts
+    :rtype: generator
+    '''
+    if fileFormat is None:
+        fileFormat = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    inFile = sys.stdin if path == '-' else open(path, newline='')
+    try:
+        if fileFormat == 'csv':
+            reader = csv.DictReader(inFile)
+            for row in reader:
+                record = {}
+                try:
+                    for key, text in row.items():
+                        value = parseValue(text) if key not in ['id', 'stops'] else text
+                        if value is None:
+                            continue
+                        if '.' in key:
+                            tank, setting = key.split('.', 1)
+                            record.setdefault('tanks', {}).setdefault(tank.upper(), {})[setting] = value
+                        else:
+                            record[key] = value
+                except (ValueError, AttributeError) as error:
+                    record = {'error': 'line {}: {}'.format(reader.line_num, error)}
+                    if row.get('id'):
+                        record['id'] = row['id']
+                yield record
+        else:
+            for lineNumber, line in enumerate(inFile, 1):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError as error:
+                        record = {'error': 'line {}: {}'.format(lineNumber, error)}
+                    if not isinstance(record, dict):
+                        record = {'error': 'line {}: a plan must be a JSON object'.format(lineNumber)}
+                    yield record
+    finally:
+        if inFile is not sys.stdin:
+            inFile.close()
+
+
+def parseStops(stops):
+    '''
+    planned deco stops as a list of [depth, minutes], or a string like "21:3 6:5 3:6"
+    '''
+    if not stops:
+        return None
+    if isinstance(stops, str):
+        return [tuple(float(x) for x in stop.split(':')) for stop in stops.split()]
+    return [tuple(stop) for stop in stops]
+
+
+def planOne(job, engine = ModelEngine.Lazy.value, profile = False):
+    '''
+    calculate one plan, called in the worker processes
+    :param job: index of the plan in the input, and the plan definition
+    :type job: tuple
+    :param engine: ModelEngine value
+    :type engine: int
+    :param profile: if True the profile steps are returned too, in the profile store layout
+    :type profile: bool
+    :return: the plan summary, or the error message
+    :rtype: dict
+    '''
+    index, record = job
+    result = {'id': record.get('id', index)}
+    if 'error' in record:
+        # the plan could not be read from the input
+        result['error'] = record['error']
+        return result
+    try:
+        arguments = {PLAN_FIELDS[key.lower()]: value for key, value in record.items()
+                     if key.lower() in PLAN_FIELDS}
+        diveplan = newPlan(tanks=record.get('tanks'), decoStops=parseStops(record.get('stops')),
+                           engine=engine, **arguments)
+        result.update(planSummary(runPlan(diveplan)))
+        if profile:
+            result['profile'] = profileRows(diveplan)
+    except (ValueError, KeyError, TypeError, ArithmeticError) as error:
+        result['error'] = str(error)
+    return result
+
+
+def storeProfiles(results, store):
+    '''
+    write the profile steps of each result into the store as they arrive, and drop them from the result.
+    a plan whose id is too long or already in the store is not written and becomes an error record
+    '''
+    for result in results:
+        rows = result.pop('profile', None)
+        if rows is not None:
+            error = store.checkId(result['id'])
+            if error is not None:
+                result = {'id': result['id'], 'error': error}
+            else:
+                store.append(result['id'], rows)
+        yield result
+
+
+def formatCsvRow(result):
+    '''
+    flatten a plan summary to one CSV row, stops as depth/minutes pairs
+    '''
+    row = {'id': result['id'], 'error': result.get('error', '')}
+    if 'runtime' in result:
+        row['runtime'] = result['runtime']
+        row['stops'] = ' '.join('{:g}/{:.1f}'.format(stop['depth'], stop['time']) for stop in result['stops'])
+        row['maxPPoxygen'] = result['maxPPoxygen']
+        for name, pressure in result['tanks'].items():
+            row['bar.' + name] = pressure
+    return row
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='PYDPLAN batch planner, calculates dive plans from a file')
+    parser.add_argument('input', help='plan definitions, JSON lines or CSV, - for standard input')
+    parser.add_argument('-o', '--output', default='-', help='results file, default standard output')
+    parser.add_argument('--input-format', choices=['jsonl', 'csv'], default=None,
+                        help='default from the input file name extension')
+    parser.add_argument('--output-format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes, 1 calculates in this process')
+    parser.add_argument('-c', '--chunksize', type=int, default=16,
+                        help='number of plans sent to a worker at a time')
+    parser.add_argument('--engine', choices=['lazy', 'vector', 'scalar'], default='lazy',
+                        help='model engine, lazy calculates the ceilings only when they are needed')
+    parser.add_argument('--store', default=None,
+                        help='also write the profiles into a profile store, file name without extension')
+    args = parser.parse_args(argv)
+    plan = partial(planOne, engine=ModelEngine[args.engine.capitalize()].value, profile=args.store is not None)
+
+    jobs = enumerate(readPlans(args.input, args.input_format))
+    outFile = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    store = ProfileStoreWriter(args.store) if args.store else None
+    pool = None
+    try:
+        if args.workers > 1:
+            pool = Pool(args.workers)
+            # imap returns the results in input order, as soon as each one is ready
+            results = pool.imap(plan, jobs, chunksize=max(args.chunksize, 1))
+        else:
+            results = map(plan, jobs)
+        if store is not None:
+            results = storeProfiles(results, store)
+
+        if args.output_format == 'csv':
+            defaults = DivePlan()
+            defaults.setDefaults()
+            fields = ['id', 'runtime', 'stops', 'maxPPoxygen'] + \
+                     ['bar.' + tank.name for tank in defaults.tankList.values()] + ['error']
+            writer = csv.DictWriter(outFile, fieldnames=fields)
+            writer.writeheader()
+            for result in results:
+                writer.writerow(formatCsvRow(result))
+        else:
+            for result in results:
+                outFile.write(json.dumps(result) + '\n')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if outFile is not sys.stdout:
+            outFile.close()
+        if store is not None:
+            store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_core.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# planning core API without the GUI
+#
+# build a dive plan, calculate it and read the results, using only the model and profile modules,
+# PyQt5 is not imported. the units are the same as in the GUI controls: meters, minutes, m/min, %.
+from pydplan_classes import DivePlan, DecoStop, PlanMode, TankType, ModelEngine
+from pydplan_profiletools import calculatePlan
+
+
+def newPlan(depth, bottomTime, GFlow = 0.30, GFhigh = 0.80,
+            descRate = 20.0, ascRateToDeco = 9.0, ascRateAtDeco = 6.0, ascRateToSurface = 3.0,
+            tanks = None, decoStops = None, engine = ModelEngine.Scalar.value):
+    '''
+    build a DivePlan from the default plan, like the GUI does from its control widgets
+
+    :param depth: bottom depth in meters
+    :type depth: float
+    :param bottomTime: bottom time in minutes at the bottom depth, the descent comes before it
+    :type bottomTime: float
+    :param GFlow: gradient factor low, 0.0 ... 1.0
+    :type GFlow: float
+    :param GFhigh: gradient factor high, 0.0 ... 1.0
+    :type GFhigh: float
+    :param descRate: descent rate in m/min
+    :type descRate: float
+    :param ascRateToDeco: ascent rate in m/min from bottom to half of the bottom depth
+    :type ascRateToDeco: float
+    :param ascRateAtDeco: ascent rate in m/min from half of the bottom depth to 6 m
+    :type ascRateAtDeco: float
+    :param ascRateToSurface: ascent rate in m/min from 6 m to surface
+    :type ascRateToSurface: float
+    :param tanks: changes to the default tanks, tank name as in TankType to a dict of ScubaTank
+                  attributes, like {'BOTTOM': {'o2': 18, 'he': 45}, 'DECO2': {'use': False}}
+    :type tanks: dict
+    :param decoStops: planned deco stops as (depth in m, time in minutes), if given the plan is in Custom mode
+    :type decoStops: list
+    :param engine: ModelEngine value
+    :type engine: int
+    :return: the dive plan
+    :rtype: DivePlan
+    :raises ValueError: if the depth, the bottom time or a rate is not positive, a tank or tank setting is unknown,
+                        or the liters, bar or SAC of a tank is out of range
+    '''
+    diveplan = DivePlan()
+    diveplan.setDefaults()
+    diveplan.engine = engine
+    diveplan.GFlow = float(GFlow)
+    diveplan.GFhigh = float(GFhigh)
+    diveplan.bottomDepth = float(depth)
+    diveplan.maxDepth = diveplan.bottomDepth
+    diveplan.bottomTime = float(bottomTime) * 60.0
+    if not (diveplan.bottomDepth > 0.0 and diveplan.bottomTime > 0.0):
+        raise ValueError('depth and bottom time must be positive, got {} m and {} min'.format(depth, bottomTime))
+    # rates are converted from m/min to m/sec
+    diveplan.descRate = float(descRate) / 60.0
+    diveplan.ascRateToDeco = float(ascRateToDeco) / 60.0
+    diveplan.ascRateAtDeco = float(ascRateAtDeco) / 60.0
+    diveplan.ascRateToSurface = float(ascRateToSurface) / 60.0
+    if not min(diveplan.descRate, diveplan.ascRateToDeco, diveplan.ascRateAtDeco, diveplan.ascRateToSurface) > 0.0:
+        raise ValueError('descent and ascent rates must be positive, got {}, {}, {} and {} m/min'
+                         .format(descRate, ascRateToDeco, ascRateAtDeco, ascRateToSurface))
+    # descending time in seconds
+    diveplan.descTime = diveplan.bottomDepth / diveplan.descRate
+
+    if tanks is not None:
+        for name, settings in tanks.items():
+            if name not in TankType.__members__:
+                raise ValueError('unknown tank {}, use one of {}'.format(name, ', '.join(TankType.__members__)))
+            tank = diveplan.tankList[TankType[name]]
+            for attribute, value in settings.items():
+                if not hasattr(tank, attribute):
+                    raise ValueError('unknown tank setting {} for tank {}'.format(attribute, name))
+                setattr(tank, attribute, value)
+            if not (tank.liters > 0.0 and tank.bar > 0.0 and tank.SAC >= 0.0):
+                raise ValueError('tank {} must have positive liters and bar and a SAC of at least 0, got {} l, '
+                                 '{} bar and {} l/min'.format(name, tank.liters, tank.bar, tank.SAC))
+
+    diveplan.decoStopList = []
+    if decoStops:
+        diveplan.planMode = PlanMode.Custom.value
+        for number, (stopDepth, stopTime) in enumerate(decoStops):
+            diveplan.decoStopList.append(DecoStop(depth=float(stopDepth), time=float(stopTime) * 60.0,
+                                                  number=number))
+    return diveplan
+
+
+def runPlan(diveplan, **kwargs):
+    '''
+    calculate the dive plan, raises ValueError if it cannot be calculated
+    :param diveplan: the dive plan
+    :type diveplan: DivePlan
+    :param kwargs: passed to calculatePlan(), like checkpoints=None or results=None
+    :return: the dive plan, with results
+    :rtype: DivePlan
+    '''
+    calculatePlan(diveplan, **kwargs)
+    return diveplan
+
+
+def planSummary(diveplan):
+    '''
+    the results of a calculated dive plan as plain Python values
+
+    :param diveplan: a calculated dive plan
+    :type diveplan: DivePlan
+    :return: runtime and average depth, deco stops, tank end pressures and maximum partial pressures
+    :rtype: dict
+    '''
+    lastPoint = diveplan.profileSampled[-1]
+    stops = []
+    for stop in diveplan.decoStopsCalculated:
+        if stop is not None:
+            stops.append({'depth': float(stop.depth),
+                          'runtime': round(stop.runtime / 60.0, 2),
+                          'time': round(stop.time / 60.0, 2)})
+    tanks = {}
+    for iTank, tank in diveplan.tankList.items():
+        if tank.use:
+            tanks[tank.name] = round(tank.pressure, 1)
+    return {'runtime': round(lastPoint.time / 60.0, 2),
+            'avgDepth': round(lastPoint.depthRunAvg, 2),
+            'stops': stops,
+            'tanks': tanks,
+            'maxPPoxygen': round(diveplan.maxPPoxygen, 3),
+            'maxPPnitrogen': round(diveplan.maxPPnitrogen, 3),
+            'maxPPhelium': round(diveplan.maxPPhelium, 3)}
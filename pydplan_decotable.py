@@ -0,0 +1,262 @@
+#!/usr/bin/python
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_decotable.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# precomputed decompression tables, built offline and looked up conservatively
+#
+# usage: python pydplan_decotable.py build -o site.npz --depths 18:60:3 --times 10:60:5 --gf 30/80 40/85
+#        python pydplan_decotable.py lookup site.npz --depth 41 --time 23 --gf 30/80
+#
+# the builder calculates every grid point with calculatePlan() in a pool of worker processes and stores the
+# runtimes, stop schedules and gas use as NumPy arrays in one .npz file. a lookup takes the next deeper and
+# next longer grid point, so the answer is never less conservative than a full calculation of the grid.
+import argparse
+import json
+import os
+from bisect import bisect_left
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
+
+from pydplan_classes import ModelEngine
+from pydplan_core import newPlan
+from pydplan_cli import planOne
+from pydplan_zfactor import gasContent
+
+
+def gridRange(text):
+    '''
+    "first:last:step" inclusive, like "18:60:3", or a comma separated list like "20,25,30"
+    '''
+    if ':' in text:
+        first, last, step = (float(x) for x in text.split(':'))
+        return [float(x) for x in np.arange(first, last + step / 2.0, step)]
+    return sorted(float(x) for x in text.split(','))
+
+
+def parseGF(text):
+    '''
+    GF pair as "low/high" in percent, like "30/80"
+    '''
+    low, high = (float(x) / 100.0 for x in text.split('/'))
+    return low, high
+
+
+class DecoTable():
+    """
+    runtimes, deco stops and gas use of a grid of bottom depth x bottom time x GF pair,
+    all plans of the table use the same tanks and rates
+    """
+    def __init__(self, depths, times, gfPairs, stopDepths, tankNames,
+                 runtime, stopTime, tankPressure, gasUsed, settings):
+        '''
+        :param depths: bottom depths in meters, ascending
+        :type depths: list
+        :param times: bottom times in minutes, ascending
+        :type times: list
+        :param gfPairs: (GF low, GF high) pairs
+        :type gfPairs: list
+        :param stopDepths: depths of all stops found in the table, the columns of stopTime
+        :type stopDepths: list
+        :param tankNames: names of the tanks used, the columns of tankPressure and gasUsed
+        :type tankNames: list
+        :param runtime: runtime in minutes, (depths, times, gfPairs), NaN if the plan could not be calculated
+        :type runtime: numpy.ndarray
+        :param stopTime: stop time in minutes, (depths, times, gfPairs, stopDepths)
+        :type stopTime: numpy.ndarray
+        :param tankPressure: end pressure in bar, (depths, times, gfPairs, tanks)
+        :type tankPressure: numpy.ndarray
+        :param gasUsed: gas used in liters, (depths, times, gfPairs, tanks)
+        :type gasUsed: numpy.ndarray
+        :param settings: plan settings shared by all plans, like tanks and rates, as in the batch planner input
+        :type settings: dict
+        '''
+        self.depths = [float(x) for x in depths]
+        self.times = [float(x) for x in times]
+        self.gfPairs = [(float(low), float(high)) for low, high in gfPairs]
+        self.stopDepths = [float(x) for x in stopDepths]
+        self.tankNames = list(tankNames)
+        self.runtime = runtime
+        self.stopTime = stopTime
+        self.tankPressure = tankPressure
+        self.gasUsed = gasUsed
+        self.settings = settings
+
+    def save(self, path):
+        np.savez_compressed(path, depths=self.depths, times=self.times, gfPairs=self.gfPairs,
+                            stopDepths=self.stopDepths, tankNames=np.array(self.tankNames),
+                            runtime=self.runtime, stopTime=self.stopTime,
+                            tankPressure=self.tankPressure, gasUsed=self.gasUsed,
+                            settings=np.array(json.dumps(self.settings)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['depths'].tolist(), data['times'].tolist(), data['gfPairs'].tolist(),
+                       data['stopDepths'].tolist(), data['tankNames'].tolist(),
+                       data['runtime'], data['stopTime'], data['tankPressure'], data['gasUsed'],
+                       json.loads(str(data['settings'])))
+
+    def gridPoint(self, depth, bottomTime, GFlow, GFhigh):
+        '''
+        the grid point that is at least as conservative as the plan asked for: the next deeper depth,
+        the next longer bottom time and of the GF pairs not higher than asked, the one closest to it
+
+        :return: indexes of depth, time and GF pair
+        :rtype: tuple
+        :raises ValueError: if the plan is outside of the table
+        '''
+        iDepth = bisect_left(self.depths, depth)
+        iTime = bisect_left(self.times, bottomTime)
+        if iDepth >= len(self.depths):
+            raise ValueError('depth {:g} m is deeper than the table, max {:g} m'.format(depth, self.depths[-1]))
+        if iTime >= len(self.times):
+            raise ValueError('bottom time {:g} min is longer than the table, max {:g} min'
+                             .format(bottomTime, self.times[-1]))
+        iGF = -1
+        for index, (low, high) in enumerate(self.gfPairs):
+            if low <= GFlow + 1e-9 and high <= GFhigh + 1e-9:
+                if iGF < 0 or low + high > sum(self.gfPairs[iGF]):
+                    iGF = index
+        if iGF < 0:
+            raise ValueError('no GF pair in the table is as conservative as {:.0f}/{:.0f}'
+                             .format(GFlow * 100.0, GFhigh * 100.0))
+        return iDepth, iTime, iGF
+
+    def lookup(self, depth, bottomTime, GFlow, GFhigh):
+        '''
+        answer a plan from the table, with the results of the conservative grid point
+
+        :param depth: bottom depth in meters
+        :type depth: float
+        :param bottomTime: bottom time in minutes
+        :type bottomTime: float
+        :param GFlow: gradient factor low, 0.0 ... 1.0
+        :type GFlow: float
+        :param GFhigh: gradient factor high, 0.0 ... 1.0
+        :type GFhigh: float
+        :return: runtime, stops as depth and minutes, tank end pressures and gas used, and the grid point used
+        :rtype: dict
+        :raises ValueError: if the plan is outside of the table, or the grid point could not be calculated
+        '''
+        iDepth, iTime, iGF = self.gridPoint(depth, bottomTime, GFlow, GFhigh)
+        runtime = round(float(self.runtime[iDepth, iTime, iGF]), 2)
+        if runtime != runtime:
+            raise ValueError('the table has no plan for {:g} m {:g} min'
+                             .format(self.depths[iDepth], self.times[iTime]))
+        stopTime = self.stopTime[iDepth, iTime, iGF]
+        stops = [{'depth': self.stopDepths[i], 'time': round(float(stopTime[i]), 2)}
+                 for i in range(len(self.stopDepths) - 1, -1, -1) if stopTime[i] > 0.0]
+        tanks = {}
+        used = {}
+        for i, name in enumerate(self.tankNames):
+            pressure = float(self.tankPressure[iDepth, iTime, iGF, i])
+            if pressure == pressure:
+                tanks[name] = round(pressure, 1)
+                used[name] = round(float(self.gasUsed[iDepth, iTime, iGF, i]))
+        low, high = self.gfPairs[iGF]
+        return {'runtime': runtime, 'stops': stops, 'tanks': tanks, 'used': used,
+                'depth': self.depths[iDepth], 'time': self.times[iTime], 'GFlow': low, 'GFhigh': high}
+
+
+def buildDecoTable(depths, times, gfPairs, settings = None, workers = 1, chunksize = 16):
+    '''
+    calculate all plans of the grid and collect them into a table
+
+    :param depths: bottom depths in meters
+    :type depths: list
+    :param times: bottom times in minutes at the bottom depth, the descent comes before them like in the GUI
+    :type times: list
+    :param gfPairs: (GF low, GF high) pairs, 0.0 ... 1.0
+    :type gfPairs: list
+    :param settings: other plan settings shared by all plans, as in the batch planner input,
+                     like {'tanks': {'BOTTOM': {'o2': 18, 'he': 45}}, 'asctodeco': 10}
+    :type settings: dict
+    :param workers: number of worker processes, 1 calculates in this process
+    :type workers: int
+    :param chunksize: number of plans sent to a worker at a time
+    :type chunksize: int
+    :return: the table
+    :rtype: DecoTable
+    '''
+    depths = sorted(float(x) for x in depths)
+    times = sorted(float(x) for x in times)
+    gfPairs = [(float(low), float(high)) for low, high in gfPairs]
+    settings = dict(settings or {})
+    # start pressures and volumes of the tanks, to convert end pressures to gas used
+    reference = newPlan(depth=depths[0], bottomTime=times[0], tanks=settings.get('tanks'))
+    tankList = {tank.name: tank for tank in reference.tankList.values()}
+
+    grid = [(d, t, g) for d in range(len(depths)) for t in range(len(times)) for g in range(len(gfPairs))]
+    jobs = []
+    for d, t, g in grid:
+        record = dict(settings, depth=depths[d], time=times[t], gflow=gfPairs[g][0], gfhigh=gfPairs[g][1])
+        jobs.append((len(jobs), record))
+    plan = partial(planOne, engine=ModelEngine.Lazy.value)
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = pool.map(plan, jobs, chunksize=max(chunksize, 1))
+    else:
+        results = list(map(plan, jobs))
+
+    stopDepths = sorted({stop['depth'] for result in results for stop in result.get('stops', [])})
+    tankNames = sorted({name for result in results for name in result.get('tanks', {})},
+                       key=list(tankList).index)
+    shape = (len(depths), len(times), len(gfPairs))
+    runtime = np.full(shape, np.nan, dtype=np.float32)
+    stopTime = np.zeros(shape + (len(stopDepths),), dtype=np.float32)
+    tankPressure = np.full(shape + (len(tankNames),), np.nan, dtype=np.float32)
+    gasUsed = np.full(shape + (len(tankNames),), np.nan, dtype=np.float32)
+    for (d, t, g), result in zip(grid, results):
+        if 'error' in result:
+            continue
+        runtime[d, t, g] = result['runtime']
+        for stop in result['stops']:
+            stopTime[d, t, g, stopDepths.index(stop['depth'])] += stop['time']
+        for name, pressure in result['tanks'].items():
+            i = tankNames.index(name)
+            tankPressure[d, t, g, i] = pressure
+            tank = tankList[name]
+            gasUsed[d, t, g, i] = gasContent(tank, tank.bar) - gasContent(tank, pressure)
+    return DecoTable(depths, times, gfPairs, stopDepths, tankNames, runtime, stopTime, tankPressure, gasUsed,
+                     settings)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='PYDPLAN precomputed decompression tables')
+    commands = parser.add_subparsers(dest='command')
+    build = commands.add_parser('build', help='calculate a table')
+    build.add_argument('-o', '--output', required=True, help='table file, .npz')
+    build.add_argument('--depths', default='18:60:3', help='bottom depths in meters, first:last:step or a list')
+    build.add_argument('--times', default='10:60:5', help='bottom times in minutes, first:last:step or a list')
+    build.add_argument('--gf', nargs='+', default=['30/80'], help='GF pairs as low/high in percent')
+    build.add_argument('--settings', default=None,
+                       help='JSON of other plan settings, like {"tanks": {"BOTTOM": {"o2": 18, "he": 45}}}')
+    build.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    lookup = commands.add_parser('lookup', help='answer a plan from a table')
+    lookup.add_argument('table', help='table file, .npz')
+    lookup.add_argument('--depth', type=float, required=True, help='bottom depth in meters')
+    lookup.add_argument('--time', type=float, required=True, help='bottom time in minutes')
+    lookup.add_argument('--gf', default='30/80', help='GF pair as low/high in percent')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        table = buildDecoTable(gridRange(args.depths), gridRange(args.times), [parseGF(gf) for gf in args.gf],
+                               settings=json.loads(args.settings) if args.settings else None,
+                               workers=args.workers)
+        table.save(args.output)
+        failed = int(np.isnan(table.runtime).sum())
+        print('{} plans, {} could not be calculated'.format(table.runtime.size, failed))
+    elif args.command == 'lookup':
+        GFlow, GFhigh = parseGF(args.gf)
+        try:
+            result = DecoTable.load(args.table).lookup(args.depth, args.time, GFlow, GFhigh)
+        except ValueError as error:
+            parser.exit(1, '{}\n'.format(error))
+        print(json.dumps(result))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
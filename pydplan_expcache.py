@@ -0,0 +1,112 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_expcache.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# shared cache of the tissue decay factors exp(-k * t)
+#
+# both the Haldane and the Schreiner equation need exp(-k * t) for every compartment and both gases.
+# a plan, and a batch of plans, uses the same few segment lengths again and again, so the factors of
+# all 16 compartments are calculated once per (model, gas, interval) and stored in a LRU cache.
+import math
+from collections import OrderedDict
+import numpy as np
+
+
+class DecayFactors():
+    """
+    exp(-k * t) of all 16 compartments for one model, gas and interval
+    """
+    __slots__ = ('array', 'values')
+
+    def __init__(self, constK, minutes):
+        '''
+        :param constK: K constants of the compartments for one gas
+        :type constK: numpy.ndarray
+        :param minutes: interval in minutes
+        :type minutes: float
+        '''
+        # math.exp() per compartment, gives the same floats as the scalar engine always did
+        self.values = tuple(math.exp(-k * minutes) for k in constK.tolist())
+        self.array = np.array(self.values)
+        self.array.setflags(write=False)
+
+
+class DecayFactorCache():
+    """
+    LRU cache of DecayFactors keyed by model name, gas and interval
+    """
+    GASES = ('He', 'N2')
+
+    def __init__(self, maxSize = 1024):
+        '''
+        :param maxSize: number of factor rows kept, the least recently used row is dropped first
+        :type maxSize: int
+        '''
+        self.maxSize = maxSize
+        self.factors = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, coefficients, gas, minutes):
+        '''
+        :param coefficients: the model coefficients, only ModelTable objects have a name and are cached
+        :type coefficients: ModelTable
+        :param gas: 'He' or 'N2'
+        :type gas: str
+        :param minutes: interval in minutes
+        :type minutes: float
+        :return: the factors of all compartments
+        :rtype: DecayFactors
+        '''
+        constK = coefficients.HeliumK if gas == 'He' else coefficients.NitrogenK
+        name = getattr(coefficients, 'name', None)
+        if name is None:
+            return DecayFactors(constK, minutes)
+        key = (name, gas, float(minutes))
+        factors = self.factors.get(key)
+        if factors is not None:
+            self.factors.move_to_end(key)
+            self.hits += 1
+            return factors
+        self.misses += 1
+        factors = DecayFactors(constK, minutes)
+        self.factors[key] = factors
+        if len(self.factors) > self.maxSize:
+            self.factors.popitem(last=False)
+        return factors
+
+    def rows(self, coefficients, gas, minutes):
+        '''
+        factors for many intervals, like one interval per plan in a batch
+        :param minutes: intervals in minutes
+        :type minutes: numpy.ndarray
+        :return: one row of 16 factors per interval
+        :rtype: numpy.ndarray
+        '''
+        unique, inverse = np.unique(minutes, return_inverse=True)
+        table = np.array([self.get(coefficients, gas, t).array for t in unique.tolist()])
+        return table[inverse.reshape(-1)]
+
+    def resize(self, maxSize):
+        self.maxSize = maxSize
+        while len(self.factors) > self.maxSize:
+            self.factors.popitem(last=False)
+
+    def stats(self):
+        '''
+        :return: hits, misses, hit rate, number of stored rows and the maximum size
+        :rtype: dict
+        '''
+        lookups = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses,
+                    hitRate=self.hits / lookups if lookups else 0.0,
+                    size=len(self.factors), maxSize=self.maxSize)
+
+    def clear(self):
+        self.factors.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# the cache shared by all engines and plans in this process
+decayFactors = DecayFactorCache()
@@ -0,0 +1,82 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_gasuse.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# gas consumption of the tanks, from a finished profile or one step at a time
+#
+# calculatePlan() only decides which tank is breathed at each profile point. gasAccounting() then goes
+# over the finished profile once: the gas used on each segment between two points is calculated for all
+# segments at once, and the tank pressures along the dive are cumulative sums of it. the tank settings
+# that only affect the gas use, SAC, liters and fill pressure, are not needed by the decompression model,
+# so when they change the gas use can be calculated again without calculating the plan. the liters in a tank
+# and its pressure are converted with the real gas Z factor table of pydplan_zfactor.py.
+import numpy as np
+
+from pydplan_buhlmann import Constants
+from pydplan_zfactor import gasContent, tankPressure
+
+
+def segmentLiters(SAC, intervalMinutes, beginDepth, endDepth):
+    '''
+    surface liters breathed on a segment, at the average absolute pressure of the segment.
+    works on NumPy arrays too
+    '''
+    averagePressure = Constants.surfacePressure + (beginDepth + endDepth) / 20.0
+    return SAC * intervalMinutes * averagePressure
+
+
+def consumeGas(diveplan, beginDepth, endDepth, intervalMinutes):
+    '''
+    take the gas of one segment from diveplan.currentTank, for dive logs and the live mode
+    where the profile is not known in advance
+    '''
+    tank = diveplan.currentTank
+    if tank is None:
+        return
+    litersLeft = gasContent(tank, tank.pressure) - segmentLiters(tank.SAC, intervalMinutes, beginDepth, endDepth)
+    tank.pressure = float(tankPressure(tank, litersLeft))
+
+
+def gasAccounting(diveplan):
+    '''
+    calculate the gas use of a finished profile: the tank pressure at each profile point, the end pressure of
+    each tank and the times when each tank is used. the segment between two points is breathed from the tank
+    of the later point
+
+    :param diveplan: a dive plan with profileSampled calculated
+    :type diveplan: DivePlan
+    :return: pressure in bar of every tank at every profile point, one column per tank in tankList order
+    :rtype: numpy.ndarray
+    '''
+    profile = diveplan.profileSampled
+    tanks = list(diveplan.tankList.values())
+    column = {id(tank): index for index, tank in enumerate(tanks)}
+    time = np.array([point.time for point in profile])
+    depth = np.array([point.depth for point in profile])
+    tankIndex = np.array([column[id(point.tank)] for point in profile], dtype=int)
+
+    SAC = np.array([tank.SAC for tank in tanks], dtype=float)
+    segmentTank = tankIndex[1:]
+    used = segmentLiters(SAC[segmentTank], np.diff(time) / 60.0, depth[:-1], depth[1:])
+    # liters taken from each tank on each segment, then the sum up to each point
+    usedByTank = np.zeros((len(profile), len(tanks)))
+    usedByTank[np.arange(1, len(profile)), segmentTank] = used
+    litersLeft = np.array([gasContent(tank, tank.bar) for tank in tanks]) - np.cumsum(usedByTank, axis=0)
+    pressures = np.empty_like(litersLeft)
+    for index, tank in enumerate(tanks):
+        pressures[:, index] = tankPressure(tank, litersLeft[:, index])
+
+    for row, point in enumerate(profile):
+        point.currentTankPressure = float(pressures[row, tankIndex[row]])
+
+    # runs of points breathed from the same tank, a tank breathed twice like the travel tank
+    # has its first run in useFromTime2 and useUntilTime2
+    starts = np.flatnonzero(np.diff(tankIndex)) + 1
+    runStarts = np.concatenate(([0], starts))
+    runEnds = np.concatenate((starts, [len(profile) - 1]))
+    for index, tank in enumerate(tanks):
+        tank.pressure = float(pressures[-1, index])
+        runs = [(time[start], time[end]) for start, end in zip(runStarts, runEnds) if tankIndex[start] == index]
+        tank.useFromTime, tank.useUntilTime = runs[-1] if runs else (0, 0)
+        tank.useFromTime2, tank.useUntilTime2 = runs[0] if len(runs) > 1 else (0, 0)
+    return pressures
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_gfsweep.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# sweep of GF low x GF high for one dive, runtime, first stop, deepest ceiling and gas used of each pair
+#
+# usage: python pydplan_gfsweep.py --depth 45 --time 25 --gflow 10:100:5 --gfhigh 50:100:5 -o csv
+#
+# the descent and the bottom do not depend on the gradient factors, so the plan is calculated once and the
+# tissue state at the end of the bottom time is taken from its trajectory store. each GF pair only forks
+# that state into timeToSurface() of pydplan_solver, and the pairs can be spread over a pool of worker
+# processes.
+import argparse
+import json
+import os
+import sys
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
+
+from pydplan_buhlmann import depth2absolutePressure, modelTable
+from pydplan_classes import ModelEngine
+from pydplan_core import newPlan, runPlan
+from pydplan_decotable import gridRange
+from pydplan_profiletools import gradientFactor
+from pydplan_solver import timeToSurface
+from pydplan_tts import ascentGases, ascentTanks, bottomEnd, forkModel, planAscentRate
+from pydplan_zfactor import gasContent
+
+# with fewer pairs than this the sweep is calculated in this process, a pool costs more than it saves
+POOL_MIN_PAIRS = 64
+
+
+class GfSweep():
+    """
+    results of a GF sweep, one row per GF low and one column per GF high,
+    NaN where GF low is above GF high or the ascent cannot be completed
+    """
+    # attribute, label and unit of each result matrix
+    METRICS = (('runtime', 'runtime', 'min'),
+               ('firstStop', 'first stop', 'm'),
+               ('deepestCeiling', 'deepest ceiling', 'm'),
+               ('gasUsed', 'gas used', 'l'))
+
+    def __init__(self, gfLows, gfHighs, runtime, firstStop, deepestCeiling, gasUsed):
+        '''
+        :param gfLows: GF low of each row, 0.0 ... 1.0
+        :type gfLows: list
+        :param gfHighs: GF high of each column, 0.0 ... 1.0
+        :type gfHighs: list
+        :param runtime: total runtime in minutes
+        :type runtime: numpy.ndarray
+        :param firstStop: depth of the first deco stop in meters, 0.0 if none
+        :type firstStop: numpy.ndarray
+        :param deepestCeiling: the ceiling in meters when the ascent begins, at GF low
+        :type deepestCeiling: numpy.ndarray
+        :param gasUsed: gas used from all tanks in surface liters
+        :type gasUsed: numpy.ndarray
+        '''
+        self.gfLows = [float(x) for x in gfLows]
+        self.gfHighs = [float(x) for x in gfHighs]
+        self.runtime = runtime
+        self.firstStop = firstStop
+        self.deepestCeiling = deepestCeiling
+        self.gasUsed = gasUsed
+
+    def writeCsv(self, outFile):
+        '''
+        one line per GF pair
+        '''
+        outFile.write('GFlow,GFhigh,{}\n'.format(','.join(name for name, _, _ in self.METRICS)))
+        for row, low in enumerate(self.gfLows):
+            for column, high in enumerate(self.gfHighs):
+                values = [getattr(self, name)[row, column] for name, _, _ in self.METRICS]
+                if np.isnan(values[0]):
+                    continue
+                outFile.write('{:.0f},{:.0f},{:.2f},{:.0f},{:.2f},{:.0f}\n'
+                              .format(low * 100.0, high * 100.0, *values))
+
+    def writeText(self, outFile, metric = 'runtime'):
+        '''
+        one metric as a matrix, GF low down and GF high across
+        '''
+        label, unit = [(label, unit) for name, label, unit in self.METRICS if name == metric][0]
+        outFile.write('{} ({}), GF low down, GF high across\n'.format(label, unit))
+        outFile.write('     ' + ''.join('{:>7.0f}'.format(high * 100.0) for high in self.gfHighs) + '\n')
+        values = getattr(self, metric)
+        for row, low in enumerate(self.gfLows):
+            outFile.write('{:>4.0f} '.format(low * 100.0) +
+                          ''.join('{:>7}'.format('-' if np.isnan(value) else '{:.1f}'.format(value))
+                                  for value in values[row]) + '\n')
+
+
+def bottomGasUsed(diveplan, end):
+    '''
+    :return: liters used from all tanks until the profile point end, like the descent and the bottom
+    :rtype: float
+    '''
+    pressures = {}
+    for point in diveplan.profileSampled[:end + 1]:
+        pressures[point.tank.name] = point.currentTankPressure
+    tanks = {tank.name: tank for tank in diveplan.tankList.values()}
+    return sum(gasContent(tanks[name], tanks[name].bar) - gasContent(tanks[name], pressure)
+               for name, pressure in pressures.items())
+
+
+def sweepPair(pair, modelName, depth, helium, nitrogen, gases, SACs, rate, ascentBegins, bottomLiters):
+    '''
+    the ascent of one GF pair from the bottom state, runs in a worker process
+
+    :param pair: (GF low, GF high)
+    :type pair: tuple
+    :param SACs: SAC in l/min of each gas in gases
+    :type SACs: list
+    :return: runtime in minutes, first stop depth, ceiling at the start of the ascent and gas used in liters
+    :rtype: tuple
+    '''
+    GFlow, GFhigh = pair
+    modelUsed = modelTable(modelName).modelUsed
+    gfObject = gradientFactor(GFlow=GFlow, GFhigh=GFhigh)
+    model = forkModel(modelUsed, helium, nitrogen, depth2absolutePressure(depth), GFlow)
+    ceiling = max(model.leadCeilingMeters, 0.0)
+    segments = []
+    seconds, stops = timeToSurface(model, modelUsed, depth, gases, gfObject, rate, segments=segments)
+    if seconds == float('inf'):
+        return np.nan, np.nan, ceiling, np.nan
+    liters = bottomLiters
+    for beginDepth, endDepth, interval, gas in segments:
+        avgPressure = (depth2absolutePressure(beginDepth) + depth2absolutePressure(endDepth)) / 2.0
+        liters += SACs[gas] * interval / 60.0 * avgPressure
+    return (ascentBegins + seconds) / 60.0, stops[0][0] if stops else 0.0, ceiling, liters
+
+
+def gfSweep(diveplan, gfLows, gfHighs, workers = 1, chunksize = 8):
+    '''
+    runtime, first stop, deepest ceiling and gas used of each GF low x GF high pair of a plan
+
+    :param diveplan: the plan, it is calculated with its own GF pair if it has not been
+    :type diveplan: DivePlan
+    :param gfLows: GF low values, 0.0 ... 1.0
+    :type gfLows: list
+    :param gfHighs: GF high values, 0.0 ... 1.0
+    :type gfHighs: list
+    :param workers: number of worker processes, 1 calculates in this process,
+                    also sweeps with fewer than POOL_MIN_PAIRS pairs are calculated in this process
+    :type workers: int
+    :param chunksize: number of pairs sent to a worker at a time
+    :type chunksize: int
+    :return: the sweep
+    :rtype: GfSweep
+    :raises ValueError: if the plan cannot be calculated or has no bottom phase
+    '''
+    if not diveplan.profileSampled:
+        runPlan(diveplan)
+    end = bottomEnd(diveplan)
+    point = diveplan.profileSampled[end]
+    depth = diveplan.bottomDepth
+    tanks = ascentTanks(diveplan, point.tank)
+    solve = partial(sweepPair, modelName=diveplan.model.modelName, depth=depth,
+                    helium=point.trajectory.heliumPressure[point.modelRow].copy(),
+                    nitrogen=point.trajectory.nitrogenPressure[point.modelRow].copy(),
+                    gases=ascentGases(diveplan, point.tank, depth), SACs=[tank.SAC for tank in tanks],
+                    rate=planAscentRate(diveplan), ascentBegins=diveplan.ascentBegins,
+                    bottomLiters=bottomGasUsed(diveplan, end))
+
+    gfLows = [float(x) for x in gfLows]
+    gfHighs = [float(x) for x in gfHighs]
+    cells = [(row, column) for row, low in enumerate(gfLows) for column, high in enumerate(gfHighs)
+             if low <= high]
+    pairs = [(gfLows[row], gfHighs[column]) for row, column in cells]
+    if workers > 1 and len(pairs) >= POOL_MIN_PAIRS:
+        with Pool(workers) as pool:
+            results = pool.map(solve, pairs, chunksize=max(chunksize, 1))
+    else:
+        results = list(map(solve, pairs))
+
+    shape = (len(gfLows), len(gfHighs))
+    matrices = [np.full(shape, np.nan) for _ in GfSweep.METRICS]
+    for (row, column), result in zip(cells, results):
+        for matrix, value in zip(matrices, result):
+            matrix[row, column] = value
+    return GfSweep(gfLows, gfHighs, *matrices)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='PYDPLAN GF low x GF high sweep')
+    parser.add_argument('--depth', type=float, required=True, help='bottom depth in meters')
+    parser.add_argument('--time', type=float, required=True, help='bottom time in minutes')
+    parser.add_argument('--gflow', default='10:100:5', help='GF low in percent, first:last:step or a list')
+    parser.add_argument('--gfhigh', default='50:100:5', help='GF high in percent, first:last:step or a list')
+    parser.add_argument('--tanks', default=None,
+                        help='JSON of changes to the default tanks, like {"BOTTOM": {"o2": 18, "he": 45}}')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('-o', '--output-format', choices=['csv', 'text'], default='text',
+                        help='csv has one line per pair, text has one matrix per result')
+    args = parser.parse_args(argv)
+
+    gfLows = [x / 100.0 for x in gridRange(args.gflow)]
+    gfHighs = [x / 100.0 for x in gridRange(args.gfhigh)]
+    try:
+        diveplan = newPlan(args.depth, args.time, tanks=json.loads(args.tanks) if args.tanks else None,
+                           engine=ModelEngine.Lazy.value)
+        sweep = gfSweep(diveplan, gfLows, gfHighs, workers=args.workers)
+    except ValueError as error:
+        parser.exit(1, '{}\n'.format(error))
+    if args.output_format == 'csv':
+        sweep.writeCsv(sys.stdout)
+    else:
+        for name, _, _ in GfSweep.METRICS:
+            sweep.writeText(sys.stdout, name)
+            sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
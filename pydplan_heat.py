@@ -86,3 +86,94 @@ class PlotHeatMapWidget(QWidget):
                 qp.setBrush(brush)
                 qp.drawRect(x, y, xStep, yStep)
 
+
+class PlotGfSweepWidget(QWidget):
+    """
+    one result of a GF sweep as a heat map, GF low down and GF high across, green is low and red is high
+    """
+    def __init__(self, plan=None):
+        super().__init__()
+        self.plan = plan
+        self.sweep = None
+        self.metric = 'runtime'
+        self.initUI()
+
+    def initUI(self):
+        self.qp = QPainter()
+        self.show()
+
+    def setPlan(self, plan):
+        self.plan = plan
+
+    def setSweep(self, sweep):
+        self.sweep = sweep
+        self.update()
+
+    def setMetric(self, metric):
+        self.metric = metric
+        self.update()
+
+    def paintEvent(self, e):
+        self.qp.begin(self)
+        self.drawSize(self.qp)
+        self.drawGfSweep(self.qp)
+        self.qp.end()
+
+    def drawSize(self, qp):
+        size = self.size()
+        self.plot_width = size.width()
+        self.plot_height = size.height()
+
+    def drawGfSweep(self, qp):
+        qp.setPen(QPen(Qt.black, 1, Qt.SolidLine))
+        if self.sweep is None:
+            qp.drawText(10, 20, 'press sweep to calculate the plan with each GF low x GF high pair')
+            return
+        sweep = self.sweep
+        values = getattr(sweep, self.metric)
+        label, unit = [(label, unit) for name, label, unit in sweep.METRICS if name == self.metric][0]
+        finite = values[values == values]
+        if len(finite) == 0:
+            qp.drawText(10, 20, 'no GF pair could be calculated')
+            return
+        low, high = finite.min(), finite.max()
+        qp.drawText(10, 15, '{} {}, {:.1f} ... {:.1f} {}, GF low down, GF high across'
+                    .format(label, unit, low, high, unit))
+
+        left, top, bottom = 40, 25, 20
+        xStep = (self.plot_width - left) / len(sweep.gfHighs)
+        yStep = (self.plot_height - top - bottom) / len(sweep.gfLows)
+        hColor = QColor(Qt.white)
+        for row, gfLow in enumerate(sweep.gfLows):
+            y = int(top + row * yStep)
+            qp.setPen(QPen(Qt.black, 1, Qt.SolidLine))
+            qp.drawText(5, int(y + yStep / 2 + 5), '{:.0f}'.format(gfLow * 100.0))
+            for column, gfHigh in enumerate(sweep.gfHighs):
+                x = int(left + column * xStep)
+                value = values[row, column]
+                if value != value:
+                    # GF low above GF high, or no ascent
+                    brush = QBrush(Qt.lightGray)
+                else:
+                    # 120 is green for the lowest value, 0 is red for the highest
+                    delta = (value - low) / (high - low) if high > low else 0.0
+                    hColor.setHsl(int(120 * (1.0 - delta)), 200, 150)
+                    brush = QBrush(hColor)
+                qp.setPen(QPen(Qt.white, 0, Qt.NoPen))
+                qp.setBrush(brush)
+                qp.drawRect(x, y, int(xStep) + 1, int(yStep) + 1)
+                if value == value and xStep > 30 and yStep > 12:
+                    qp.setPen(QPen(Qt.black, 1, Qt.SolidLine))
+                    qp.drawText(x + 2, int(y + yStep / 2 + 5), '{:.0f}'.format(value))
+        qp.setPen(QPen(Qt.black, 1, Qt.SolidLine))
+        for column, gfHigh in enumerate(sweep.gfHighs):
+            qp.drawText(int(left + column * xStep + 2), self.plot_height - 5, '{:.0f}'.format(gfHigh * 100.0))
+
+        # frame the GF pair of the plan itself
+        if self.plan is not None:
+            for row, gfLow in enumerate(sweep.gfLows):
+                for column, gfHigh in enumerate(sweep.gfHighs):
+                    if abs(gfLow - self.plan.GFlow) < 1e-6 and abs(gfHigh - self.plan.GFhigh) < 1e-6:
+                        qp.setPen(QPen(Qt.black, 2, Qt.SolidLine))
+                        qp.setBrush(QBrush(Qt.NoBrush))
+                        qp.drawRect(int(left + column * xStep), int(top + row * yStep), int(xStep), int(yStep))
@@ -0,0 +1,274 @@
+#!/usr/bin/python
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_live.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# live dive computer mode, the model state is updated from a depth feed one sample at a time
+#
+# usage: python pydplan_live.py dive.csv [--hz 10] [--gf 30/80]     replay a CSV or UDDF log
+#        python pydplan_live.py --listen 5555                        read "time,depth" lines from a socket
+#        python pydplan_live.py dive.csv --send 5555 --hz 10         stand-in logger, send a log to a socket
+#
+# each sample is calculated with calculateAllTissuesDepth() of the same engines the planner uses, then the
+# no decompression limit and the time to surface are solved from the current state. the time from the arrival
+# of a sample to its report is collected into a latency histogram, to check that the model keeps up with
+# the sample rate of the logger.
+import argparse
+import copy
+import json
+import math
+import socket
+import sys
+import time
+from bisect import bisect_left
+
+from pydplan_buhlmann import modelTable
+from pydplan_classes import ModelEngine
+from pydplan_core import newPlan
+from pydplan_logimport import logSamples, parseSeconds, replayLog
+from pydplan_profiletools import engineModel, gradientFactor
+from pydplan_solver import noDecoTime, timeToSurface
+from pydplan_tts import ascentGases, planAscentRate
+from pydplan_vector import coefficientArrays
+from pydplan_zfactor import contentCurve
+
+
+class LatencyHistogram():
+    """
+    counts of sample latencies in fixed buckets, the memory used does not grow with the number of samples
+    """
+    # upper bounds of the buckets in seconds, the last bucket has everything slower
+    BOUNDS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, percent):
+        '''
+        :return: upper bound in seconds of the bucket where the percentile is, math.inf if in the last bucket
+        :rtype: float
+        '''
+        limit = self.count * percent / 100.0
+        counted = 0
+        for bucket, count in enumerate(self.counts):
+            counted += count
+            if counted >= limit and count:
+                return self.BOUNDS[bucket] if bucket < len(self.BOUNDS) else float('inf')
+        return 0.0
+
+    def over(self, budget):
+        '''
+        :param budget: seconds, one of BOUNDS
+        :type budget: float
+        :return: number of samples slower than budget
+        :rtype: int
+        '''
+        return sum(self.counts[bisect_left(self.BOUNDS, budget) + 1:])
+
+    def writeText(self, outFile, rates = (1.0, 10.0)):
+        outFile.write('latency of {} samples, mean {:.2f} ms, max {:.2f} ms, p50 <= {:g} ms, p99 <= {:g} ms\n'
+                      .format(self.count, self.total / max(self.count, 1) * 1000.0, self.maximum * 1000.0,
+                              self.percentile(50.0) * 1000.0, self.percentile(99.0) * 1000.0))
+        widest = max(self.counts + [1])
+        for bucket, count in enumerate(self.counts):
+            if bucket < len(self.BOUNDS):
+                label = '<= {:g} ms'.format(self.BOUNDS[bucket] * 1000.0)
+            else:
+                label = '> {:g} ms'.format(self.BOUNDS[-1] * 1000.0)
+            outFile.write('{:>12} {:>8} {}\n'.format(label, count, '#' * int(round(40.0 * count / widest))))
+        for rate in rates:
+            outFile.write('{:g} Hz: {} samples over the {:g} ms budget\n'
+                          .format(rate, self.over(1.0 / rate), 1000.0 / rate))
+
+
+class LiveSample():
+    """
+    what the dive computer shows after one sample
+    """
+    __slots__ = ('time', 'depth', 'ceiling', 'ceilingStop', 'leadTissue', 'gfNow', 'ndl', 'tts', 'stops',
+                 'tank', 'tankPressure', 'latency')
+
+    def asDict(self):
+        '''
+        the sample for JSON, an NDL or TTS that is not finite is None, it has no JSON number
+        '''
+        sample = {name: getattr(self, name) for name in self.__slots__ if name != 'tank'}
+        for name in ('ndl', 'tts'):
+            if not math.isfinite(sample[name]):
+                sample[name] = None
+        return sample
+
+
+class LiveComputer():
+    """
+    keeps the tissue state of a dive going on, and reports the ceiling, lead tissue, NDL and TTS of each sample
+    """
+    def __init__(self, diveplan, budget = 0.1):
+        '''
+        :param diveplan: the tanks, GF, ascent rates and engine of the dive
+        :type diveplan: DivePlan
+        :param budget: seconds a sample may take, samples slower than this are marked late
+        :type budget: float
+        '''
+        self.diveplan = diveplan
+        self.budget = budget
+        self.histogram = LatencyHistogram()
+        self.late = 0
+        self.maxDepth = 0.0
+        # the tank pressures use the Z factor table, build it now and not when the first sample arrives
+        for tank in diveplan.tankList.values():
+            contentCurve(tank.o2, tank.he)
+
+    def run(self, samples):
+        '''
+        calculate the samples of the feed as they arrive
+
+        :param samples: (time in seconds, depth in meters), like from logSamples() or socketSamples()
+        :type samples: iterable
+        :return: generator of the state after each sample
+        :rtype: generator
+        '''
+        diveplan = self.diveplan
+        modelUsed = modelTable('ZHL16c').modelUsed
+        coefficients = coefficientArrays(modelUsed)
+        model = engineModel(diveplan.engine)
+        model.initSurface(modelUsed)
+        gfObject = gradientFactor(GFlow=diveplan.GFlow, GFhigh=diveplan.GFhigh)
+        arrival = [0.0]
+
+        def timed(samples):
+            for sample in samples:
+                arrival[0] = time.perf_counter()
+                yield sample
+
+        for sample in replayLog(diveplan, timed(samples), model, gfObject):
+            self.maxDepth = max(self.maxDepth, sample.depth)
+            gases = ascentGases(diveplan, sample.tank, sample.depth)
+            live = LiveSample()
+            live.time = sample.time
+            live.depth = sample.depth
+            live.ceiling = max(sample.ceiling, 0.0)
+            live.ceilingStop = max(sample.ceilingStop, 0)
+            live.leadTissue = sample.leadTissue
+            live.gfNow = sample.gfNow
+            live.tank = sample.tank
+            live.tankPressure = sample.tankPressure
+            live.ndl = noDecoTime(model, coefficients, sample.depth, gases[0][1], gases[0][2], diveplan.GFhigh)
+            # the ascent is calculated on copies, the dive goes on from the current state. the ascent
+            # rates change at half of the maximum depth so far, like at half of the bottom depth in a plan
+            seconds, stops = timeToSurface(copy.deepcopy(model), modelUsed, sample.depth, gases,
+                                           copy.copy(gfObject), planAscentRate(diveplan, self.maxDepth))
+            live.tts = seconds / 60.0
+            live.stops = [(depth, stopSeconds / 60.0) for depth, stopSeconds in stops]
+            live.latency = time.perf_counter() - arrival[0]
+            self.histogram.add(live.latency)
+            if live.latency > self.budget:
+                self.late += 1
+            yield live
+
+
+def socketSamples(port, host = '127.0.0.1'):
+    '''
+    wait for one connection on a TCP port and read "time,depth" lines from it until it is closed,
+    the time in seconds or "mm:ss" and the depth in meters
+
+    :return: generator of (time in seconds, depth in meters)
+    :rtype: generator
+    '''
+    with socket.create_server((host, port)) as server:
+        connection, _ = server.accept()
+        with connection, connection.makefile('r') as lines:
+            for line in lines:
+                fields = line.strip().split(',')
+                if len(fields) < 2:
+                    continue
+                yield parseSeconds(fields[0]), float(fields[1])
+
+
+def paced(samples, hz):
+    '''
+    give the samples at a fixed rate, like a logger does
+    '''
+    interval = 1.0 / hz
+    due = time.perf_counter()
+    for sample in samples:
+        delay = due - time.perf_counter()
+        if delay > 0.0:
+            time.sleep(delay)
+        due += interval
+        yield sample
+
+
+def sendSamples(samples, port, host = '127.0.0.1', hz = 1.0):
+    '''
+    stand-in for a logger, send the samples as "time,depth" lines to a TCP port at hz samples per second
+    '''
+    with socket.create_connection((host, port)) as connection:
+        for sampleTime, depth in paced(samples, hz):
+            connection.sendall('{:.1f},{:.2f}\n'.format(sampleTime, depth).encode())
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='PYDPLAN live dive computer mode')
+    parser.add_argument('log', nargs='?', help='dive log to replay, CSV or UDDF')
+    parser.add_argument('--listen', type=int, default=None, help='read samples from this TCP port instead')
+    parser.add_argument('--send', type=int, default=None, help='send the log to this TCP port at --hz')
+    parser.add_argument('--hz', type=float, default=None,
+                        help='samples per second, the log is replayed as fast as possible if not given')
+    parser.add_argument('--gf', default='30/80', help='GF pair as low/high in percent')
+    parser.add_argument('--tanks', default=None,
+                        help='JSON of changes to the default tanks, like {"BOTTOM": {"o2": 18, "he": 45}}')
+    parser.add_argument('--engine', choices=['lazy', 'vector', 'scalar'], default='vector',
+                        help='model engine')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='latency budget in ms, default one sample interval of --hz or 100 ms')
+    parser.add_argument('--output-format', choices=['text', 'jsonl', 'none'], default='text',
+                        help='report of each sample, the latency histogram is printed at the end')
+    args = parser.parse_args(argv)
+    if args.send is not None:
+        if args.log is None:
+            parser.error('--send needs a log to send')
+        sendSamples(logSamples(args.log), args.send, hz=args.hz or 1.0)
+        return
+    if args.listen is not None:
+        samples = socketSamples(args.listen)
+    elif args.log is not None:
+        samples = logSamples(args.log)
+        if args.hz:
+            samples = paced(samples, args.hz)
+    else:
+        parser.error('give a log to replay or --listen')
+
+    GFlow, GFhigh = (float(x) / 100.0 for x in args.gf.split('/'))
+    try:
+        # only the tanks, GF, rates and engine are used, the depths come from the feed
+        diveplan = newPlan(1.0, 1.0, GFlow=GFlow, GFhigh=GFhigh,
+                           tanks=json.loads(args.tanks) if args.tanks else None,
+                           engine=ModelEngine[args.engine.capitalize()].value)
+    except ValueError as error:
+        parser.error(str(error))
+    budget = args.budget / 1000.0 if args.budget else (1.0 / args.hz if args.hz else 0.1)
+    computer = LiveComputer(diveplan, budget)
+    for live in computer.run(samples):
+        if args.output_format == 'jsonl':
+            sys.stdout.write(json.dumps(live.asDict(), allow_nan=False) + '\n')
+        elif args.output_format == 'text':
+            sys.stdout.write('{:>7.0f} s {:>6.1f} m  ceiling {:>5.1f} m  TC{:<2d} GF {:>3.0f}%  NDL {:>4}  '
+                             'TTS {:>5.1f} min  {} {:>5.1f} bar {:>7.2f} ms\n'
+                             .format(live.time, live.depth, live.ceiling, live.leadTissue + 1,
+                                     live.gfNow * 100.0, '-' if live.ndl > 99 else '{:.0f}'.format(live.ndl),
+                                     live.tts, live.tank.name, live.tankPressure, live.latency * 1000.0))
+    computer.histogram.writeText(sys.stdout)
+    sys.stdout.write('{} samples over the {:g} ms budget\n'.format(computer.late, budget * 1000.0))
+
+
+if __name__ == '__main__':
+    main()
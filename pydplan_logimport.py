@@ -0,0 +1,282 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_logimport.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# replay of recorded dive computer logs through the tissue model, used by PlanMode.Import
+#
+# the samples are read from a CSV or UDDF file one at a time and each segment between two samples is
+# calculated with the Schreiner equation, like the descent and ascent of a planned dive. nothing is stored
+# per sample, so a log of any length is replayed in constant memory. the caller decides what to keep.
+import csv
+import os
+import xml.etree.ElementTree as ElementTree
+
+from pydplan_buhlmann import modelTable, Constants
+from pydplan_classes import ModelEngine, TankType
+from pydplan_trajectory import ModelTrajectory
+from pydplan_profiletools import gradientFactor, tanksCheck, engineModel, DivePhase, DiveProfilePoint
+from pydplan_gasuse import consumeGas
+
+# an ascent this many meters above the maximum depth so far starts the ascent, the deco gases
+# are then switched at their change depths and the GF is set at the first ceiling
+ASCENT_MARGIN = 3.0
+
+
+def parseSeconds(text):
+    '''
+    sample time as seconds, or as "mm:ss" or "h:mm:ss"
+    '''
+    seconds = 0.0
+    for part in text.strip().split(':'):
+        seconds = seconds * 60.0 + float(part)
+    return seconds
+
+
+def readCsvSamples(path):
+    '''
+    read (time, depth) samples from a CSV file, one line at a time
+
+    the columns are found from a header line by names starting with "time" and "depth", like
+    "Time (s)" or "depth_m". without a header the first column is the time and the second the depth.
+    time is in seconds or "mm:ss", depth in meters.
+
+    :param path: the CSV file
+    :type path: str
+    :return: generator of (time in seconds, depth in meters)
+    :rtype: generator
+    '''
+    with open(path, newline='') as csvFile:
+        timeColumn, depthColumn = 0, 1
+        for lineNumber, row in enumerate(csv.reader(csvFile), start=1):
+            if not row or not ''.join(row).strip():
+                continue
+            names = [name.strip().lower() for name in row]
+            if lineNumber == 1 and any(name.startswith('time') for name in names):
+                timeColumn = [name.startswith('time') for name in names].index(True)
+                depthColumn = [name.startswith('depth') for name in names].index(True)
+                continue
+            try:
+                yield parseSeconds(row[timeColumn]), float(row[depthColumn])
+            except (ValueError, IndexError):
+                raise ValueError('{} line {}: invalid sample {}'.format(path, lineNumber, ','.join(row)))
+
+
+def readUddfSamples(path):
+    '''
+    read (time, depth) samples from the waypoints of an UDDF file, one waypoint at a time
+
+    :param path: the UDDF file
+    :type path: str
+    :return: generator of (time in seconds, depth in meters), from the divetime and depth of each waypoint
+    :rtype: generator
+    '''
+    # the open elements from the root down, the parser keeps them in the tree until they end
+    parents = []
+    for event, element in ElementTree.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        # UDDF uses a default namespace, only the local part of the tag is compared
+        if element.tag.rsplit('}', 1)[-1] != 'waypoint':
+            continue
+        values = {child.tag.rsplit('}', 1)[-1]: child.text for child in element}
+        if 'divetime' in values and 'depth' in values:
+            yield float(values['divetime']), float(values['depth'])
+        # drop the waypoints already read from their parent, like <samples>, the tree does not grow with the log
+        if parents:
+            del parents[-1][:]
+
+
+def logSamples(path, fileFormat = None):
+    '''
+    :param path: the log file
+    :type path: str
+    :param fileFormat: 'csv' or 'uddf', by default from the file name extension
+    :type fileFormat: str
+    :return: generator of (time in seconds, depth in meters)
+    :rtype: generator
+    '''
+    if fileFormat is None:
+        fileFormat = 'uddf' if os.path.splitext(path)[1].lower() in ['.uddf', '.xml'] else 'csv'
+    if fileFormat == 'uddf':
+        return readUddfSamples(path)
+    elif fileFormat == 'csv':
+        return readCsvSamples(path)
+    raise ValueError('unsupported log format {}'.format(fileFormat))
+
+
+class ReplaySample():
+    """
+    the state after one sample of a replayed log. model is the live model state of the replay,
+    it is valid until the next sample is read
+    """
+    __slots__ = ('time', 'depth', 'tank', 'tankPressure', 'gfNow', 'gfSet', 'ascending',
+                 'ceiling', 'ceilingStop', 'leadTissue', 'ppOxygen', 'model')
+
+    def __init__(self, time, depth, tank, gfNow, gfSet, ascending, model):
+        self.time = time
+        self.depth = depth
+        self.tank = tank
+        self.tankPressure = tank.pressure
+        self.gfNow = gfNow
+        self.gfSet = gfSet
+        self.ascending = ascending
+        self.ceiling = model.leadCeilingMeters
+        self.ceilingStop = model.leadCeilingStop
+        self.leadTissue = model.leadTissue
+        self.ppOxygen = model.ambient * tank.o2 / 100.0 / Constants.surfacePressure
+        self.model = model
+
+
+def replayLog(diveplan, samples, model = None, gfObject = None):
+    '''
+    calculate the tissues along recorded samples, yielding the state after each sample
+
+    the tanks of the dive plan are used like in a calculated plan: the travel tank until its change depth
+    on descent, then the bottom tank, and on ascent the next tank from its change depth on. gas is used
+    with the SAC of the tank breathed. the GF is GF low until the first ceiling on ascent, then changes
+    towards GF high at the surface. the dive starts at the surface at time 0.
+
+    :param diveplan: the dive plan, its tanks, GF and engine are used, the tank pressures and max values are updated
+    :type diveplan: DivePlan
+    :param samples: (time in seconds, depth in meters) in time order, see logSamples()
+    :type samples: iterable
+    :param model: the model state to use, by default a new one at surface saturation for diveplan.engine
+    :type model: ModelPoint
+    :param gfObject: the gradient factors to use, by default new ones from GF low and high of diveplan
+    :type gfObject: gradientFactor
+    :return: generator of the state after each sample
+    :rtype: generator
+    '''
+    if gfObject is None:
+        gfObject = gradientFactor(GFlow=diveplan.GFlow, GFhigh=diveplan.GFhigh)
+    modelUsed = modelTable('ZHL16c').modelUsed
+    diveplan.modelUsed = modelUsed
+    if model is None:
+        model = engineModel(diveplan.engine)
+        model.initSurface(modelUsed)
+    diveplan.maxPPoxygen = 0.0
+    diveplan.maxPPhelium = 0.0
+    diveplan.maxPPnitrogen = 0.0
+    diveplan.maxTCnitrogen = 0.0
+    diveplan.maxTChelium = 0.0
+    tanksCheck(diveplan, DivePhase.INIT_TANKS)
+    tanksCheck(diveplan, DivePhase.STARTING)
+
+    beginTime = 0.0
+    beginDepth = 0.0
+    maxDepth = 0.0
+    ascending = False
+    for time, depth in samples:
+        if time < beginTime:
+            raise ValueError('log samples are not in time order at {:.0f} s'.format(time))
+        if time == beginTime:
+            # repeated sample, nothing to calculate
+            continue
+        depth = max(depth, 0.0)
+        intervalMinutes = (time - beginTime) / 60.0
+        maxDepth = max(maxDepth, depth)
+        ascending = ascending or depth < maxDepth - ASCENT_MARGIN
+
+        # tank changes, the gas of the segment is the one at its beginning
+        travel = diveplan.tankList[TankType.TRAVEL]
+        if diveplan.currentTank is travel and diveplan.nextTank is diveplan.tankList[TankType.BOTTOM]:
+            if beginDepth >= travel.changeDepth:
+                tanksCheck(diveplan, DivePhase.STOP_DESC_T, runtime=beginTime)
+        elif ascending and diveplan.nextTank is not None and beginDepth <= diveplan.nextTank.changeDepth:
+            tanksCheck(diveplan, DivePhase.STOP_ASC_T, runtime=beginTime)
+        tank = diveplan.currentTank
+        tanksCheck(diveplan, DivePhase.BOTTOM, runtime=time)
+        consumeGas(diveplan, beginDepth, depth, intervalMinutes)
+
+        heliumFraction = tank.he / 100.0
+        nitrogenFraction = 1.0 - heliumFraction - tank.o2 / 100.0
+        gfNow = gfObject.gfGet(depth)
+        model.calculateAllTissuesDepth(modelUsed=modelUsed, beginDepth=beginDepth, endDepth=depth,
+                                       intervalMinutes=intervalMinutes, heliumFraction=heliumFraction,
+                                       nitrogenFraction=nitrogenFraction, gfNow=gfNow)
+        if ascending and not gfObject.gfSetFlag and model.leadCeilingStop > 0:
+            # the first ceiling on ascent, GF goes from here to GF high at the surface
+            gfNow = gfObject.gfSet(model.leadCeilingStop)
+
+        sample = ReplaySample(time, depth, tank, gfNow, gfObject.gfSetFlag, ascending, model)
+        pressure = model.ambient / Constants.surfacePressure
+        diveplan.maxPPoxygen = max(diveplan.maxPPoxygen, sample.ppOxygen)
+        diveplan.maxPPhelium = max(diveplan.maxPPhelium, pressure * heliumFraction)
+        diveplan.maxPPnitrogen = max(diveplan.maxPPnitrogen, pressure * nitrogenFraction)
+        diveplan.maxPPanyGas = max(diveplan.maxPPoxygen, diveplan.maxPPhelium, diveplan.maxPPnitrogen)
+        diveplan.maxTCnitrogen = max(diveplan.maxTCnitrogen, model.maxNitrogenPressure)
+        diveplan.maxTChelium = max(diveplan.maxTChelium, model.maxHeliumPressure)
+        yield sample
+        beginTime = time
+        beginDepth = depth
+    if diveplan.currentTank is not None:
+        diveplan.currentTank.useUntilTime = beginTime
+
+
+def importPlan(diveplan, interval = None):
+    '''
+    replay the log of diveplan.importFile into a dive profile for plotting and tables. one profile point is
+    kept every interval seconds, at tank changes, when the GF is set and at the last sample, the other
+    samples are calculated but not stored
+
+    :param diveplan: the dive plan, importFile is the log to replay
+    :type diveplan: DivePlan
+    :param interval: seconds between the profile points kept, default diveplan.importInterval
+    :type interval: float
+    :return: the model states of the profile points
+    :rtype: ModelTrajectory
+    '''
+    if not diveplan.importFile:
+        raise ValueError('no dive log selected to import')
+    if interval is None:
+        interval = diveplan.importInterval
+    model = engineModel(diveplan.engine)
+    model.initSurface(modelTable('ZHL16c').modelUsed)
+    modelPoints = ModelTrajectory(modelTable('ZHL16c').modelUsed, model.modelUsed,
+                                  lazy=diveplan.engine == ModelEngine.Lazy.value)
+    diveplan.decoStopsCalculated = []
+    diveplan.ascentBegins = 0
+    outProfile = []
+
+    def keep(sample):
+        point = DiveProfilePoint(sample.time, sample.depth, sample.tank,
+                                 divephase=DivePhase.ASCENDING if sample.ascending else DivePhase.BOTTOM,
+                                 gfSet=sample.gfSet, ascending=sample.ascending)
+        point.gfNow = sample.gfNow
+        point.depthRunAvg = depthSum / (sample.time / 60.0)
+        point.currentTankPressure = sample.tankPressure
+        heliumFraction = sample.tank.he / 100.0
+        nitrogenFraction = 1.0 - heliumFraction - sample.tank.o2 / 100.0
+        point.ppOxygen = sample.ppOxygen
+        point.ppHelium = point.pressure * heliumFraction / Constants.surfacePressure
+        point.ppNitrogen = point.pressure * nitrogenFraction / Constants.surfacePressure
+        point.setModelRow(modelPoints, modelPoints.append(sample.model, sample.time, sample.depth))
+        outProfile.append(point)
+
+    depthSum = 0.0
+    maxDepth = -1.0
+    last = None
+    kept = None
+    for sample in replayLog(diveplan, logSamples(diveplan.importFile), model):
+        previousTime, previousDepth = (last.time, last.depth) if last is not None else (0.0, 0.0)
+        depthSum += (previousDepth + sample.depth) / 2.0 * (sample.time - previousTime) / 60.0
+        if sample.depth > maxDepth:
+            maxDepth = sample.depth
+            diveplan.ascentBegins = sample.time
+        if (kept is None or sample.time - kept.time >= interval or sample.tank is not kept.tank
+                or sample.gfSet != kept.gfSet):
+            keep(sample)
+            kept = sample
+        last = sample
+    if last is None:
+        raise ValueError('{} has no dive samples'.format(diveplan.importFile))
+    if kept is not last:
+        # the model is still at the state of the last sample
+        keep(last)
+    outProfile[-1].divephase = DivePhase.SURFACE
+    modelPoints.trim()
+    diveplan.profileSampled = outProfile
+    diveplan.model = modelPoints
+    return modelPoints
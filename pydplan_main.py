@@ -5,13 +5,20 @@
 
 
 # import modules, like PyQt5 stuff
+import io
+import os
 from pydplan_classes import DivePlan, DecoStop
 from pydplan_plot import PlotPlanWidget, PlotBelowWidget, PlotPressureGraphWidget, \
-    PlotTissuesWidget
+    PlotTissuesWidget, tankColors
 from pydplan_table import *
 from pydplan_bars import *
 from pydplan_heat import *
 from pydplan_profiletools import calculatePlan
+from pydplan_tts import ttsCurve
+from pydplan_gfsweep import GfSweep, gfSweep
+from pydplan_decotable import gridRange
+from pydplan_bailout import bailoutCard, planRecord
+from pydplan_plancache import planFingerprint
 from pydplan_classes import PlanMode
 
 from PyQt5.QtCore import Qt
@@ -30,6 +37,13 @@ class pydplan_main(QMainWindow):
     def initUI(self):
         self.divePlan = DivePlan()
         self.divePlan.setDefaults()
+        for iTank, tank in self.divePlan.tankList.items():
+            tank.color = tankColors[iTank]
+        # the control widgets, and the methods that a widget change calls
+        self.widgetsCtrl = dict()
+        self.objectOfWidget = dict()
+        # plan fingerprint of the TTS curve drawn, it is calculated again when the plan changes
+        self.ttsFingerprint = None
         global globalDivePlan
         globalDivePlan = self.divePlan
 
@@ -111,7 +125,7 @@ class pydplan_main(QMainWindow):
         self.tcSlider.setSingleStep(1)
         self.tcSlider.setFocusPolicy(Qt.StrongFocus)
         self.tcSlider.setTickPosition(QSlider.TicksBelow)
-        self.divePlan.widgetsCtrl['tcSlider'] = self.tcSlider
+        self.widgetsCtrl['tcSlider'] = self.tcSlider
         self.tcSlider.valueChanged.connect(self.tcSliderChanged)
         barsLayout.addWidget(self.tcSlider)
         barsLayout.addWidget(self.tcBars)
@@ -121,6 +135,38 @@ class pydplan_main(QMainWindow):
         self.heatW = PlotHeatMapWidget(self.divePlan)
         self.tabOutputs.addTab(self.heatW, 'Heat')
 
+        # GF low x GF high sweep
+        sweepW = QWidget()
+        sweepLayout = QVBoxLayout()
+        sweepW.setLayout(sweepLayout)
+        sweepCtrl = QHBoxLayout()
+        self.sweepMetric = QComboBox()
+        for name, label, unit in GfSweep.METRICS:
+            self.sweepMetric.addItem('{} {}'.format(label, unit), name)
+        self.sweepMetric.currentIndexChanged.connect(self.gfSweepMetricChanged)
+        sweepCtrl.addWidget(self.sweepMetric)
+        sweepButton = QPushButton('sweep')
+        sweepButton.clicked.connect(self.gfSweepRun)
+        sweepCtrl.addWidget(sweepButton)
+        sweepCtrl.addStretch()
+        sweepLayout.addLayout(sweepCtrl)
+        self.gfSweepW = PlotGfSweepWidget(self.divePlan)
+        sweepLayout.addWidget(self.gfSweepW)
+        self.tabOutputs.addTab(sweepW, 'GF sweep')
+
+        # lost gas contingencies side by side
+        bailoutW = QWidget()
+        bailoutLayout = QVBoxLayout()
+        bailoutW.setLayout(bailoutLayout)
+        bailoutButton = QPushButton('calculate contingencies')
+        bailoutButton.clicked.connect(self.bailoutRun)
+        bailoutLayout.addWidget(bailoutButton, 0, Qt.AlignLeft)
+        self.bailoutLabel = QLabel('the plan with each travel or deco gas lost, and with a deeper and longer bottom')
+        self.bailoutLabel.setFont(QtGui.QFont("Courier",8))
+        self.bailoutLabel.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        bailoutLayout.addWidget(self.bailoutLabel, 1)
+        self.tabOutputs.addTab(bailoutW, 'Bailout')
+
         # Plan print
         self.planout = QWidget()
         self.tabOutputs.addTab(self.planout, 'Plan')
@@ -195,13 +241,13 @@ class pydplan_main(QMainWindow):
         controls['gas'].setAutoFillBackground(True)
         controls['gas'].setPalette(palette1)
         lay.addWidget(controls['gas'], row, 3)
-        self.divePlan.widgetsCtrl['bottom'] = controls
+        self.widgetsCtrl['bottom'] = controls
 
         row += 1
         planAlterativesTabs = QTabWidget()
 
         planCalculCtrlW = self.initPlanCalcControls()
-        planImportCtrlW = QWidget()
+        planImportCtrlW = self.initPlanImportControls()
         planCustomCtrlW = self.initPlanCustomControls()
 
         ### lay out tabs
@@ -218,16 +264,16 @@ class pydplan_main(QMainWindow):
 
         row += 1
         lay.addWidget(QLabel('TOTAL TIME (min)'), row, 0, 1, 2)
-        self.divePlan.widgetsCtrl['totalTime'] = QLabel('000')
-        self.divePlan.widgetsCtrl['totalTime'].setAutoFillBackground(True)
-        self.divePlan.widgetsCtrl['totalTime'].setPalette(palette1)
-        lay.addWidget(self.divePlan.widgetsCtrl['totalTime'], row, 2)
+        self.widgetsCtrl['totalTime'] = QLabel('000')
+        self.widgetsCtrl['totalTime'].setAutoFillBackground(True)
+        self.widgetsCtrl['totalTime'].setPalette(palette1)
+        lay.addWidget(self.widgetsCtrl['totalTime'], row, 2)
         row += 1
         lay.addWidget(QLabel('AVERAGE DEPTH (m)'), row, 0, 1, 2)
-        self.divePlan.widgetsCtrl['avgDepth'] = QLabel('000')
-        self.divePlan.widgetsCtrl['avgDepth'].setAutoFillBackground(True)
-        self.divePlan.widgetsCtrl['avgDepth'].setPalette(palette1)
-        lay.addWidget(self.divePlan.widgetsCtrl['avgDepth'], row, 2)
+        self.widgetsCtrl['avgDepth'] = QLabel('000')
+        self.widgetsCtrl['avgDepth'].setAutoFillBackground(True)
+        self.widgetsCtrl['avgDepth'].setPalette(palette1)
+        lay.addWidget(self.widgetsCtrl['avgDepth'], row, 2)
 
         row += 1
         f1 = QFrame()
@@ -244,10 +290,10 @@ class pydplan_main(QMainWindow):
         for key in self.divePlan.rates.keys():
             rate = self.divePlan.rates[key]
             lay.addWidget(QLabel(rate['label']), row, 0, 1, labelSpan)
-            self.divePlan.widgetsCtrl[key] = QSpinBox()
-            self.divePlan.widgetsCtrl[key].setValue(rate['default'])
-            self.divePlan.widgetsCtrl[key].valueChanged.connect(self.drawNewProfile)
-            lay.addWidget(self.divePlan.widgetsCtrl[key], row, spCol)
+            self.widgetsCtrl[key] = QSpinBox()
+            self.widgetsCtrl[key].setValue(rate['default'])
+            self.widgetsCtrl[key].valueChanged.connect(self.drawNewProfile)
+            lay.addWidget(self.widgetsCtrl[key], row, spCol)
             row += 1
 
         row += 1
@@ -283,14 +329,14 @@ class pydplan_main(QMainWindow):
             controls[key] = QCheckBox()
             lay.addWidget(controls[key], row, 1 )
             controls[key].setChecked(thisGas.use)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setUse
+            self.objectOfWidget[controls[key]] = thisGas.setUse
             controls[key].stateChanged.connect (self.tankUseChange)
 
             key = 'oxygen'
             controls[key] = QSpinBox()
             controls[key].setRange(0, 100)
             controls[key].setValue(thisGas.o2)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setO2
+            self.objectOfWidget[controls[key]] = thisGas.setO2
             controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], row, 2 )
 
@@ -298,7 +344,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(0, 100)
             controls[key].setValue(thisGas.he)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setHe
+            self.objectOfWidget[controls[key]] = thisGas.setHe
             controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], row, 3 )
 
@@ -306,7 +352,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(0, 100)
             controls[key].setValue(thisGas.changeDepth)
-            #self.divePlan.objectOfWidget[controls['from']] = thisGas.setHe
+            #self.objectOfWidget[controls['from']] = thisGas.setHe
             #controls['from'].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], row, 4 )
 
@@ -331,7 +377,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(1, 50)
             controls[key].setValue(thisGas.liters)
-            #self.divePlan.objectOfWidget[controls[key]] = thisGas.setO2
+            #self.objectOfWidget[controls[key]] = thisGas.setO2
             #controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], row, 1 )
 
@@ -339,7 +385,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(1, 300)
             controls[key].setValue(thisGas.bar)
-            #self.divePlan.objectOfWidget[controls[key]] = thisGas.setO2
+            #self.objectOfWidget[controls[key]] = thisGas.setO2
             #controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], row, 2 )
 
@@ -347,7 +393,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(5, 50)
             controls[key].setValue(thisGas.SAC)
-            #self.divePlan.objectOfWidget[controls[key]] = thisGas.setO2
+            #self.objectOfWidget[controls[key]] = thisGas.setO2
             #controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], row, 3 )
 
@@ -355,7 +401,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QDoubleSpinBox()
             controls[key].setRange(1.0, 2.0)
             controls[key].setValue(thisGas.ppo2max)
-            #self.divePlan.objectOfWidget[controls[key]] = thisGas.setO2
+            #self.objectOfWidget[controls[key]] = thisGas.setO2
             #controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], row, 4 )
 
@@ -393,7 +439,7 @@ class pydplan_main(QMainWindow):
                 controls[key] = QCheckBox()
                 lay.addWidget(controls[key], 1, col )
                 controls[key].setChecked(thisGas.use)
-                self.divePlan.objectOfWidget[controls[key]] = thisGas.setUse
+                self.objectOfWidget[controls[key]] = thisGas.setUse
                 controls[key].stateChanged.connect (self.tankUseChange)
             else:
                 lay.addWidget(QLabel('YES'), 1, col)
@@ -402,7 +448,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(0, 100)
             controls[key].setValue(thisGas.o2)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setO2
+            self.objectOfWidget[controls[key]] = thisGas.setO2
             controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], 2, col )
 
@@ -410,7 +456,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(0, 100)
             controls[key].setValue(thisGas.he)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setHe
+            self.objectOfWidget[controls[key]] = thisGas.setHe
             controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], 3, col )
 
@@ -419,7 +465,7 @@ class pydplan_main(QMainWindow):
             controls[key].setRange(1.0, 2.0)
             controls[key].setSingleStep(0.1)
             controls[key].setValue(thisGas.ppo2max)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setPPo2max
+            self.objectOfWidget[controls[key]] = thisGas.setPPo2max
             controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], 4, col )
 
@@ -431,7 +477,7 @@ class pydplan_main(QMainWindow):
                 controls[key] = QSpinBox()
                 controls[key].setRange(1, 100)
                 controls[key].setValue(thisGas.changeDepth)
-                self.divePlan.objectOfWidget[controls[key]] = thisGas.setChangeDepth
+                self.objectOfWidget[controls[key]] = thisGas.setChangeDepth
                 controls[key].valueChanged.connect(self.tankConfigChange)
                 lay.addWidget(controls[key], 7, col )
 
@@ -439,7 +485,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(1, 50)
             controls[key].setValue(thisGas.liters)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setLiters
+            self.objectOfWidget[controls[key]] = thisGas.setLiters
             controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key],  8, col )
 
@@ -447,7 +493,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(1, 300)
             controls[key].setValue(thisGas.bar)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setBar
+            self.objectOfWidget[controls[key]] = thisGas.setBar
             controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], 9, col )
 
@@ -455,7 +501,7 @@ class pydplan_main(QMainWindow):
             controls[key] = QSpinBox()
             controls[key].setRange(5, 50)
             controls[key].setValue(thisGas.SAC)
-            self.divePlan.objectOfWidget[controls[key]] = thisGas.setSAC
+            self.objectOfWidget[controls[key]] = thisGas.setSAC
             controls[key].valueChanged.connect(self.tankConfigChange)
             lay.addWidget(controls[key], 10, col )
 
@@ -466,7 +512,7 @@ class pydplan_main(QMainWindow):
             col += 1
             allcontrols[thisGas.name] = controls
 
-        self.divePlan.widgetsCtrl['tanks'] = allcontrols
+        self.widgetsCtrl['tanks'] = allcontrols
         lay.setAlignment(Qt.AlignTop)
         return tankCtrl
 
@@ -496,12 +542,56 @@ class pydplan_main(QMainWindow):
             controls['gas'].setAutoFillBackground(True)
             controls['gas'].setPalette(palette1)
             lay.addWidget(controls['gas'], row, 3)
-            self.divePlan.widgetsCtrl[decoStop] = controls
+            self.widgetsCtrl[decoStop] = controls
             row += 1
 
         lay.setAlignment(Qt.AlignTop)
         return planCustomCtrlW
 
+    def initPlanImportControls(self):
+        thisWidget = QWidget()
+        lay = QGridLayout()
+        thisWidget.setLayout(lay)
+        importButton = QPushButton('open dive log...')
+        importButton.clicked.connect(self.importFileSelect)
+        lay.addWidget(importButton, 0, 0)
+        importLabel = QLabel('CSV or UDDF log, tanks and GF are taken from this plan')
+        importLabel.setWordWrap(True)
+        lay.addWidget(importLabel, 1, 0)
+        lay.setAlignment(Qt.AlignTop)
+
+        self.widgetsCtrl['importLabel'] = importLabel
+        return thisWidget
+
+    def importFileSelect(self):
+        fileName, _ = QFileDialog.getOpenFileName(self, 'open dive log', '',
+                                                  'dive logs (*.csv *.uddf *.xml);;all files (*)')
+        if fileName:
+            self.divePlan.importFile = fileName
+            self.widgetsCtrl['importLabel'].setText(os.path.basename(fileName))
+            self.drawNewProfile()
+
+    def gfSweepRun(self):
+        if self.divePlan.planMode != PlanMode.Calculate.value:
+            QMessageBox.information(self, 'GF sweep', 'the GF sweep is done in Calculate mode')
+            return
+        try:
+            sweep = gfSweep(self.divePlan, [x / 100.0 for x in gridRange('10:100:10')],
+                            [x / 100.0 for x in gridRange('50:100:5')], workers=os.cpu_count())
+        except ValueError as error:
+            QMessageBox.information(self, 'GF sweep', error.args[0])
+            return
+        self.gfSweepW.setSweep(sweep)
+
+    def bailoutRun(self):
+        card = bailoutCard(planRecord(self.divePlan), workers=os.cpu_count())
+        outText = io.StringIO()
+        card.writeText(outText)
+        self.bailoutLabel.setText(outText.getvalue())
+
+    def gfSweepMetricChanged(self):
+        self.gfSweepW.setMetric(self.sweepMetric.currentData())
+
     def initPlanCalcControls(self):
         thisWidget = QWidget()
         lay = QGridLayout()
@@ -511,7 +601,7 @@ class pydplan_main(QMainWindow):
         lay.addWidget(calcDecoLabel)
         lay.setAlignment(Qt.AlignTop)
 
-        self.divePlan.widgetsCtrl['calcDecoLabel'] = calcDecoLabel
+        self.widgetsCtrl['calcDecoLabel'] = calcDecoLabel
         return thisWidget
 
     def initModelCtrl(self):
@@ -579,7 +669,7 @@ class pydplan_main(QMainWindow):
         lay.addWidget(colorButton, row, 0, 1, 1)
         colorButton.clicked.connect(self.colorSelect)
 
-        self.divePlan.widgetsCtrl['model'] = controls
+        self.widgetsCtrl['model'] = controls
         lay.setAlignment(Qt.AlignTop)
         return modelCtrl
 
@@ -619,17 +709,18 @@ class pydplan_main(QMainWindow):
 
     def tankConfigChange(self):
         # print('tankConfigChange')
+        # a new tank size, fill pressure or SAC is a plan cache hit, only the gas use is calculated again
         # change the object value
         sender  = self.sender() # find out which widget called this
         newValue = sender.value() # get the new value
-        self.divePlan.objectOfWidget[sender](newValue) # call the assigned method to update the value
+        self.objectOfWidget[sender](newValue) # call the assigned method to update the value
         self.drawNewProfile()
 
     def tankUseChange(self):
         # change the object value
         sender  = self.sender() # find out which widget called this
         newState = sender.isChecked() # get the new value
-        self.divePlan.objectOfWidget[sender](newState) # call the assigned method to update the value
+        self.objectOfWidget[sender](newState) # call the assigned method to update the value
         self.drawNewProfile()
 
     def tcSliderChanged(self, tcSelected):
@@ -639,15 +730,15 @@ class pydplan_main(QMainWindow):
     def getNewProfileSettings(self):
         divePlan : DivePlan = self.divePlan
         # get inputs from control widgets
-        divePlan.bottomTime =   float( divePlan.widgetsCtrl['bottom']['time'].value() ) * 60.0
-        divePlan.bottomDepth = float( divePlan.widgetsCtrl['bottom']['depth'].value() )
+        divePlan.bottomTime =   float( self.widgetsCtrl['bottom']['time'].value() ) * 60.0
+        divePlan.bottomDepth = float( self.widgetsCtrl['bottom']['depth'].value() )
         divePlan.maxDepth = divePlan.bottomDepth
         # convert rates from m/min to m/sec float types, divide by 60.0
         # fixme: i have changed to rate defs, and these are not corrct now
-        divePlan.descRate  =        float(divePlan.widgetsCtrl['descent'].value()         ) / 60.0
-        divePlan.ascRateToDeco =    float(divePlan.widgetsCtrl['ascBelow50'].value()    ) / 60.0
-        divePlan.ascRateAtDeco =    float(divePlan.widgetsCtrl['ascBelow6m'].value()    ) / 60.0
-        divePlan.ascRateToSurface = float(divePlan.widgetsCtrl['ascToSurface'].value() ) / 60.0
+        divePlan.descRate  =        float(self.widgetsCtrl['descent'].value()         ) / 60.0
+        divePlan.ascRateToDeco =    float(self.widgetsCtrl['ascBelow50'].value()    ) / 60.0
+        divePlan.ascRateAtDeco =    float(self.widgetsCtrl['ascBelow6m'].value()    ) / 60.0
+        divePlan.ascRateToSurface = float(self.widgetsCtrl['ascToSurface'].value() ) / 60.0
         # descening time in seconds
         divePlan.descTime = divePlan.bottomDepth / divePlan.descRate
 
@@ -655,8 +746,8 @@ class pydplan_main(QMainWindow):
         divePlan.decoStopList = []
         stopNumber = 0
         for decoStop in self.divePlan.stopListUI.keys():
-            stopDepth = float( divePlan.widgetsCtrl[decoStop]['depth'].value() )
-            stopTime  = float( divePlan.widgetsCtrl[decoStop]['time'].value() ) * 60.0
+            stopDepth = float( self.widgetsCtrl[decoStop]['depth'].value() )
+            stopTime  = float( self.widgetsCtrl[decoStop]['time'].value() ) * 60.0
             if stopTime > 0:
                 newStop = DecoStop(depth=stopDepth, time=stopTime, number= stopNumber)
                 divePlan.decoStopList.append(newStop)
@@ -684,10 +775,27 @@ class pydplan_main(QMainWindow):
                     stopText = '** empty stop record **'
                 outTextLines.append(stopText)
             outText =  '\n'.join(outTextLines)
-            self.divePlan.widgetsCtrl['calcDecoLabel'].setText(outText)
+            self.widgetsCtrl['calcDecoLabel'].setText(outText)
+
+        if self.divePlan.planMode == PlanMode.Import.value and divePlan.profileSampled:
+            # scale the plots to the deepest point of the log
+            divePlan.maxDepth = max(point.depth for point in divePlan.profileSampled)
 
         maxIDX = len(divePlan.model) -1
-        self.divePlan.widgetsCtrl['tcSlider'].setMaximum( maxIDX)
+        self.widgetsCtrl['tcSlider'].setMaximum( maxIDX)
+
+        # time to surface along the bottom, calculated again only when the plan has changed
+        if self.divePlan.planMode == PlanMode.Calculate.value:
+            fingerprint = planFingerprint(divePlan)
+            if fingerprint != self.ttsFingerprint:
+                try:
+                    divePlan.ttsCurve = ttsCurve(divePlan)
+                except ValueError:
+                    divePlan.ttsCurve = None
+                self.ttsFingerprint = fingerprint
+        else:
+            divePlan.ttsCurve = None
+            self.ttsFingerprint = None
 
         # assign the profile to plotter and update the window
         #  self.plotPlan.setPlan(divePlan)
@@ -695,16 +803,18 @@ class pydplan_main(QMainWindow):
         self.pressure.update()
         self.pg.update()
         self.heatW.update()
+        # the sweep of the previous plan is not valid any more
+        self.gfSweepW.setSweep(None)
         self.plotBelow.update()
         # show the total time of dive profile
         totalTimeMinutes = self.divePlan.profileSampled[-1].time / 60.0
-        divePlan.widgetsCtrl['totalTime'].setText('{:.0f}'.format(totalTimeMinutes))
+        self.widgetsCtrl['totalTime'].setText('{:.0f}'.format(totalTimeMinutes))
         averageDepth = self.divePlan.profileSampled[-1].depthRunAvg
-        divePlan.widgetsCtrl['avgDepth'].setText('{:.1f}'.format(averageDepth))
+        self.widgetsCtrl['avgDepth'].setText('{:.1f}'.format(averageDepth))
 
         # print end pressures of all tanks
         for iTank in divePlan.tankList.keys():
-            divePlan.widgetsCtrl['tanks'][divePlan.tankList[iTank].name]\
+            self.widgetsCtrl['tanks'][divePlan.tankList[iTank].name]\
             ['endbar'].setText('{:.0f}'.format(divePlan.tankList[iTank].pressure))
 
 
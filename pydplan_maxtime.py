@@ -0,0 +1,198 @@
+#!/usr/bin/python
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_maxtime.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# longest bottom time at a depth that keeps the gas reserve, the ppO2 limits of the tanks and the deco limit
+#
+# usage: python pydplan_maxtime.py --depths 18:60:3 [--gf 30/80] [--tanks JSON ...] [--reserve 0.333]
+#
+# the bottom time is searched by doubling and then bisection, each step is a full calculatePlan(). the plans
+# of one depth share the descent, so all but the first plan resume from the descent checkpoint. the depths
+# of a card are independent and can be spread over a pool of worker processes.
+import argparse
+import json
+import os
+import sys
+from functools import partial
+from multiprocessing import Pool
+
+from pydplan_classes import ModelEngine
+from pydplan_core import newPlan, runPlan, planSummary
+from pydplan_decotable import gridRange, parseGF
+
+# the rule of thirds, a third of the fill pressure is kept in every tank
+RULE_OF_THIRDS = 1.0 / 3.0
+# longest bottom time searched, minutes
+MAX_BOTTOM_TIME = 300.0
+
+
+def planLimit(diveplan, reserve = RULE_OF_THIRDS, maxDeco = None):
+    '''
+    check a calculated plan against the constraints
+
+    :param diveplan: a calculated dive plan
+    :type diveplan: DivePlan
+    :param reserve: fraction of the fill pressure that must be left in each used tank
+    :type reserve: float
+    :param maxDeco: longest total deco stop time in minutes, None for no limit
+    :type maxDeco: float
+    :return: None if the plan keeps all constraints, otherwise the first one it breaks, like 'gas D1'
+    :rtype: str
+    '''
+    for point in diveplan.profileSampled:
+        if point.ppOxygen > point.tank.ppo2max:
+            return 'ppO2 {}'.format(point.tank.name)
+    for tank in diveplan.tankList.values():
+        if tank.use and tank.pressure < tank.bar * reserve:
+            return 'gas {}'.format(tank.name)
+    if maxDeco is not None:
+        decoSeconds = sum(stop.time for stop in diveplan.decoStopsCalculated if stop is not None)
+        if decoSeconds > maxDeco * 60.0:
+            return 'deco'
+    return None
+
+
+def maxBottomTime(depth, reserve = RULE_OF_THIRDS, maxDeco = None, resolution = 1.0,
+                  engine = ModelEngine.Lazy.value, **settings):
+    '''
+    the longest bottom time at depth that keeps the constraints of planLimit()
+
+    :param depth: bottom depth in meters
+    :type depth: float
+    :param reserve: fraction of the fill pressure that must be left in each used tank
+    :type reserve: float
+    :param maxDeco: longest total deco stop time in minutes, None for no limit
+    :type maxDeco: float
+    :param resolution: bottom times are searched in steps of this many minutes
+    :type resolution: float
+    :param engine: ModelEngine value
+    :type engine: int
+    :param settings: other newPlan() arguments, like GFlow, GFhigh and tanks
+    :type settings: dict
+    :return: depth, the longest bottom time in minutes at the bottom depth, not including the descent,
+             0.0 if even the shortest bottom breaks a constraint, the constraint that limits it, the number
+             of plans calculated, and the planSummary() of the plan with that bottom time
+    :rtype: dict
+    '''
+    plans = [0]
+
+    def limitAt(steps):
+        # the constraint broken by the plan with a bottom time of steps * resolution minutes
+        plans[0] += 1
+        try:
+            diveplan = runPlan(newPlan(depth, steps * resolution, engine=engine, **settings))
+        except ValueError as error:
+            return str(error), None
+        return planLimit(diveplan, reserve, maxDeco), diveplan
+
+    # the shortest bottom time is one step, the bottom time starts at the bottom depth
+    low = 1
+    maxSteps = int(MAX_BOTTOM_TIME / resolution)
+    limit, lowPlan = limitAt(low)
+    if limit is not None:
+        return {'depth': depth, 'time': 0.0, 'limit': limit, 'plans': plans[0]}
+
+    # double the bottom time until a constraint is broken, then bisect between the last two times
+    high = low
+    highLimit = None
+    while highLimit is None and high < maxSteps:
+        low = high
+        high = min(high * 2, maxSteps)
+        highLimit, highPlan = limitAt(high)
+        if highLimit is None:
+            lowPlan = highPlan
+    if highLimit is None:
+        # even the longest bottom time searched keeps the constraints
+        low, highLimit = high, 'max time'
+    while high - low > 1:
+        middle = (low + high) // 2
+        limit, middlePlan = limitAt(middle)
+        if limit is None:
+            low, lowPlan = middle, middlePlan
+        else:
+            high, highLimit = middle, limit
+
+    result = {'depth': depth, 'time': low * resolution, 'limit': highLimit, 'plans': plans[0]}
+    result.update(planSummary(lowPlan))
+    return result
+
+
+def maxTimeCard(depths, workers = 1, **options):
+    '''
+    maxBottomTime() of each depth, for a "max time per depth" card
+
+    :param depths: bottom depths in meters
+    :type depths: list
+    :param workers: number of worker processes, 1 calculates in this process
+    :type workers: int
+    :param options: maxBottomTime() arguments other than depth
+    :type options: dict
+    :return: the result of each depth
+    :rtype: list
+    '''
+    solve = partial(maxBottomTime, **options)
+    if workers > 1:
+        with Pool(min(workers, len(depths))) as pool:
+            return pool.map(solve, depths, chunksize=1)
+    return list(map(solve, depths))
+
+
+def writeCard(outFile, results, title):
+    '''
+    the card as text, one line per depth with the end pressure of each tank
+    '''
+    tankNames = []
+    for result in results:
+        for name in result.get('tanks', {}):
+            if name not in tankNames:
+                tankNames.append(name)
+    outFile.write(title + '\n')
+    outFile.write('{:>6} {:>6} {:>8}  {:<10}'.format('depth', 'time', 'runtime', 'limit') +
+                  ''.join('{:>7}'.format(name + ' bar') for name in tankNames) + '\n')
+    for result in results:
+        line = '{:>6.0f} {:>6.0f} '.format(result['depth'], result['time'])
+        if 'runtime' in result:
+            line += '{:>8.0f}  {:<10}'.format(result['runtime'], result['limit'])
+            line += ''.join('{:>7.0f}'.format(result['tanks'][name]) if name in result['tanks']
+                            else '{:>7}'.format('-') for name in tankNames)
+        else:
+            line += '{:>8}  {}'.format('-', result['limit'])
+        outFile.write(line + '\n')
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='PYDPLAN longest bottom time per depth')
+    parser.add_argument('--depths', default='18:60:3', help='bottom depths in meters, first:last:step or a list')
+    parser.add_argument('--gf', default='30/80', help='GF pair as low/high in percent')
+    parser.add_argument('--tanks', action='append', default=None,
+                        help='JSON of changes to the default tanks, like {"BOTTOM": {"o2": 18, "he": 45}}, '
+                             'give it again for a card of each gas set')
+    parser.add_argument('--reserve', type=float, default=RULE_OF_THIRDS,
+                        help='fraction of the fill pressure left in each tank, default a third')
+    parser.add_argument('--max-deco', type=float, default=None, help='longest total deco time in minutes')
+    parser.add_argument('--resolution', type=float, default=1.0, help='bottom time step in minutes')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('-o', '--output-format', choices=['text', 'jsonl'], default='text',
+                        help='text prints one card per gas set, jsonl one line per depth')
+    args = parser.parse_args(argv)
+
+    GFlow, GFhigh = parseGF(args.gf)
+    for tanksText in args.tanks or [None]:
+        tanks = json.loads(tanksText) if tanksText else None
+        try:
+            results = maxTimeCard(gridRange(args.depths), workers=args.workers, reserve=args.reserve,
+                                  maxDeco=args.max_deco, resolution=args.resolution,
+                                  GFlow=GFlow, GFhigh=GFhigh, tanks=tanks)
+        except ValueError as error:
+            parser.exit(1, '{}\n'.format(error))
+        if args.output_format == 'jsonl':
+            for result in results:
+                sys.stdout.write(json.dumps(dict(result, gasSet=tanks)) + '\n')
+        else:
+            writeCard(sys.stdout, results, 'max bottom time, GF {}, reserve {:.0f}% of fill, tanks {}'
+                      .format(args.gf, args.reserve * 100.0, tanksText or 'default'))
+            sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
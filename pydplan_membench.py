@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_membench.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# memory benchmark, bytes used per stored dive profile step
+#
+# usage: python pydplan_membench.py [--plans N]
+import argparse
+import sys
+import tracemalloc
+
+from pydplan_buhlmann import Buhlmann, Compartment
+from pydplan_classes import DecoStop
+from pydplan_core import newPlan, runPlan
+from pydplan_profiletools import DiveProfilePoint
+
+
+class DictBacked():
+    """
+    an ordinary object with a __dict__, holding the same attributes as a slotted object
+    """
+    pass
+
+
+def objectBytes(obj):
+    '''
+    :return: bytes of the object itself and its __dict__, not counting the attribute values
+    :rtype: int
+    '''
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def dictBackedBytes(obj):
+    '''
+    :return: bytes the object would take as an ordinary object with a __dict__
+    :rtype: int
+    '''
+    twin = DictBacked()
+    for name in obj.__slots__:
+        setattr(twin, name, getattr(obj, name, None))
+    return objectBytes(twin)
+
+
+def profileBytes(plans):
+    '''
+    calculate plans and keep the results, like a batch worker does
+    :param plans: number of plans
+    :type plans: int
+    :return: allocated bytes, number of profile steps stored
+    :rtype: tuple
+    '''
+    kept = []
+    steps = 0
+    # one plan first, so the one time allocations like the model tables, the decay factor cache
+    # and the Z factor table are not counted as the cost of the stored steps
+    runPlan(newPlan(depth=30, bottomTime=15), checkpoints=None, results=None)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(plans):
+        diveplan = newPlan(depth=30 + (n % 40), bottomTime=15 + (n % 30))
+        runPlan(diveplan, checkpoints=None, results=None)
+        kept.append((diveplan.profileSampled, diveplan.model, diveplan.decoStopsCalculated))
+        steps += len(diveplan.profileSampled)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, steps
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='PYDPLAN memory benchmark')
+    parser.add_argument('--plans', type=int, default=200, help='number of plans kept in memory')
+    args = parser.parse_args(argv)
+
+    samples = [('tcCoefficients', Buhlmann().model['ZHL16c'][0]),
+               ('Compartment', Compartment(0)),
+               ('DecoStop', DecoStop(depth=3.0, time=60.0, number=0)),
+               ('DiveProfilePoint', DiveProfilePoint(0.0, 0.0, None))]
+    print('{:<18} {:>8} {:>12}'.format('object', 'slotted', 'with dict'))
+    for name, obj in samples:
+        print('{:<18} {:>8} {:>12}'.format(name, objectBytes(obj), dictBackedBytes(obj)))
+
+    allocated, steps = profileBytes(args.plans)
+    print('{} plans, {} profile steps, {:.0f} kB, {:.0f} bytes per step'
+          .format(args.plans, steps, allocated / 1024.0, allocated / steps))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/python
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_ndl.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# no decompression limit table generator, for a grid of depths and breathing gases
+#
+# usage: python pydplan_ndl.py [--mixes 21/0 32/0 21/35] [--gfhigh 0.80] [--model ZHL16c] [-o ndl.csv]
+#
+# the tissues are loaded from the surface state of ModelPoint.initSurface() with the Schreiner equation
+# for the descent, then noDecoLimits() of pydplan_solver.py, the same solver as the NDL of the live mode,
+# solves the time when the ceiling of a compartment at GF high reaches the surface. this is done for all
+# depths, gases and compartments at once with NumPy, no dive profile is calculated.
+import argparse
+import math
+import sys
+import numpy as np
+
+from pydplan_buhlmann import Constants, modelTable
+from pydplan_solver import MAX_NDL_MINUTES, noDecoLimits
+
+
+class NdlTable():
+    """
+    no decompression limits of a depth x gas grid
+    """
+    def __init__(self, depths, mixes, minutes, modelName, GFhigh, descRate, maxPPoxygen):
+        '''
+        :param depths: depths in meters
+        :type depths: list
+        :param mixes: gases as (O2 %, He %)
+        :type mixes: list
+        :param minutes: limits in minutes including the descent, one row per depth and one column per gas,
+                        math.inf if there is no limit and math.nan if the depth is beyond the MOD of the gas
+        :type minutes: numpy.ndarray
+        '''
+        self.depths = depths
+        self.mixes = mixes
+        self.minutes = minutes
+        self.modelName = modelName
+        self.GFhigh = GFhigh
+        self.descRate = descRate
+        self.maxPPoxygen = maxPPoxygen
+
+    def limit(self, depth, o2, he = 0.0):
+        '''
+        :return: the no decompression limit in minutes of one depth and gas
+        :rtype: float
+        '''
+        return float(self.minutes[list(self.depths).index(depth), list(self.mixes).index((o2, he))])
+
+    def cell(self, minutes):
+        if math.isnan(minutes):
+            return 'MOD'
+        if minutes > MAX_NDL_MINUTES:
+            return '-'
+        return '{:d}'.format(int(math.floor(minutes)))
+
+    def writeCsv(self, outFile):
+        outFile.write(','.join(['depth'] + [mixName(mix) for mix in self.mixes]) + '\n')
+        for row, depth in enumerate(self.depths):
+            outFile.write(','.join(['{:g}'.format(depth)] +
+                                   [self.cell(minutes) for minutes in self.minutes[row]]) + '\n')
+
+    def writeText(self, outFile):
+        outFile.write('no decompression limits in minutes, {} GF high {:.0f}%, descent {:g} m/min, '
+                      'max ppO2 {:g}\n'.format(self.modelName, self.GFhigh * 100.0, self.descRate, self.maxPPoxygen))
+        outFile.write('{:>6}'.format('depth') + ''.join('{:>8}'.format(mixName(mix)) for mix in self.mixes) + '\n')
+        for row, depth in enumerate(self.depths):
+            outFile.write('{:>6g}'.format(depth) +
+                          ''.join('{:>8}'.format(self.cell(minutes)) for minutes in self.minutes[row]) + '\n')
+
+
+def mixName(mix):
+    o2, he = mix
+    return '{:g}/{:g}'.format(o2, he)
+
+
+def parseMix(text):
+    '''
+    gas as "O2/He" in percent, like "32/0" or "21/35", or only the O2 percent for nitrox
+    '''
+    parts = text.split('/')
+    o2 = float(parts[0])
+    he = float(parts[1]) if len(parts) > 1 else 0.0
+    if o2 <= 0.0 or he < 0.0 or o2 + he > 100.0:
+        raise ValueError('invalid gas {}'.format(text))
+    return o2, he
+
+
+def ndlTable(depths = range(10, 61), mixes = ((21, 0), (32, 0), (36, 0)),
+             modelName = 'ZHL16c', GFhigh = 0.80, descRate = 20.0, maxPPoxygen = 1.6):
+    '''
+    calculate the no decompression limits of all depths and gases
+
+    :param depths: bottom depths in meters
+    :type depths: list
+    :param mixes: gases as (O2 %, He %)
+    :type mixes: list
+    :param modelName: model variant, "ZHL16a", "ZHL16b" or "ZHL16c"
+    :type modelName: str
+    :param GFhigh: gradient factor at the surface, 0.0 ... 1.0
+    :type GFhigh: float
+    :param descRate: descent rate in m/min, the limit includes the descent, so it is not directly comparable
+                     to newPlan(bottomTime=...), which starts at the bottom depth
+    :type descRate: float
+    :param maxPPoxygen: depths where ppO2 of the gas is higher than this are marked as beyond MOD
+    :type maxPPoxygen: float
+    :return: the table
+    :rtype: NdlTable
+    '''
+    c = modelTable(modelName)
+    depths = list(depths)
+    mixes = [(float(o2), float(he)) for o2, he in mixes]
+    gf = GFhigh
+    surface = Constants.surfacePressure
+    waterVapor = Constants.WaterVaporSurface
+
+    # grid axes: depth, gas, compartment
+    depth = np.array(depths, dtype=float)[:, None, None]
+    heliumFraction = np.array([he for o2, he in mixes])[None, :, None] / 100.0
+    oxygenFraction = np.array([o2 for o2, he in mixes])[None, :, None] / 100.0
+    nitrogenFraction = 1.0 - heliumFraction - oxygenFraction
+    bottom = surface + depth / 10.0
+
+    # descent from the surface state with the Schreiner equation, as in Compartment.newPressureSchreiner()
+    descMinutes = depth / descRate
+    barPerMin = descRate / 10.0
+
+    def schreiner(oldPressure, constK, fraction):
+        gasInspired = (surface - waterVapor) * fraction
+        gasRate = barPerMin * fraction
+        return (gasInspired + gasRate * (descMinutes - (1.0 / constK)) -
+                (gasInspired - oldPressure - (gasRate / constK)) * np.exp(-constK * descMinutes))
+    helium0 = schreiner(0.0, c.HeliumK, heliumFraction)
+    nitrogen0 = schreiner(Constants.initN2, c.NitrogenK, nitrogenFraction)
+    heliumInspired = (bottom - waterVapor) * heliumFraction
+    nitrogenInspired = (bottom - waterVapor) * nitrogenFraction
+
+    minutes = noDecoLimits(c, helium0, nitrogen0, heliumInspired, nitrogenInspired, gf)
+
+    # the descent time is included
+    limits = minutes + descMinutes[:, :, 0]
+    ppOxygen = bottom[:, :, 0] * oxygenFraction[:, :, 0] / Constants.surfacePressure
+    limits = np.where(ppOxygen > maxPPoxygen, math.nan, limits)
+    return NdlTable(depths, mixes, limits, modelName, GFhigh, descRate, maxPPoxygen)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='PYDPLAN no decompression limit table')
+    parser.add_argument('--mixes', nargs='+', default=['21/0', '32/0', '36/0'],
+                        help='gases as O2/He in percent, like 32/0 or 21/35')
+    parser.add_argument('--mindepth', type=float, default=10.0, help='first depth in meters')
+    parser.add_argument('--maxdepth', type=float, default=60.0, help='last depth in meters')
+    parser.add_argument('--step', type=float, default=1.0, help='depth step in meters')
+    parser.add_argument('--model', default='ZHL16c', help='ZHL16a, ZHL16b or ZHL16c')
+    parser.add_argument('--gfhigh', type=float, default=0.80, help='gradient factor high, 0.0 ... 1.0')
+    parser.add_argument('--descent', type=float, default=20.0, help='descent rate in m/min')
+    parser.add_argument('--ppo2', type=float, default=1.6, help='maximum ppO2 at the bottom')
+    parser.add_argument('--format', choices=['text', 'csv'], default=None,
+                        help='default csv if the output file name ends with .csv, otherwise text')
+    parser.add_argument('-o', '--output', default='-', help='output file, default standard output')
+    args = parser.parse_args(argv)
+
+    try:
+        mixes = [parseMix(text) for text in args.mixes]
+        depths = [float(d) for d in np.arange(args.mindepth, args.maxdepth + args.step / 2.0, args.step)]
+        table = ndlTable(depths, mixes, modelName=args.model, GFhigh=args.gfhigh,
+                         descRate=args.descent, maxPPoxygen=args.ppo2)
+    except ValueError as error:
+        parser.error(str(error))
+    outputFormat = args.format or ('csv' if args.output.lower().endswith('.csv') else 'text')
+    outFile = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        if outputFormat == 'csv':
+            table.writeCsv(outFile)
+        else:
+            table.writeText(outFile)
+    finally:
+        if outFile is not sys.stdout:
+            outFile.close()
+
+
+if __name__ == '__main__':
+    main()
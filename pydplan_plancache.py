@@ -0,0 +1,151 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_plancache.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# cache of calculatePlan() results
+#
+# the same plan is often calculated many times, the results are stored in a LRU cache keyed by a
+# canonical fingerprint of the calculation inputs of DivePlan. on a hit calculatePlan() copies the
+# stored profile, deco stops and tank end pressures into the DivePlan without running the model.
+import os
+from collections import OrderedDict
+from copy import copy
+
+from pydplan_classes import PlanMode
+from pydplan_checkpoint import PlanCheckpoint, tankType
+
+
+def planFingerprint(diveplan):
+    '''
+    canonical hashable key of all inputs that affect the result of calculatePlan()
+
+    :param diveplan: the dive plan
+    :type diveplan: DivePlan
+    :return: the fingerprint
+    :rtype: tuple
+    '''
+    # the gas use of a plan is calculated again on each call, so the tank size, fill pressure and SAC
+    # are only needed for a replayed log, where the gas is taken one sample at a time
+    importMode = diveplan.planMode == PlanMode.Import.value
+    tanks = []
+    for iTank in sorted(diveplan.tankList.keys(), key=lambda t: t.name):
+        tank = diveplan.tankList[iTank]
+        if tank.use:
+            gas = (float(tank.liters), float(tank.bar), float(tank.SAC)) if importMode else ()
+            tanks.append((iTank.name, float(tank.o2), float(tank.he), float(tank.changeDepth)) + gas)
+    stops = ()
+    if diveplan.planMode == PlanMode.Custom.value:
+        stops = tuple((float(stop.depth), float(stop.time)) for stop in diveplan.decoStopList)
+    elif diveplan.planMode == PlanMode.Import.value:
+        # the log file, a changed file is replayed again
+        importFile = getattr(diveplan, 'importFile', None)
+        try:
+            modified = os.stat(importFile).st_mtime_ns if importFile else 0
+        except OSError:
+            modified = 0
+        stops = (importFile, modified, float(getattr(diveplan, 'importInterval', 0.0)))
+    return (diveplan.engine, diveplan.planMode,
+            float(diveplan.bottomDepth), float(diveplan.bottomTime),
+            float(diveplan.descRate), float(diveplan.descTime),
+            float(diveplan.ascRateToDeco), float(diveplan.ascRateAtDeco), float(diveplan.ascRateToSurface),
+            float(diveplan.GFlow), float(diveplan.GFhigh),
+            tuple(tanks), stops)
+
+
+class PlanResult():
+    """
+    the results of one calculatePlan() run, everything calculatePlan() writes into the DivePlan
+    """
+    def __init__(self, diveplan):
+        '''
+        :param diveplan: a dive plan that has just been calculated
+        :type diveplan: DivePlan
+        '''
+        self.trajectory = diveplan.model
+        self.modelUsed = diveplan.modelUsed
+        self.profile = [copy(point) for point in diveplan.profileSampled]
+        self.profileTanks = [tankType(diveplan, point.tank) for point in diveplan.profileSampled]
+        self.decoStops = [copy(stop) if stop is not None else None for stop in diveplan.decoStopsCalculated]
+        self.tanks = {iTank: {name: getattr(tank, name) for name in PlanCheckpoint.TANK_STATE}
+                      for iTank, tank in diveplan.tankList.items()}
+        self.currentTank = tankType(diveplan, diveplan.currentTank)
+        self.nextTank = tankType(diveplan, diveplan.nextTank)
+        self.plan = {name: getattr(diveplan, name, 0.0) for name in PlanCheckpoint.PLAN_STATE}
+
+    def restore(self, diveplan):
+        '''
+        copy the results into diveplan, like calculatePlan() had just calculated it
+        :param diveplan: the dive plan, must have the same fingerprint as the one calculated
+        :type diveplan: DivePlan
+        :return: the model states along the profile
+        :rtype: ModelTrajectory
+        '''
+        for iTank, state in self.tanks.items():
+            for name, value in state.items():
+                setattr(diveplan.tankList[iTank], name, value)
+        diveplan.currentTank = diveplan.tankList[self.currentTank] if self.currentTank else None
+        diveplan.nextTank = diveplan.tankList[self.nextTank] if self.nextTank else None
+        for name, value in self.plan.items():
+            setattr(diveplan, name, value)
+
+        profile = []
+        for point, iTank in zip(self.profile, self.profileTanks):
+            newPoint = copy(point)
+            newPoint.tank = diveplan.tankList[iTank] if iTank else None
+            profile.append(newPoint)
+        diveplan.profileSampled = profile
+        diveplan.decoStopsCalculated = [copy(stop) if stop is not None else None for stop in self.decoStops]
+        diveplan.modelUsed = self.modelUsed
+        diveplan.model = self.trajectory
+        return self.trajectory
+
+
+class PlanCache():
+    """
+    LRU cache of PlanResult objects keyed by planFingerprint()
+    """
+    def __init__(self, maxSize = 128):
+        '''
+        :param maxSize: number of results kept, the least recently used result is dropped first
+        :type maxSize: int
+        '''
+        self.maxSize = maxSize
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.results.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def save(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.maxSize:
+            self.results.popitem(last=False)
+
+    def resize(self, maxSize):
+        self.maxSize = maxSize
+        while len(self.results) > self.maxSize:
+            self.results.popitem(last=False)
+
+    def stats(self):
+        '''
+        :return: hits, misses, number of stored results and the maximum size
+        :rtype: dict
+        '''
+        return dict(hits=self.hits, misses=self.misses, size=len(self.results), maxSize=self.maxSize)
+
+    def clear(self):
+        self.results.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# the cache used by calculatePlan() by default
+planResults = PlanCache()
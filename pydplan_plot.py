@@ -9,6 +9,7 @@ from PyQt5.QtGui import QPainter, QPainterPath, QLinearGradient, QBrush, QPen, Q
 from PyQt5.QtWidgets import QWidget
 
 from pydplan_buhlmann import ModelPoint
+from pydplan_classes import TankType
 
 
 colors = [Qt.black, Qt.gray, Qt.lightGray, Qt.darkGray,
@@ -16,6 +17,12 @@ colors = [Qt.black, Qt.gray, Qt.lightGray, Qt.darkGray,
           Qt.blue, Qt.darkBlue, Qt.cyan, Qt.darkCyan,
           Qt.darkMagenta, Qt.magenta, Qt.yellow, Qt.darkRed]
 
+# colors used to draw the tanks, the planning core in pydplan_classes does not depend on Qt
+tankColors = {TankType.BOTTOM: Qt.magenta,
+              TankType.DECO1: Qt.cyan,
+              TankType.DECO2: Qt.darkGray,
+              TankType.TRAVEL: Qt.yellow}
+
 class PlotBelowWidget(QWidget):
     def __init__(self, plan=None):
         super().__init__()
@@ -129,6 +136,7 @@ class PlotPlanWidget(QWidget):
         self.drawTimeGrid(self.qp)
         self.drawCeilings(self.qp)
         self.drawCeilingMargin(self.qp)
+        self.drawTts(self.qp)
         self.drawTanks(self.qp)
         self.drawTankPressure(self.qp)
         #self.drawTC(self.qp)
@@ -266,6 +274,25 @@ class PlotPlanWidget(QWidget):
             qp.setPen(QPen(Qt.red, 1, Qt.DashLine))
         qp.drawText(x2+20, zeroLevel-1, 'ceiling margin {}'.format(status))
 
+    # redraw the time to surface curve along the bottom, TTS grows upwards from the bottom of the plot
+    def drawTts(self, qp):
+
+        curve = getattr(self.plan, 'ttsCurve', None)
+        if not self.plan.profileSampled or curve is None or len(curve) == 0:
+            return
+        ttsMax = max(float(curve.tts.max()), 60.0)
+        if ttsMax == float('inf'):
+            return
+        qp.setPen(QPen(Qt.darkMagenta, 2, Qt.DashLine))
+        x1, y1 = None, None
+        for runtime, tts in zip(curve.runtime, curve.tts):
+            x = (runtime / self.totalTime) * self.plot_width
+            y = self.plot_height - (tts / ttsMax) * self.plot_height * 0.5
+            if x1 is not None:
+                qp.drawLine(x1, y1, x, y)
+            x1, y1 = x, y
+        qp.drawText(x1 + 5, y1 - 5, 'TTS {:.0f} min'.format(curve.tts[-1] / 60.0))
+
     # redraw the TC curves plot
     def drawTC(self, qp):
 
@@ -0,0 +1,205 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_profilestore.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# on-disk store of calculated dive profiles, read back with a memory map
+#
+# a store is two files: <name>.dat has the profile steps of all plans one after another as fixed layout
+# binary records, <name>.idx has one record per plan with its id and where its steps are in the .dat file.
+# the writer streams each plan to disk as soon as it is calculated, the reader maps the .dat file so that
+# any single profile can be used without reading the others into memory.
+import numpy as np
+
+from pydplan_vector import tissuePressures
+
+COMPS = 16
+# one profile step, little endian so that the files can be moved between computers
+STEP_DTYPE = np.dtype([('time', '<f8'),                  # runtime in seconds
+                       ('depth', '<f4'),                 # depth in meters
+                       ('tankPressure', '<f4'),          # pressure of the tank breathed, bar
+                       ('ppOxygen', '<f4'),              # ppO2 of the gas breathed
+                       ('nitrogen', '<f4', (COMPS,)),    # N2 pressure of each tissue compartment, bar
+                       ('helium', '<f4', (COMPS,))])     # He pressure of each tissue compartment, bar
+# plan ids can be this long
+ID_LENGTH = 32
+# one plan in the index
+INDEX_DTYPE = np.dtype([('id', '<U{}'.format(ID_LENGTH)),
+                        ('offset', '<i8'),               # number of the first step of the plan in the .dat file
+                        ('count', '<i4'),                # number of steps
+                        ('runtime', '<f4'),              # runtime in minutes
+                        ('maxDepth', '<f4')])
+
+
+def profileRows(diveplan):
+    '''
+    the steps of a calculated profile in the store layout
+    :param diveplan: a calculated dive plan
+    :type diveplan: DivePlan
+    :return: one record per profile point
+    :rtype: numpy.ndarray
+    '''
+    points = diveplan.profileSampled
+    rows = np.zeros(len(points), dtype=STEP_DTYPE)
+    for i, point in enumerate(points):
+        rows[i]['time'] = point.time
+        rows[i]['depth'] = point.depth
+        rows[i]['tankPressure'] = point.currentTankPressure
+        rows[i]['ppOxygen'] = point.ppOxygen
+        if point.trajectory is not None:
+            rows[i]['helium'] = point.trajectory.heliumPressure[point.modelRow]
+            rows[i]['nitrogen'] = point.trajectory.nitrogenPressure[point.modelRow]
+        else:
+            rows[i]['helium'], rows[i]['nitrogen'] = tissuePressures(point.modelpoint)
+    return rows
+
+
+class ProfileStoreWriter():
+    """
+    appends profiles to a store, use as a context manager or call close() to write the index
+    """
+    def __init__(self, path, append = False):
+        '''
+        :param path: file name of the store without extension
+        :type path: str
+        :param append: if True add to an existing store, otherwise the store is created again
+        :type append: bool
+        '''
+        self.path = path
+        self.index = []
+        self.steps = 0
+        if append:
+            try:
+                old = np.load(path + '.idx', allow_pickle=False)
+                self.index = [tuple(entry) for entry in old.tolist()]
+                if self.index:
+                    self.steps = int(old['offset'][-1] + old['count'][-1])
+            except FileNotFoundError:
+                append = False
+        self.dataFile = open(path + '.dat', 'r+b' if append else 'wb')
+        # cut off steps that were written after the index was saved last time
+        self.dataFile.truncate(self.steps * STEP_DTYPE.itemsize)
+        self.dataFile.seek(0, 2)
+        self.ids = set(entry[0] for entry in self.index)
+
+    def checkId(self, planId):
+        '''
+        :param planId: id of a plan to be appended
+        :return: why the id can not be stored, or None if it can
+        :rtype: str
+        '''
+        if len(str(planId)) > ID_LENGTH:
+            return 'plan id {} is longer than {} characters'.format(planId, ID_LENGTH)
+        if str(planId) in self.ids:
+            return 'plan id {} is already in the store'.format(planId)
+        return None
+
+    def append(self, planId, rows):
+        '''
+        write one profile
+        :param planId: id of the plan, unique in the store
+        :type planId: str
+        :param rows: the profile steps, see profileRows()
+        :type rows: numpy.ndarray
+        '''
+        error = self.checkId(planId)
+        if error is not None:
+            raise ValueError(error)
+        rows = np.asarray(rows, dtype=STEP_DTYPE)
+        self.dataFile.write(rows.tobytes())
+        runtime = float(rows['time'][-1]) / 60.0 if len(rows) else 0.0
+        maxDepth = float(rows['depth'].max()) if len(rows) else 0.0
+        self.index.append((str(planId), self.steps, len(rows), runtime, maxDepth))
+        self.ids.add(str(planId))
+        self.steps += len(rows)
+
+    def appendPlan(self, planId, diveplan):
+        self.append(planId, profileRows(diveplan))
+
+    def flush(self):
+        '''
+        write the index of the profiles so far, the store can then be read while the writer goes on
+        '''
+        self.dataFile.flush()
+        with open(self.path + '.idx', 'wb') as indexFile:
+            np.save(indexFile, np.array(self.index, dtype=INDEX_DTYPE), allow_pickle=False)
+
+    def close(self):
+        if self.dataFile is not None:
+            self.flush()
+            self.dataFile.close()
+            self.dataFile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StoredProfile():
+    """
+    one profile of a store, the columns are views into the memory map
+    """
+    def __init__(self, entry, steps):
+        self.id = str(entry['id'])
+        self.runtime = float(entry['runtime'])
+        self.maxDepth = float(entry['maxDepth'])
+        self.steps = steps
+        self.time = steps['time']
+        self.depth = steps['depth']
+        self.tankPressure = steps['tankPressure']
+        self.ppOxygen = steps['ppOxygen']
+        self.nitrogenPressure = steps['nitrogen']
+        self.heliumPressure = steps['helium']
+
+    def __len__(self):
+        return len(self.steps)
+
+
+class ProfileStoreReader():
+    """
+    reads a store written by ProfileStoreWriter, only the index is loaded into memory
+    """
+    def __init__(self, path):
+        '''
+        :param path: file name of the store without extension
+        :type path: str
+        '''
+        self.path = path
+        self.index = np.load(path + '.idx', allow_pickle=False)
+        if self.index.dtype != INDEX_DTYPE:
+            raise ValueError('{}.idx is not a profile store index'.format(path))
+        self.positions = {planId: position for position, planId in enumerate(self.index['id'].tolist())}
+        steps = int(self.index['offset'][-1] + self.index['count'][-1]) if len(self.index) else 0
+        if steps:
+            self.steps = np.memmap(path + '.dat', dtype=STEP_DTYPE, mode='r', shape=(steps,))
+        else:
+            self.steps = np.zeros(0, dtype=STEP_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, position):
+        entry = self.index[position]
+        offset = int(entry['offset'])
+        return StoredProfile(entry, self.steps[offset:offset + int(entry['count'])])
+
+    def __iter__(self):
+        for position in range(len(self.index)):
+            yield self[position]
+
+    def ids(self):
+        return self.index['id'].tolist()
+
+    def profile(self, planId):
+        '''
+        :param planId: id of the plan
+        :type planId: str
+        :return: the profile, raises KeyError if there is no such plan
+        :rtype: StoredProfile
+        '''
+        return self[self.positions[str(planId)]]
+
+    def close(self):
+        # the file is unmapped when the last StoredProfile using it is gone
+        self.steps = None
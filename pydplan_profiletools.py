@@ -5,14 +5,21 @@
 # module for handling dive profile
 
 from pydplan_classes import currentTank, DivePlan, DecoStop
-from copy import deepcopy
-from pydplan_buhlmann import depth2absolutePressure, Buhlmann, ModelPoint, Constants
+from pydplan_buhlmann import depth2absolutePressure, modelTable, ModelPoint, Constants
+from pydplan_vector import ModelPointVector, ModelPointLazy
+from pydplan_trajectory import ModelTrajectory
+from pydplan_solver import decoStopTime, ascentStopDepth
+from pydplan_checkpoint import prefixCheckpoints, prefixKey, PlanCheckpoint
+from pydplan_plancache import planResults, planFingerprint, PlanResult
+from pydplan_gasuse import gasAccounting
+import math
 
 # gradient factor object
 class gradientFactor():
     def __init__(self, GFlow, GFhigh):
         self.gfSetFlag = False
         self.gfSlope = 0.0
+        self.gfDepth = 0.0 # depth where GF low was set, deeper than this GF low is used
         self.gfCurrent = GFlow
         self.GFlow = GFlow
         self.GFhigh = GFhigh
@@ -26,20 +33,21 @@ class gradientFactor():
         '''
         if self.gfSetFlag == False:
             self.gfSlope = (self.GFhigh - self.GFlow) / depthNow
+            self.gfDepth = depthNow
             self.gfCurrent = self.GFlow
             self.gfSetFlag = True
             return self.GFlow
         else:
-            self.gfCurrent = self.GFhigh - (self.gfSlope * depthNow)
+            self.gfCurrent = self.GFhigh - (self.gfSlope * min(depthNow, self.gfDepth))
             return self.gfCurrent
     def gfGet(self, depthNow):
         if self.gfSetFlag == False:
             return self.GFlow
         else:
-            self.gfCurrent = self.GFhigh - (self.gfSlope * depthNow)
+            self.gfCurrent = self.GFhigh - (self.gfSlope * min(depthNow, self.gfDepth))
             return self.gfCurrent
 
-from pydplan_classes import PlanMode, TankType, ScubaTank
+from pydplan_classes import PlanMode, TankType, ScubaTank, ModelEngine
 from enum import Enum, auto
 
 # enumeration of dive phase state names, uses Python Enum lib, feature auto() to assign values
@@ -60,22 +68,18 @@ class DivePhase(Enum):
     NULL = auto()
 
 
-def tanksCheck(diveplan: DivePlan, divephase: DivePhase, beginDepth=0.0, endDepth=0.0,
-               intervalMinutes =0.0, runtime = 0):
+def tanksCheck(diveplan: DivePlan, divephase: DivePhase, runtime = 0):
     '''
-    checks for coming tank changes, updates pressure on current tank
-    :param diveplan:
-    :type diveplan:
-    :param divephase:
-    :type divephase:
-    :param beginDepth:
-    :type beginDepth:
-    :param endDepth:
-    :type endDepth:
-    :param intervalMinutes:
-    :type intervalMinutes:
-    :return:
-    :rtype:
+    checks for coming tank changes and selects the current tank, the gas used is calculated by
+    gasAccounting() of pydplan_gasuse.py when the profile is finished
+    :param diveplan: the dive plan with the tanks
+    :type diveplan: DivePlan
+    :param divephase: phase of the profile at this step
+    :type divephase: DivePhase
+    :param runtime: runtime in seconds, recorded when a tank is taken into use or changed
+    :type runtime: float
+    :return: the next phase
+    :rtype: DivePhase
     '''
     # defaults
     divephaseNext = DivePhase.NULL
@@ -199,48 +203,109 @@ def tanksCheck(diveplan: DivePlan, divephase: DivePhase, beginDepth=0.0, endDept
         print('tanksCheck: error')
         return None, -1, -1
 
-    # calculate gas used to update tank pressure
-    if diveplan.currentTank != None:
-        beginPressure = depth2absolutePressure(beginDepth)
-        endPressure = depth2absolutePressure(endDepth)
-        surfaceLitersGasConsumed = diveplan.currentTank.SAC * intervalMinutes
-        avgPressure = abs(endPressure + beginPressure) / 2
-        depthLitersGasConsumed = avgPressure * surfaceLitersGasConsumed
-        litersBefore = diveplan.currentTank.pressure * diveplan.currentTank.liters
-        litersLeft = litersBefore - depthLitersGasConsumed
-        barsLeft = litersLeft / diveplan.currentTank.liters
-        # finally update new pressure into the tank itself
-        diveplan.currentTank.pressure = barsLeft
-
     return divephaseNext
 
 
-def calculatePlan(diveplan : DivePlan):
+def engineModel(engine):
+    '''
+    which engine calculates the tissues: ModelPoint loops over Compartment objects,
+    ModelPointVector does the same math on NumPy arrays, ModelPointLazy calculates the ceilings
+    only when they are needed, for headless use where only the runtime and the stops matter
+    :param engine: DivePlan.engine
+    :type engine: int
+    :return: a new model state
+    :rtype: ModelPoint
+    '''
+    if engine == ModelEngine.Vector.value:
+        return ModelPointVector()
+    elif engine == ModelEngine.Lazy.value:
+        return ModelPointLazy()
+    return ModelPoint()
+
+
+def calculatePlan(diveplan : DivePlan, checkpoints = prefixCheckpoints, results = planResults):
     '''Calculates a valid diveplan
 
     :param diveplan:
     :type diveplan:
+    :param checkpoints: cache of the states at end of descent and bottom time, None to calculate from surface
+    :type checkpoints: CheckpointCache
+    :param results: cache of complete plan results, None to always calculate the plan
+    :type results: PlanCache
     :return:
     :rtype:
     '''
-
-
-    def calculateStepAscend(depth, interval):
+    # the same plan calculated earlier, copy the results without running the model
+    if results is not None:
+        fingerprint = planFingerprint(diveplan)
+        result = results.get(fingerprint)
+        if result is not None:
+            modelPoints = result.restore(diveplan)
+            if diveplan.planMode != PlanMode.Import.value:
+                # the tank sizes and SAC are not in the fingerprint, the gas use is calculated again
+                gasAccounting(diveplan)
+            return modelPoints
+
+    if diveplan.planMode == PlanMode.Import.value:
+        # replay a recorded dive log instead of planning, imported here because it uses this module
+        from pydplan_logimport import importPlan
+        modelPoints = importPlan(diveplan)
+        if results is not None:
+            results.save(fingerprint, PlanResult(diveplan))
+        return modelPoints
+
+    def ascentRate(depth):
+        '''
+        :return: ascent rate in m/s at depth, and the depth where that rate ends
+        :rtype: tuple
+        '''
         if depth > (diveplan.bottomDepth / 2.0):
-            rate = diveplan.ascRateToDeco
+            return diveplan.ascRateToDeco, diveplan.bottomDepth / 2.0
         elif depth > 6.0:
-            rate = diveplan.ascRateAtDeco
+            return diveplan.ascRateAtDeco, 6.0
         else:
-            rate = diveplan.ascRateToSurface
-        return rate * interval
+            return diveplan.ascRateToSurface, 0.0
+
+    def ascentSegment(beginDepth):
+        '''
+        ascend from beginDepth straight to the first deco stop, tank change or rate change,
+        the first stop is solved by ascentStopDepth() instead of stepping in short time slices
+        :return: depth where the ascent segment ends and its duration in seconds
+        :rtype: tuple
+        '''
+        tank = diveplan.currentTank
+        heliumFraction = tank.he / 100.0
+        nitrogenFraction = 1.0 - heliumFraction - tank.o2 / 100.0
+        if model.leadCeilingStop >= beginDepth > 0.0:
+            # ceiling does not allow to ascend now, stay here until the next stop clears
+            interval = decoStopTime(model, modelPoints.coefficients, beginDepth,
+                                    heliumFraction, nitrogenFraction,
+                                    gfObject.gfGet(beginDepth), beginDepth - 3.0)
+            if interval == math.inf:
+                raise ValueError('ascent from {:.0f} m cannot be started breathing {}'
+                                 .format(beginDepth, tank.name))
+            return beginDepth, max(interval, 1.0)
+        rate, targetDepth = ascentRate(beginDepth)
+        if diveplan.nextTank != None:
+            # do not pass the next tank change depth
+            targetDepth = max(targetDepth, min(beginDepth, diveplan.nextTank.changeDepth))
+        if diveplan.planMode == PlanMode.Custom.value and plannedStopPointer >= 0:
+            # do not pass the next planned stop either
+            targetDepth = max(targetDepth,
+                              min(beginDepth, diveplan.decoStopList[plannedStopPointer].depth))
+        endDepth = ascentStopDepth(model, modelPoints.coefficients, beginDepth, targetDepth, rate,
+                                   heliumFraction, nitrogenFraction, gfObject.gfGet)
+        return endDepth, (beginDepth - endDepth) / rate
 
     gfObject = gradientFactor(GFlow= diveplan.GFlow, GFhigh= diveplan.GFhigh)
 
-    modelConstants = Buhlmann()
-    modelUsed = modelConstants.model['ZHL16c']
+    # the coefficient tables are built once when pydplan_buhlmann is imported
+    modelUsed = modelTable('ZHL16c').modelUsed
     diveplan.modelUsed = modelUsed
-    model = ModelPoint()
-    modelPoints = []
+    lazy = diveplan.engine == ModelEngine.Lazy.value
+    model = engineModel(diveplan.engine)
+    # model states along the profile are stored into arrays, not as a list of ModelPoint copies
+    modelPoints = ModelTrajectory(modelUsed, model.modelUsed, lazy=lazy)
     diveplan.decoStopsCalculated = []
     model.initSurface(modelUsed)
 
@@ -251,10 +316,12 @@ def calculatePlan(diveplan : DivePlan):
     diveplan.maxTCnitrogen = 0.0
     diveplan.maxTChelium = 0.0
 
-    intervalDescent = diveplan.descTime / 5.0
-    stepDescent = diveplan.bottomDepth / 5.0
-    intervalBottom = diveplan.bottomTime / 20.0
-    intervalAscent = 5.0
+    # each step of the loop below runs to the next event: end of descent, tank change,
+    # end of bottom time, deco stop start or end, or surfacing. the step lengths are not fixed
+    descentRate = diveplan.bottomDepth / diveplan.descTime # m/s
+    intervalDescent = 0.0
+    intervalBottom = 0.0
+    intervalAscent = 0.0 # solved for each ascent segment
     intervalDeco = 60.0
     intervalTankChange = 60.0
     # this is where we record the dive profile
@@ -265,23 +332,45 @@ def calculatePlan(diveplan : DivePlan):
         if len(diveplan.decoStopList)>0 :
             # we have planned deco stops, intitialize a pointer to the list
             plannedStopPointer = 0
+            # the stop timers are left over from the previous calculation, reset them
+            for plannedStop in diveplan.decoStopList:
+                plannedStop.done = 0.0
         else:
             # no stops
             # todo: maybe add gfObject.gfSet(diveplan.bottomDepth)
             plannedStopPointer = -1
 
+    # the number of events grows with the number of possible deco stops and tank changes,
+    # not with the length of the dive, if this is exceeded the plan is not progressing
+    maxEvents = 50 + 4 * (int(diveplan.bottomDepth / 3.0) + len(diveplan.decoStopList))
+
     # execute a dive
     index = 0
     tanksCheck(diveplan, DivePhase.INIT_TANKS) # intialize tanks
     # note that tanksCheck may select the diveplan.currentTank
     divephase = DivePhase.STARTING
     currentDecoDone = -1 # FIXME: ugly hack, see below
+
+    # continue from the end of the bottom time or descent, if calculated earlier with the same inputs
+    prefix, checkpoint = (None, None) if checkpoints is None else checkpoints.find(diveplan)
+    if checkpoint is not None:
+        model, modelPoints, outProfile, loopState = checkpoint.restore(diveplan)
+        index = loopState['index']
+        runtime = loopState['runtime']
+        intervalMinutes = loopState['intervalMinutes']
+        beginDepth = loopState['beginDepth']
+        endDepth = loopState['endDepth']
+        depthSum = loopState['depthSum']
+        depthRunAvg = loopState['depthRunAvg']
+        ascending = loopState['ascending']
+        newDecoStop = None
+        divephase = loopState['divephase']
+
     while True :
         index += 1
-        if index > 500:
-            print('index >500')
-            raise ValueError('over 500 iterations, aborting')
-            break
+        prefixDone = None
+        if index > maxEvents:
+            raise ValueError('dive plan did not reach the surface in {} events, aborting'.format(maxEvents))
 
         if divephase == DivePhase.STARTING:
             runtime = 0.0
@@ -298,109 +387,121 @@ def calculatePlan(diveplan : DivePlan):
             divephase  = tanksCheck(diveplan, DivePhase.STARTING, runtime=runtime)
 
         elif divephase == DivePhase.DESCENDING :
+            # descend in one step to the bottom
+            beginDepth = endDepth
+            endDepth   = diveplan.bottomDepth
+            intervalDescent = (endDepth - beginDepth) / descentRate
             runtime += intervalDescent
             intervalMinutes = intervalDescent / 60.0
-            beginDepth = endDepth
-            endDepth   = beginDepth + stepDescent
-            if endDepth >= diveplan.bottomDepth:
-                endDepth = diveplan.bottomDepth
-                divephase = DivePhase.BOTTOM
-            tanksCheck(diveplan=diveplan, divephase= DivePhase.DESCENDING, beginDepth= beginDepth,
-                        endDepth= endDepth, intervalMinutes= intervalMinutes, runtime=runtime)
+            divephase = DivePhase.BOTTOM
+            prefixDone = 'descent'
+            tanksCheck(diveplan, DivePhase.DESCENDING, runtime=runtime)
 
         elif divephase == DivePhase.DESC_T :
+            # descend in one step to the tank change depth
+            beginDepth = endDepth
+            endDepth   = min(diveplan.changeDepth, diveplan.bottomDepth)
+            intervalDescent = (endDepth - beginDepth) / descentRate
             runtime += intervalDescent
             intervalMinutes = intervalDescent / 60.0
-            beginDepth = endDepth
-            endDepth   = beginDepth + stepDescent
-            if endDepth >= diveplan.changeDepth:
-                endDepth = diveplan.changeDepth
-                divephase = DivePhase.STOP_DESC_T
-            tanksCheck(diveplan, DivePhase.DESC_T, beginDepth, endDepth, intervalMinutes, runtime=runtime)
+            divephase = DivePhase.STOP_DESC_T
+            tanksCheck(diveplan, DivePhase.DESC_T, runtime=runtime)
 
             pass
         elif divephase == DivePhase.STOP_DESC_T:
             beginDepth = endDepth
             runtime += intervalTankChange
             intervalMinutes = intervalTankChange / 60.0
-            divephase = tanksCheck(diveplan, DivePhase.STOP_DESC_T,
-                                   beginDepth, endDepth, intervalMinutes, runtime=runtime)
+            divephase = tanksCheck(diveplan, DivePhase.STOP_DESC_T, runtime=runtime)
 
 
         elif divephase == DivePhase.BOTTOM:
+            # the whole bottom time at constant depth is one step
+            intervalBottom = max(diveplan.descTime + diveplan.bottomTime - runtime, 0.0)
             runtime += intervalBottom
             intervalMinutes = intervalBottom / 60.0
             beginDepth = diveplan.bottomDepth
             endDepth   = diveplan.bottomDepth
-            if runtime >= (diveplan.descTime + diveplan.bottomTime):
-                divephase = DivePhase.ASCENDING
-                diveplan.ascentBegins = runtime # this controls many things!
-                ascending = True
-            tanksCheck(diveplan, DivePhase.BOTTOM, beginDepth, endDepth, intervalMinutes, runtime=runtime)
+            divephase = DivePhase.ASCENDING
+            diveplan.ascentBegins = runtime # this controls many things!
+            ascending = True
+            prefixDone = 'bottom'
+            tanksCheck(diveplan, DivePhase.BOTTOM, runtime=runtime)
 
 
         elif divephase == DivePhase.ASCENDING:
+            beginDepth = endDepth
+            endDepth, intervalAscent = ascentSegment(beginDepth)
             runtime += intervalAscent
             intervalMinutes = intervalAscent / 60.0
-            beginDepth = endDepth
-            stepAscend = calculateStepAscend(beginDepth, intervalAscent)
-            if (beginDepth - stepAscend) < model.leadCeilingStop:
-                print('ASCENDING bounce stop at {} m, runtime {}, index {}'
-                      .format(model.leadCeilingStop, runtime, index))
-                endDepth = model.leadCeilingStop
-            else:
-                endDepth   = beginDepth - stepAscend
             if endDepth <= 0.0:
                 divephase = DivePhase.SURFACE
-                beginDepth = 0.0
                 endDepth = 0.0
-                tanksCheck(diveplan, DivePhase.SURFACE, beginDepth, endDepth, intervalMinutes, runtime=runtime)
+                tanksCheck(diveplan, DivePhase.SURFACE, runtime=runtime)
             else:
-                divephase = tanksCheck(diveplan, DivePhase.ASCENDING,
-                                                      beginDepth, endDepth, intervalMinutes, runtime=runtime)
+                divephase = tanksCheck(diveplan, DivePhase.ASCENDING, runtime=runtime)
+                if divephase == DivePhase.ASC_T and endDepth <= diveplan.changeDepth:
+                    # the ascent ended at the tank change depth, or the change depth is deeper than here
+                    divephase = DivePhase.STOP_ASC_T
 
         elif divephase == DivePhase.ASC_T:
+            beginDepth = endDepth
+            endDepth, intervalAscent = ascentSegment(beginDepth)
             runtime += intervalAscent
             intervalMinutes = intervalAscent / 60.0
-            beginDepth = endDepth
-            stepAscend = calculateStepAscend(beginDepth, intervalAscent)
-            if (beginDepth - stepAscend) < model.leadCeilingStop:
-                print('ASC_T bounce stop at {} m, runtime {}, index {}'
-                      .format(model.leadCeilingStop, runtime, index))
-                endDepth = model.leadCeilingStop
-            else:
-                endDepth   = beginDepth - stepAscend
             if endDepth <= diveplan.changeDepth:
-                endDepth = diveplan.changeDepth
+                # change the tank here, also if the change depth is deeper than here
                 divephase = DivePhase.STOP_ASC_T
             else:
-                tanksCheck(diveplan, DivePhase.ASC_T, beginDepth, endDepth, intervalMinutes, runtime=runtime)
+                tanksCheck(diveplan, DivePhase.ASC_T, runtime=runtime)
 
 
         elif divephase == DivePhase.STOP_ASC_T:
             beginDepth = endDepth
             runtime += intervalTankChange
             intervalMinutes = intervalTankChange / 60.0
-            tanksCheck(diveplan, DivePhase.STOP_ASC_T,
-                                   beginDepth, endDepth, intervalMinutes, runtime=runtime)
-            # force a deco stop after tank change, this allows recoding it properly
-            divephase = DivePhase.STOP_DECO
+            divephase = tanksCheck(diveplan, DivePhase.STOP_ASC_T, runtime=runtime)
+            if divephase == DivePhase.ASC_T and endDepth <= diveplan.changeDepth:
+                # the next tank is changed here too, before any stop, like in timeToSurface()
+                divephase = DivePhase.STOP_ASC_T
+            else:
+                # force a deco stop after tank change, this allows recoding it properly
+                divephase = DivePhase.STOP_DECO
             #print('+ STOP_CHG_TANK_ASC at {} m '.format(endDepth))
 
         elif divephase == DivePhase.STOP_DECO:
+            if diveplan.planMode == PlanMode.Calculate.value:
+                # solve how long the stop must be for the next stop to clear,
+                # instead of stepping the stop in fixed 60/120/180 s slices
+                heliumFraction = diveplan.currentTank.he / 100.0
+                oxygenFraction = diveplan.currentTank.o2 / 100.0
+                intervalDeco = decoStopTime(model, modelPoints.coefficients, endDepth,
+                                            heliumFraction, 1.0 - heliumFraction - oxygenFraction,
+                                            gfObject.gfGet(endDepth), endDepth - 3.0)
+                if intervalDeco == math.inf:
+                    raise ValueError('deco stop at {:.0f} m cannot be completed breathing {}'
+                                     .format(endDepth, diveplan.currentTank.name))
+                intervalDeco = max(intervalDeco, 1.0)
+            elif diveplan.planMode == PlanMode.Custom.value:
+                if plannedStopPointer >= 0 and endDepth == diveplan.decoStopList[plannedStopPointer].depth:
+                    # the rest of the planned stop in one step
+                    plannedStop = diveplan.decoStopList[plannedStopPointer]
+                    intervalDeco = max(plannedStop.time - plannedStop.done, 1.0)
+                else:
+                    intervalDeco = 60.0
             runtime += intervalDeco
             intervalMinutes = intervalDeco / 60.0
-            tanksCheck(diveplan, DivePhase.STOP_DECO, beginDepth, endDepth, intervalMinutes, runtime=runtime)
+            tanksCheck(diveplan, DivePhase.STOP_DECO, runtime=runtime)
 
         elif divephase ==  DivePhase.DECOEND:
             runtime += intervalDeco
             intervalMinutes = intervalDeco / 60.0
             divephase = DivePhase.ASCENDING
-            tanksCheck(diveplan, DivePhase.DECOEND, beginDepth, endDepth, intervalMinutes, runtime=runtime)
+            tanksCheck(diveplan, DivePhase.DECOEND, runtime=runtime)
 
         elif divephase == DivePhase.SURFACE:
             tank.useUntilTime = runtime
-            tanksCheck(diveplan, DivePhase.SURFACE, beginDepth, endDepth, 0.1, runtime=runtime)
+            tanksCheck(diveplan, DivePhase.SURFACE, runtime=runtime)
             break
         else:
             break
@@ -438,20 +539,32 @@ def calculatePlan(diveplan : DivePlan):
         diveplan.maxTCnitrogen = max(diveplan.maxTCnitrogen, model.maxNitrogenPressure)
         diveplan.maxTChelium = max(diveplan.maxTChelium, model.maxHeliumPressure)
 
-        # then deepcopy and append the model state to the list of model states
-        modelCopy = deepcopy( model)        # must deepcopy to keep a snapshot of what the state was here
-        modelPoints.append(modelCopy)       # append to the list of saved model states
-        newPoint.modelpoint = modelCopy     # also link the model point to the profile point
+        # then record a snapshot of the model state as a new row of the trajectory store
+        modelRow = modelPoints.append(model, runtime, endDepth)
+        newPoint.setModelRow(modelPoints, modelRow) # also link the model row to the profile point
         outProfile.append(newPoint)         # append to the list of dive  profile
 
+        if prefixDone is not None and checkpoints is not None:
+            # end of descent or bottom time, save the state so later plans can continue from here
+            loopState = dict(index=index, runtime=runtime, intervalMinutes=intervalMinutes,
+                             beginDepth=beginDepth, endDepth=endDepth, depthSum=depthSum,
+                             depthRunAvg=depthRunAvg, ascending=ascending, divephase=divephase)
+            checkpoints.save(prefixKey(diveplan, prefixDone),
+                             PlanCheckpoint(diveplan, model, modelPoints, outProfile, loopState))
+
         # here we start the deco stops when ascending, or check if deco stop can be ended
         if divephase in [DivePhase.ASCENDING, DivePhase.STOP_DECO, DivePhase.ASC_T,
                          DivePhase.STOP_ASC_T]:
-            # which mode of operation: 'Custom', 'Calculate', 'Import'
+            # which mode of operation: 'Custom' or 'Calculate', 'Import' does not get here
             if diveplan.planMode == PlanMode.Calculate.value:
                 # we are in Calculate mode,
                 # check that next step will not cross ceiling
-                if endDepth  <= model.leadCeilingStop and divephase != DivePhase.STOP_DECO:
+                if divephase == DivePhase.STOP_ASC_T and newDecoStop is not None and \
+                        newDecoStop.depth == endDepth:
+                    # a tank change followed by another one during a deco stop, both are part of the stop
+                    currentDecoDone += intervalMinutes * 60.0
+                    newDecoStop.time = currentDecoDone
+                elif endDepth  <= model.leadCeilingStop and divephase != DivePhase.STOP_DECO:
                     # we have hit a deco ceiling or tanks change, check if starting or ongoing deco
                     if divephase == DivePhase.STOP_ASC_T:
                         # stop for a tank change first
@@ -468,26 +581,22 @@ def calculatePlan(diveplan : DivePlan):
                     # now set the gradient factor
                     newPoint.gfNow = gfObject.gfSet(endDepth)
                     newPoint.gfSet = True
-                    # the decos near surface take longer, so longer intervals used
-                    if beginDepth == 3.0:
-                        intervalDeco = 180.0
-                    elif beginDepth == 6.0:
-                        intervalDeco = 120.0
-                    else:
-                        intervalDeco = 60.0
+                    # the length of the stop is solved when the stop is calculated, see decoStopTime()
                     #record the new deco stop
                     newDecoStop = DecoStop(depth=beginDepth, time=0.0, number=0)
                     newDecoStop.runtime = runtime
                 elif divephase == DivePhase.STOP_DECO:
+                    # the step just taken, the tank change or the solved stop
+                    stepSeconds = intervalMinutes * 60.0
                     if  currentDecoDone == -1:
                         # really dirty fix
-                        currentDecoDone = intervalDeco
-                        newDecoStop = DecoStop(depth=beginDepth, time=intervalDeco, number=0)
+                        currentDecoDone = stepSeconds
+                        newDecoStop = DecoStop(depth=beginDepth, time=stepSeconds, number=0)
                         newDecoStop.runtime = runtime
                         pass
                     else:
                         # ongoing deco stop, increment the timer
-                        currentDecoDone += intervalDeco
+                        currentDecoDone += stepSeconds
                         #todo: check long it has been now?
                     if newDecoStop != None:
                         newDecoStop.time = currentDecoDone
@@ -503,12 +612,14 @@ def calculatePlan(diveplan : DivePlan):
                 # we are in Custom mode, check if planned deco stop here
                 if plannedStopPointer >= 0:
                     # yes we have planned deco stops
-                    if divephase in [DivePhase.ASCENDING, DivePhase.ASC_T]:
+                    if divephase in [DivePhase.ASCENDING, DivePhase.ASC_T, DivePhase.STOP_ASC_T]:
                         # check if we have planned deco stop here
                         # fixme: we should test for next step, instead of current depth that might already be above the stop
                         if endDepth <= diveplan.decoStopList[plannedStopPointer].depth :
-                            # so start a deco stop and reset timer
-                            divephase = DivePhase.STOP_DECO
+                            # so start a deco stop and reset timer, a tank change here is done first
+                            # and counts as part of the stop
+                            if divephase != DivePhase.STOP_ASC_T:
+                                divephase = DivePhase.STOP_DECO
                             diveplan.decoStopList[plannedStopPointer].done = 0.0
                             newPoint.depth = diveplan.decoStopList[plannedStopPointer].depth
                             endDepth = newPoint.depth
@@ -516,9 +627,14 @@ def calculatePlan(diveplan : DivePlan):
                             # now set the gradient factor
                             newPoint.gfNow = gfObject.gfSet(endDepth)
                             newPoint.gfSet = True
+                    elif divephase == DivePhase.STOP_DECO and \
+                            endDepth != diveplan.decoStopList[plannedStopPointer].depth:
+                        # a tank change that is not at a planned stop, go on ascending
+                        divephase = DivePhase.ASCENDING
                     elif divephase == DivePhase.STOP_DECO:
-                        # planned deco stop ongoing, increment timer, check if then done with it
-                        diveplan.decoStopList[plannedStopPointer].done += intervalDeco
+                        # planned deco stop ongoing, increment timer by the step just taken,
+                        # check if then done with it
+                        diveplan.decoStopList[plannedStopPointer].done += intervalMinutes * 60.0
                         if diveplan.decoStopList[plannedStopPointer].done >= \
                                 diveplan.decoStopList[plannedStopPointer].time:
                             # we have done the deco, now start ascending again
@@ -527,19 +643,31 @@ def calculatePlan(diveplan : DivePlan):
                             if plannedStopPointer >= len(diveplan.decoStopList):
                                 # we have consumed the list of deco stops, stop checking for them
                                 plannedStopPointer = -1
-                pass
+                elif divephase == DivePhase.STOP_DECO:
+                    # a tank change after the planned stops, go on ascending
+                    divephase = DivePhase.ASCENDING
             else:
                 # getting here is actually a disastrous bug, should handle it more seriously...
                 print('unsupported mode')
                 break
 
     # dive has ended, now save the data for plotting and printing
+    modelPoints.trim() # the profile is complete, release the preallocated rows
     diveplan.profileSampled = outProfile
     diveplan.model = modelPoints
+    # the tank pressures from the gas used along the finished profile
+    gasAccounting(diveplan)
+    if results is not None:
+        results.save(fingerprint, PlanResult(diveplan))
     return modelPoints
 
 
 class DiveProfilePoint():
+    # no per object __dict__, a profile can have hundreds of points and batch runs keep many profiles
+    __slots__ = ('time', 'depth', 'pressure', 'divephase', 'tank', '_modelpoint', 'trajectory', 'modelRow',
+                 'leadTC_now', 'ceiling_now', 'ceiling_now_3m', 'gfNow', 'gfSet', 'ascending',
+                 'depthRunAvg', 'ppOxygen', 'ppHelium', 'ppNitrogen', 'currentTankPressure')
+
     def __init__(self, pTime, pDepth, tank, divephase=DivePhase.NULL, gfSet = False, ascending = False):
         '''
         Object to store a point in executed dive profile, append these into a list to store the entire profile
@@ -561,7 +689,9 @@ class DiveProfilePoint():
         self.pressure = depth2absolutePressure(pDepth)
         self.divephase = divephase
         self.tank = tank
-        self.modelpoint = None
+        self._modelpoint = None
+        self.trajectory = None # ModelTrajectory and row where the model state is stored
+        self.modelRow = -1
         #self.ceilings_all = []  # list of ceiling depths per each tissue compartment
 
         self.leadTC_now = -1
@@ -578,6 +708,26 @@ class DiveProfilePoint():
 
         self.currentTankPressure = 0.0
 
+    def setModelRow(self, trajectory, row):
+        self.trajectory = trajectory
+        self.modelRow = row
+
+    @property
+    def modelpoint(self):
+        '''
+        the model state at this point, built from the trajectory store on demand
+        :return: ModelPoint like object
+        :rtype: ModelPointVector
+        '''
+        if self.trajectory is not None:
+            return self.trajectory[self.modelRow]
+        return self._modelpoint
+
+    @modelpoint.setter
+    def modelpoint(self, model):
+        self.trajectory = None
+        self._modelpoint = model
+
     def ppOxygenGet(self):
         return self.ppOxygen
 
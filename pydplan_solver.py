@@ -0,0 +1,346 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_solver.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# closed form solvers used by calculatePlan(), so that deco stops and ascents
+# do not need to be stepped through in small fixed time slices
+import math
+import numpy as np
+
+from pydplan_buhlmann import depth2absolutePressure, pressure2depth, Constants
+from pydplan_vector import tissuePressures, coefficientArrays
+
+# give up if a deco stop would take longer than this, in minutes
+MAX_STOP_MINUTES = 48 * 60.0
+# bisection is continued until the time is known within this many minutes
+STOP_TOLERANCE = 1.0e-6
+# no decompression limits longer than this are returned as math.inf, in minutes
+MAX_NDL_MINUTES = 999.0
+# times where noDecoLimits() looks for the first compartment to reach its limit, then bisects. every
+# minute, a Nitrogen compartment can be off-gassing while Helium loads, and finer during the first minute
+NDL_SCAN = np.concatenate((np.geomspace(1.0 / 60.0, 1.0, 16, endpoint=False), np.arange(1.0, MAX_NDL_MINUTES + 1.0)))
+# times of NDL_SCAN evaluated at once
+NDL_SCAN_CHUNK = 64
+NDL_TOLERANCE = 1.0e-4
+# an ascent to the surface with more steps than this is not progressing
+MAX_ASCENT_EVENTS = 200
+
+
+def decoStopTime(model, coefficients, depth, heliumFraction, nitrogenFraction, gf, nextDepth):
+    '''
+    solve how long to stay at a deco stop, until the ceilings of all compartments are shallower
+    than nextDepth, the tissue pressures at constant depth are given by the Haldane equation:
+        p(t) = pInspired + (p0 - pInspired) * exp(-k * t)
+    when a compartment has only one inert gas the A & B coefficients are constant, and the
+    time to reach the tolerated pressure is solved in closed form:
+        t = ln((p0 - pInspired) / (pTolerated - pInspired)) / k
+    for compartments with both Helium and Nitrogen the time is solved by bisection on the same equation
+
+    :param model: model state at arrival to the stop
+    :type model: ModelPoint
+    :param coefficients: model coefficients as arrays
+    :type coefficients: CoefficientArrays
+    :param depth: depth of the stop in meters
+    :type depth: float
+    :param heliumFraction: fraction of Helium in gas breathed at the stop
+    :type heliumFraction: float
+    :param nitrogenFraction: fraction of Nitrogen in gas breathed at the stop
+    :type nitrogenFraction: float
+    :param gf: gradient factor used for the ceilings
+    :type gf: float
+    :param nextDepth: depth in meters the ceilings must get shallower than, usually next stop depth
+    :type nextDepth: float
+    :return: stop time in seconds, rounded up to next full second, math.inf if the stop cannot be completed
+    :rtype: float
+    '''
+    c = coefficients
+    helium, nitrogen = tissuePressures(model)
+    ambient = depth2absolutePressure(depth)
+    heliumInspired = (ambient - model.waterVapor) * heliumFraction
+    nitrogenInspired = (ambient - model.waterVapor) * nitrogenFraction
+    # ceiling is shallower than nextDepth when tolerated ambient pressure is below this
+    target = depth2absolutePressure(nextDepth)
+
+    def excess(minutes):
+        heliumNow = heliumInspired + (helium - heliumInspired) * np.exp(-c.HeliumK * minutes)
+        nitrogenNow = nitrogenInspired + (nitrogen - nitrogenInspired) * np.exp(-c.NitrogenK * minutes)
+        total = heliumNow + nitrogenNow
+        a = (c.HeliumA * heliumNow + c.NitrogenA * nitrogenNow) / total
+        b = (c.HeliumB * heliumNow + c.NitrogenB * nitrogenNow) / total
+        return (total - a * gf) / (gf / b - gf + 1.0) - target
+
+    need = excess(0.0) >= 0.0
+    if not need.any():
+        return 0.0
+
+    minutes = np.zeros(len(helium))
+    # single inert gas compartments, closed form
+    for k, gasNow, gasInspired, a, b, other, otherInspired in (
+            (c.NitrogenK, nitrogen, nitrogenInspired, c.NitrogenA, c.NitrogenB, helium, heliumInspired),
+            (c.HeliumK, helium, heliumInspired, c.HeliumA, c.HeliumB, nitrogen, nitrogenInspired)):
+        single = need & (other == 0.0) & (otherInspired == 0.0)
+        if not single.any():
+            continue
+        tolerated = target * (gf / b - gf + 1.0) + a * gf
+        with np.errstate(divide='ignore', invalid='ignore'):
+            solved = np.log((gasNow - gasInspired) / (tolerated - gasInspired)) / k
+        solved = np.where(tolerated > gasInspired, solved, math.inf)
+        minutes = np.where(single, solved, minutes)
+        need = need & ~single
+
+    if need.any():
+        # mixed Helium and Nitrogen compartments, find an upper bound then bisect
+        high = 1.0
+        while (excess(high)[need] >= 0.0).any():
+            high *= 2.0
+            if high > MAX_STOP_MINUTES:
+                return math.inf
+        low = np.zeros(len(helium))
+        high = np.full(len(helium), high)
+        while (high - low)[need].max() > STOP_TOLERANCE:
+            middle = (low + high) / 2.0
+            cleared = excess(middle) < 0.0
+            high = np.where(cleared, middle, high)
+            low = np.where(cleared, low, middle)
+        minutes = np.where(need, high, minutes)
+
+    stopMinutes = float(minutes.max())
+    if stopMinutes > MAX_STOP_MINUTES:
+        return math.inf
+    return math.floor(stopMinutes * 60.0) + 1.0
+
+
+def ascentStopDepth(model, coefficients, beginDepth, targetDepth, rate,
+                    heliumFraction, nitrogenFraction, gfAtDepth):
+    '''
+    find the first deco stop on a linear ascent from beginDepth to targetDepth, without stepping the ascent.
+    the tissue pressures on the ascent are given by the Schreiner equation, a stop is needed at a 3 m
+    stop depth when the ceiling there is deeper than the next stop, like calculatePlan() checks with
+    leadCeilingStop. the deepest such stop is found by bisection over the stop depths of the segment.
+
+    :param model: model state at beginDepth
+    :type model: ModelPoint
+    :param coefficients: model coefficients as arrays
+    :type coefficients: CoefficientArrays
+    :param beginDepth: depth in meters where the ascent begins
+    :type beginDepth: float
+    :param targetDepth: depth in meters where this ascent segment ends, if no stop is met before it
+    :type targetDepth: float
+    :param rate: ascent rate in meters per second
+    :type rate: float
+    :param heliumFraction: fraction of Helium in gas breathed
+    :type heliumFraction: float
+    :param nitrogenFraction: fraction of Nitrogen in gas breathed
+    :type nitrogenFraction: float
+    :param gfAtDepth: function returning the gradient factor to use at a depth
+    :type gfAtDepth: function
+    :return: depth in meters where the ascent ends, the first stop or targetDepth
+    :rtype: float
+    '''
+    c = coefficients
+    # candidate stop depths inside this segment, from deep to shallow
+    stops = []
+    stop = math.ceil(targetDepth / 3.0) * 3.0
+    while stop < beginDepth:
+        stops.insert(0, stop)
+        stop += 3.0
+    if not stops:
+        return targetDepth
+
+    helium, nitrogen = tissuePressures(model)
+    beginPressure = depth2absolutePressure(beginDepth)
+    heliumInspired = (beginPressure - model.waterVapor) * heliumFraction
+    nitrogenInspired = (beginPressure - model.waterVapor) * nitrogenFraction
+    barPerMin = -rate * 60.0 / 10.0
+    heliumRate = barPerMin * heliumFraction
+    nitrogenRate = barPerMin * nitrogenFraction
+
+    def stopNeeded(depth):
+        minutes = (beginDepth - depth) / rate / 60.0
+        heliumNow = (heliumInspired + heliumRate * (minutes - (1.0 / c.HeliumK)) -
+                     (heliumInspired - helium - (heliumRate / c.HeliumK)) * np.exp(-c.HeliumK * minutes))
+        nitrogenNow = (nitrogenInspired + nitrogenRate * (minutes - (1.0 / c.NitrogenK)) -
+                       (nitrogenInspired - nitrogen - (nitrogenRate / c.NitrogenK)) * np.exp(-c.NitrogenK * minutes))
+        total = heliumNow + nitrogenNow
+        a = (c.HeliumA * heliumNow + c.NitrogenA * nitrogenNow) / total
+        b = (c.HeliumB * heliumNow + c.NitrogenB * nitrogenNow) / total
+        gf = gfAtDepth(depth)
+        ceiling = pressure2depth(((total - a * gf) / (gf / b - gf + 1.0)).max() - Constants.surfacePressure)
+        return ceiling > depth - 3.0
+
+    if not stopNeeded(stops[-1]):
+        return targetDepth
+    low, high = 0, len(stops) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if stopNeeded(stops[middle]):
+            high = middle
+        else:
+            low = middle + 1
+    return stops[low]
+
+
+def noDecoLimits(coefficients, helium, nitrogen, heliumInspired, nitrogenInspired, gf):
+    '''
+    solve how long the diver can stay until a ceiling appears, the no decompression limit, for many tissue
+    states at once. the Haldane equation is evaluated for all compartments at the times of NDL_SCAN, and the
+    first time when a ceiling is deeper than the surface is bisected. the arrays are broadcast together with
+    the compartments on the last axis, so a grid of depths and gases is solved in one call.
+
+    :param coefficients: model coefficients as arrays
+    :type coefficients: CoefficientArrays
+    :param helium: Helium pressures of the compartments now
+    :type helium: numpy.ndarray
+    :param nitrogen: Nitrogen pressures of the compartments now
+    :type nitrogen: numpy.ndarray
+    :param heliumInspired: inspired Helium pressure at the depth
+    :type heliumInspired: numpy.ndarray
+    :param nitrogenInspired: inspired Nitrogen pressure at the depth
+    :type nitrogenInspired: numpy.ndarray
+    :param gf: gradient factor at the surface, usually GF high
+    :type gf: float
+    :return: minutes of each state, 0.0 if there is a ceiling already, math.inf if longer than MAX_NDL_MINUTES
+    :rtype: numpy.ndarray
+    '''
+    c = coefficients
+
+    def ceilingBelowSurface(minutes):
+        # minutes with an axis of length 1 for the compartments
+        heliumNow = heliumInspired + (helium - heliumInspired) * np.exp(-c.HeliumK * minutes)
+        nitrogenNow = nitrogenInspired + (nitrogen - nitrogenInspired) * np.exp(-c.NitrogenK * minutes)
+        total = heliumNow + nitrogenNow
+        a = (c.HeliumA * heliumNow + c.NitrogenA * nitrogenNow) / total
+        b = (c.HeliumB * heliumNow + c.NitrogenB * nitrogenNow) / total
+        return ((total - a * gf) / (gf / b - gf + 1.0) > Constants.surfacePressure).any(axis=-1)
+
+    shape = np.broadcast(helium, nitrogen, heliumInspired, nitrogenInspired, c.HeliumK).shape[:-1]
+    already = ceilingBelowSurface(np.zeros(shape + (1,)))
+    # index of the first time of NDL_SCAN with a ceiling, the scan is done in chunks to keep the arrays small
+    # and stops when every state has one
+    first = np.full(shape, len(NDL_SCAN))
+    for chunk in range(0, len(NDL_SCAN), NDL_SCAN_CHUNK):
+        times = NDL_SCAN[chunk:chunk + NDL_SCAN_CHUNK]
+        over = ceilingBelowSurface(times.reshape((-1,) + (1,) * (len(shape) + 1)))
+        found = (first == len(NDL_SCAN)) & over.any(axis=0)
+        first = np.where(found, chunk + np.argmax(over, axis=0), first)
+        if (already | (first < len(NDL_SCAN))).all():
+            break
+    bracket = ~already & (first < len(NDL_SCAN))
+    high = NDL_SCAN[np.minimum(first, len(NDL_SCAN) - 1)]
+    low = np.where(first > 0, NDL_SCAN[first - 1], 0.0)
+    while (high - low)[bracket].max(initial=0.0) > NDL_TOLERANCE:
+        middle = (low + high) / 2.0
+        over = ceilingBelowSurface(middle[..., None])
+        high = np.where(over, middle, high)
+        low = np.where(over, low, middle)
+    return np.where(already, 0.0, np.where(bracket, low, math.inf))
+
+
+def noDecoTime(model, coefficients, depth, heliumFraction, nitrogenFraction, gf):
+    '''
+    the no decompression limit from the current tissue state, see noDecoLimits()
+
+    :param model: model state now
+    :type model: ModelPoint
+    :param coefficients: model coefficients as arrays
+    :type coefficients: CoefficientArrays
+    :param depth: depth in meters
+    :type depth: float
+    :param heliumFraction: fraction of Helium in gas breathed
+    :type heliumFraction: float
+    :param nitrogenFraction: fraction of Nitrogen in gas breathed
+    :type nitrogenFraction: float
+    :param gf: gradient factor at the surface, usually GF high
+    :type gf: float
+    :return: minutes, 0.0 if there is a ceiling already, math.inf if longer than MAX_NDL_MINUTES
+    :rtype: float
+    '''
+    helium, nitrogen = tissuePressures(model)
+    ambient = depth2absolutePressure(depth)
+    return float(noDecoLimits(coefficients, helium, nitrogen, (ambient - model.waterVapor) * heliumFraction,
+                              (ambient - model.waterVapor) * nitrogenFraction, gf))
+
+
+def timeToSurface(model, modelUsed, depth, gases, gfObject, ascentRate, tankChangeSeconds = 60.0,
+                  segments = None):
+    '''
+    ascend from the current tissue state to the surface with deco stops, like calculatePlan() does after
+    the bottom time: each ascent goes to the first stop found by ascentStopDepth(), each stop lasts until
+    the next stop clears as solved by decoStopTime(). model and gfObject are changed, give copies if
+    the state is still needed.
+
+    :param model: model state at depth
+    :type model: ModelPoint
+    :param modelUsed: the model coefficients list used in calculation
+    :type modelUsed: Buhlmann.model
+    :param depth: depth in meters where the ascent begins
+    :type depth: float
+    :param gases: (change depth, Helium fraction, Nitrogen fraction) of the gases, the first one is
+                  breathed now, the others are changed to in this order when the ascent reaches their change depth,
+                  at once if it is deeper than depth. when the ceiling is within 3 m, the changes at one depth
+                  are followed by a stop that lasts until the next stop clears
+    :type gases: list
+    :param gfObject: gradient factors, GF low until the first stop
+    :type gfObject: gradientFactor
+    :param ascentRate: function of depth returning the ascent rate in m/s and the depth where that rate ends
+    :type ascentRate: function
+    :param tankChangeSeconds: time spent at each gas change
+    :type tankChangeSeconds: float
+    :param segments: if a list is given, (begin depth, end depth, seconds, index of the gas in gases)
+                     of each step of the ascent are appended to it, like for gas use
+    :type segments: list
+    :return: seconds to the surface and the stops as (depth, seconds), math.inf if a stop cannot be completed
+    :rtype: tuple
+    '''
+    coefficients = coefficientArrays(modelUsed)
+    gases = list(gases)
+    heliumFraction, nitrogenFraction = gases[0][1], gases[0][2]
+    gasIndex = 0
+    gases = gases[1:]
+    seconds = 0.0
+    stops = []
+    events = 0
+    changed = False
+    while depth > 0.0:
+        events += 1
+        if events > MAX_ASCENT_EVENTS:
+            return math.inf, stops
+        endDepth = depth
+        if not gfObject.gfSetFlag and model.leadCeilingStop >= depth:
+            # the first stop, GF goes from here to GF high at the surface
+            gfObject.gfSet(depth)
+        if gases and depth <= gases[0][0]:
+            _, heliumFraction, nitrogenFraction = gases.pop(0)
+            gasIndex += 1
+            interval = tankChangeSeconds
+            changed = True
+        elif model.leadCeilingStop >= depth or (changed and depth <= model.leadCeilingMeters + 3.0):
+            # ceiling does not allow to ascend, stay here until the next stop clears,
+            # like in calculatePlan() also after gas changes when the ceiling is within 3 m
+            changed = False
+            interval = decoStopTime(model, coefficients, depth, heliumFraction, nitrogenFraction,
+                                    gfObject.gfGet(depth), depth - 3.0)
+            if interval == math.inf:
+                return math.inf, stops
+            interval = max(interval, 1.0)
+        else:
+            changed = False
+            rate, targetDepth = ascentRate(depth)
+            if gases:
+                targetDepth = max(targetDepth, min(depth, gases[0][0]))
+            endDepth = ascentStopDepth(model, coefficients, depth, targetDepth, rate,
+                                       heliumFraction, nitrogenFraction, gfObject.gfGet)
+            interval = (depth - endDepth) / rate
+        model.calculateAllTissuesDepth(modelUsed=modelUsed, beginDepth=depth, endDepth=endDepth,
+                                       intervalMinutes=interval / 60.0, heliumFraction=heliumFraction,
+                                       nitrogenFraction=nitrogenFraction, gfNow=gfObject.gfGet(endDepth))
+        if segments is not None:
+            segments.append((depth, endDepth, interval, gasIndex))
+        if endDepth == depth:
+            if stops and stops[-1][0] == depth:
+                stops[-1] = (depth, stops[-1][1] + interval)
+            else:
+                stops.append((depth, interval))
+        seconds += interval
+        depth = endDepth
+    return seconds, stops
@@ -0,0 +1,198 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_trajectory.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# columnar store for the Buhlmann model states calculated along a dive profile
+#
+# calculatePlan() appends one row per calculated step, instead of a deepcopy of the whole
+# ModelPoint with its 16 Compartment objects. ModelPoint-like objects are built from the rows
+# only when plot or table code asks for them.
+import math
+import numpy as np
+
+from pydplan_buhlmann import Constants
+from pydplan_vector import ModelPointVector, coefficientArrays, tissuePressures
+
+
+class ModelTrajectory():
+    """
+    stores time, depth, ambient pressure, per compartment N2/He pressures and ceilings,
+    the lead tissue and the GF of every step in growable preallocated NumPy arrays
+    """
+    COMPS = 16
+
+    def __init__(self, modelUsed, modelName = 'ZHL16c', capacity = 256, lazy = False):
+        '''
+        :param modelUsed: the model coefficients list used in calculation
+        :type modelUsed: Buhlmann.model
+        :param modelName: name of the model variant, like 'ZHL16c'
+        :type modelName: str
+        :param capacity: number of rows preallocated, doubled whenever the store is full
+        :type capacity: int
+        :param lazy: if True only the tissue pressures, ambient pressure and GF are stored by append(),
+                     the ceilings and lead tissues of all new rows are calculated at once when first read
+        :type lazy: bool
+        '''
+        self.modelUsed = modelUsed
+        self.modelName = modelName
+        self.coefficients = coefficientArrays(modelUsed)
+        self.lazy = lazy
+        self.size = 0
+        # rows up to this one have their ceilings and lead tissue calculated
+        self.derivedRows = 0
+        self.capacity = 0
+        self.time = None
+        self.depth = None
+        self.ambient = None
+        self.nitrogenPressure = None
+        self.heliumPressure = None
+        self.ceilings = None
+        self.leadTissue = None
+        self.gfNow = None
+        self.grow(capacity)
+        # ModelPoint-like views already built, filled only when someone reads them
+        self._views = dict()
+
+    def grow(self, capacity):
+        '''
+        reallocate all columns to the new capacity, keeping the rows stored so far
+        :param capacity: new number of rows
+        :type capacity: int
+        '''
+        def resized(old, shape, dtype=float):
+            new = np.zeros(shape, dtype=dtype)
+            if old is not None:
+                new[:self.size] = old[:self.size]
+            return new
+        self.time = resized(self.time, capacity)
+        self.depth = resized(self.depth, capacity)
+        self.ambient = resized(self.ambient, capacity)
+        self.nitrogenPressure = resized(self.nitrogenPressure, (capacity, self.COMPS))
+        self.heliumPressure = resized(self.heliumPressure, (capacity, self.COMPS))
+        self.ceilings = resized(self.ceilings, (capacity, self.COMPS))
+        self.leadTissue = resized(self.leadTissue, capacity, dtype=np.int8)
+        self.gfNow = resized(self.gfNow, capacity)
+        self.capacity = capacity
+
+    def append(self, model, time, depth):
+        '''
+        record the current state of a ModelPoint or ModelPointVector as a new row
+        :param model: the model state to record
+        :type model: ModelPoint
+        :param time: runtime in seconds
+        :type time: float
+        :param depth: depth in meters
+        :type depth: float
+        :return: index of the new row
+        :rtype: int
+        '''
+        if self.size >= self.capacity:
+            self.grow(self.capacity * 2)
+        row = self.size
+        self.time[row] = time
+        self.depth[row] = depth
+        self.ambient[row] = model.ambient
+        self.heliumPressure[row], self.nitrogenPressure[row] = tissuePressures(model)
+        self.gfNow[row] = model.gfNow
+        if not self.lazy:
+            self.ceilings[row] = model.ceilings
+            self.leadTissue[row] = model.leadTissue
+            self.derivedRows = row + 1
+        self.size += 1
+        return row
+
+    def deriveRows(self):
+        '''
+        calculate the ceilings and the lead tissue of the rows appended in lazy mode, all rows in one go
+        '''
+        if self.derivedRows >= self.size:
+            return
+        rows = slice(self.derivedRows, self.size)
+        c = self.coefficients
+        helium = self.heliumPressure[rows]
+        nitrogen = self.nitrogenPressure[rows]
+        total = helium + nitrogen
+        a = (c.HeliumA * helium + c.NitrogenA * nitrogen) / total
+        b = (c.HeliumB * helium + c.NitrogenB * nitrogen) / total
+        gf = self.gfNow[rows, None]
+        maxAmbBars = (total - a * gf) / (gf / b - gf + 1.0) - Constants.surfacePressure
+        self.ceilings[rows] = maxAmbBars * 10.0
+        self.leadTissue[rows] = np.argmax(self.ceilings[rows], axis=1)
+        self.derivedRows = self.size
+
+    def ceilingRows(self):
+        '''
+        :return: ceilings in meters of all compartments, one row per step
+        :rtype: numpy.ndarray
+        '''
+        self.deriveRows()
+        return self.ceilings[:self.size]
+
+    def trim(self):
+        '''
+        release the unused preallocated rows, when no more rows will be appended
+        '''
+        if self.capacity > self.size:
+            self.grow(max(self.size, 1))
+
+    def copy(self):
+        '''
+        :return: a new store with copies of the rows stored so far
+        :rtype: ModelTrajectory
+        '''
+        new = ModelTrajectory.__new__(ModelTrajectory)
+        new.__dict__.update(self.__dict__)
+        new.capacity = 0
+        new.time = new.depth = new.ambient = None
+        new.nitrogenPressure = new.heliumPressure = new.ceilings = None
+        new.leadTissue = new.gfNow = None
+        new.grow(max(self.size, 1))
+        for name in ['time', 'depth', 'ambient', 'nitrogenPressure', 'heliumPressure',
+                     'ceilings', 'leadTissue', 'gfNow']:
+            getattr(new, name)[:self.size] = getattr(self, name)[:self.size]
+        new._views = dict()
+        return new
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for row in range(self.size):
+            yield self[row]
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.size
+        if row < 0 or row >= self.size:
+            raise IndexError('ModelTrajectory index out of range')
+        view = self._views.get(row)
+        if view is None:
+            view = self.modelPoint(row)
+            self._views[row] = view
+        return view
+
+    def modelPoint(self, row):
+        '''
+        build a ModelPointVector from a stored row, it can be plotted or used to continue calculation
+        :param row: index of the row
+        :type row: int
+        :return: the model state at that row
+        :rtype: ModelPointVector
+        '''
+        self.deriveRows()
+        c = self.coefficients
+        point = ModelPointVector(self.modelName)
+        point.coefficients = c
+        point.setNewPressures(heliumPressure=self.heliumPressure[row].copy(),
+                              nitrogenPressure=self.nitrogenPressure[row].copy())
+        point.ambient = float(self.ambient[row])
+        point.gfNow = float(self.gfNow[row])
+        point.ambTolP = point.ambient / point.HeliumNitrogenB + point.HeliumNitrogenA
+        point.ceilings = self.ceilings[row].tolist()
+        point.leadTissue = int(self.leadTissue[row])
+        point.leadCeilingMeters = point.ceilings[point.leadTissue]
+        point.leadMaxAmbBars = point.leadCeilingMeters / 10.0
+        point.leadCeilingStop = int(math.ceil(point.leadCeilingMeters / 3.0) * 3.0)
+        point.maxNitrogenPressure = float(point.nitrogenPressure.max())
+        point.maxHeliumPressure = float(point.heliumPressure.max())
+        return point
@@ -0,0 +1,221 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_tts.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# time to surface (TTS) if the ascent is started now, along the bottom phase of a calculated plan
+#
+# the tissue state at the end of the descent is taken from the trajectory store of the plan, the bottom
+# states at each step are calculated from it at once with the Haldane equation and the shared decay factors,
+# and each state is forked into timeToSurface() of pydplan_solver. a state needs no other states, so many
+# of them can be spread over a pool of worker processes.
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
+
+from pydplan_buhlmann import depth2absolutePressure, modelTable
+from pydplan_classes import TankType
+from pydplan_expcache import decayFactors
+from pydplan_profiletools import gradientFactor
+from pydplan_solver import timeToSurface
+from pydplan_vector import ModelPointVector
+
+# tanks in the order they are breathed, the ascent goes on with the used tanks after the current one
+TANK_ORDER = (TankType.BOTTOM, TankType.TRAVEL, TankType.DECO1, TankType.DECO2)
+# with fewer exits than this the curve is calculated in this process, a pool costs more than it saves
+POOL_MIN_EXITS = 64
+
+
+def ascentRate(depth, bottomDepth, rateToDeco, rateAtDeco, rateToSurface):
+    '''
+    ascent rate in m/s at depth and the depth where that rate ends, the same as in calculatePlan()
+    '''
+    if depth > (bottomDepth / 2.0):
+        return rateToDeco, bottomDepth / 2.0
+    elif depth > 6.0:
+        return rateAtDeco, 6.0
+    else:
+        return rateToSurface, 0.0
+
+
+def planAscentRate(diveplan, bottomDepth = None):
+    '''
+    :return: ascentRate() with the rates of diveplan, a function of depth that can be sent to worker processes
+    :rtype: functools.partial
+    '''
+    if bottomDepth is None:
+        bottomDepth = diveplan.bottomDepth
+    return partial(ascentRate, bottomDepth=bottomDepth, rateToDeco=diveplan.ascRateToDeco,
+                   rateAtDeco=diveplan.ascRateAtDeco, rateToSurface=diveplan.ascRateToSurface)
+
+
+def ascentTanks(diveplan, tank):
+    '''
+    :return: the tanks of an ascent, the tank breathed now and then the used tanks after it in TANK_ORDER
+    :rtype: list
+    '''
+    tankList = diveplan.tankList
+    current = [tankList[iTank] for iTank in TANK_ORDER].index(tank)
+    return [tank] + [tankList[iTank] for iTank in TANK_ORDER[current + 1:] if tankList[iTank].use]
+
+
+def ascentGases(diveplan, tank, depth):
+    '''
+    the gases of an ascent from depth for timeToSurface(), in the order of ascentTanks()
+
+    :param diveplan: the dive plan with the tanks
+    :type diveplan: DivePlan
+    :param tank: the tank breathed now
+    :type tank: ScubaTank
+    :param depth: depth in meters where the ascent begins
+    :type depth: float
+    :return: (change depth, Helium fraction, Nitrogen fraction) of each gas
+    :rtype: list
+    '''
+    tanks = ascentTanks(diveplan, tank)
+    return [(depth if index == 0 else nextTank.changeDepth, nextTank.he / 100.0,
+             1.0 - (nextTank.he + nextTank.o2) / 100.0) for index, nextTank in enumerate(tanks)]
+
+
+def forkModel(modelUsed, heliumPressure, nitrogenPressure, ambient, gfNow):
+    '''
+    a new model state with the given tissue pressures, the ceilings are calculated for ambient and gfNow
+    :rtype: ModelPointVector
+    '''
+    model = ModelPointVector()
+    model.useCoefficients(modelUsed)
+    model.setNewPressures(heliumPressure=np.array(heliumPressure, dtype=float),
+                          nitrogenPressure=np.array(nitrogenPressure, dtype=float))
+    model.ambient = ambient
+    model.gfNow = gfNow
+    model.updateCeilings()
+    return model
+
+
+class TtsCurve():
+    """
+    time to surface at each exit time along the bottom of a plan
+    """
+    def __init__(self, runtime, tts, firstStop):
+        '''
+        :param runtime: exit times, runtime in seconds when the ascent begins
+        :type runtime: numpy.ndarray
+        :param tts: time to surface in seconds from each exit time, math.inf if the ascent cannot be completed
+        :type tts: numpy.ndarray
+        :param firstStop: depth of the first deco stop in meters, 0.0 if none
+        :type firstStop: numpy.ndarray
+        '''
+        self.runtime = runtime
+        self.tts = tts
+        self.firstStop = firstStop
+
+    def __len__(self):
+        return len(self.runtime)
+
+    def surfacing(self):
+        '''
+        :return: runtime in seconds at the surface for each exit time
+        :rtype: numpy.ndarray
+        '''
+        return self.runtime + self.tts
+
+
+def bottomEnd(diveplan):
+    '''
+    :param diveplan: a plan calculated by calculatePlan() in Calculate mode
+    :type diveplan: DivePlan
+    :return: index of the profile point at the end of the bottom time
+    :rtype: int
+    :raises ValueError: if the plan has no bottom phase
+    '''
+    profile = diveplan.profileSampled
+    for index, point in enumerate(profile):
+        if point.time == diveplan.ascentBegins and point.depth == diveplan.bottomDepth:
+            if index > 0 and profile[index - 1].depth == diveplan.bottomDepth:
+                return index
+            break
+    raise ValueError('the plan has no bottom phase, calculate it in Calculate mode first')
+
+
+def bottomStates(diveplan, step = 60.0):
+    '''
+    the tissue states along the bottom of a calculated plan, every step seconds from the end of the descent
+    and at the end of the bottom time
+
+    :param diveplan: a plan calculated by calculatePlan() in Calculate mode
+    :type diveplan: DivePlan
+    :param step: seconds between the states
+    :type step: float
+    :return: runtimes in seconds, Helium and Nitrogen pressures with one row of compartments per runtime,
+             and the tank breathed at the bottom
+    :rtype: tuple
+    :raises ValueError: if the plan has no bottom phase
+    '''
+    profile = diveplan.profileSampled
+    end = bottomEnd(diveplan)
+    start = profile[end - 1]
+    tank = profile[end].tank
+    trajectory = start.trajectory
+    heliumStart = trajectory.heliumPressure[start.modelRow]
+    nitrogenStart = trajectory.nitrogenPressure[start.modelRow]
+
+    runtime = np.arange(start.time, diveplan.ascentBegins, step)
+    runtime = np.append(runtime, diveplan.ascentBegins)
+    minutes = (runtime - start.time) / 60.0
+    ambient = depth2absolutePressure(diveplan.bottomDepth)
+    waterVapor = trajectory[start.modelRow].waterVapor
+    heliumInspired = (ambient - waterVapor) * tank.he / 100.0
+    nitrogenInspired = (ambient - waterVapor) * (1.0 - (tank.he + tank.o2) / 100.0)
+    # the Haldane equation as in ModelPointVector.calculateAllTissues(), one row per exit time
+    c = trajectory.coefficients
+    expHe = decayFactors.rows(c, 'He', minutes)
+    expN2 = decayFactors.rows(c, 'N2', minutes)
+    helium = heliumStart + (heliumInspired - heliumStart) * (1.0 - expHe)
+    nitrogen = nitrogenStart + (nitrogenInspired - nitrogenStart) * (1.0 - expN2)
+    return runtime, helium, nitrogen, tank
+
+
+def exitTts(state, modelName, depth, gases, GFlow, GFhigh, rate):
+    '''
+    time to surface from one bottom state, runs in a worker process
+    :param state: Helium and Nitrogen pressures of the compartments
+    :type state: tuple
+    :return: seconds to surface and the depth of the first stop
+    :rtype: tuple
+    '''
+    modelUsed = modelTable(modelName).modelUsed
+    gfObject = gradientFactor(GFlow=GFlow, GFhigh=GFhigh)
+    model = forkModel(modelUsed, state[0], state[1], depth2absolutePressure(depth), GFlow)
+    seconds, stops = timeToSurface(model, modelUsed, depth, gases, gfObject, rate)
+    return seconds, stops[0][0] if stops else 0.0
+
+
+def ttsCurve(diveplan, step = 60.0, workers = 1, chunksize = 8):
+    '''
+    time to surface if the ascent is started at each step of the bottom phase
+
+    :param diveplan: a plan calculated by calculatePlan() in Calculate mode
+    :type diveplan: DivePlan
+    :param step: seconds between the exit times
+    :type step: float
+    :param workers: number of worker processes, 1 calculates in this process,
+                    also curves with fewer than POOL_MIN_EXITS exits are calculated in this process
+    :type workers: int
+    :param chunksize: number of exit times sent to a worker at a time
+    :type chunksize: int
+    :return: the curve, its last point is the ascent of the plan itself
+    :rtype: TtsCurve
+    '''
+    runtime, helium, nitrogen, tank = bottomStates(diveplan, step)
+    depth = diveplan.bottomDepth
+    solve = partial(exitTts, modelName=diveplan.model.modelName, depth=depth,
+                    gases=ascentGases(diveplan, tank, depth),
+                    GFlow=diveplan.GFlow, GFhigh=diveplan.GFhigh, rate=planAscentRate(diveplan))
+    states = list(zip(helium, nitrogen))
+    if workers > 1 and len(states) >= POOL_MIN_EXITS:
+        with Pool(workers) as pool:
+            results = pool.map(solve, states, chunksize=max(chunksize, 1))
+    else:
+        results = list(map(solve, states))
+    tts = np.array([seconds for seconds, firstStop in results])
+    firstStop = np.array([firstStop for seconds, firstStop in results])
+    return TtsCurve(runtime, tts, firstStop)
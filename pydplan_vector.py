@@ -0,0 +1,317 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_vector.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# vectorized NumPy engine for the Bühlmann 16 compartment tissue model
+#
+# ModelPointVector is a drop-in replacement for pydplan_buhlmann.ModelPoint,
+# all 16 compartments are stored as NumPy arrays and updated in a few array operations
+# instead of looping over 16 Compartment objects in Python
+import math
+import numpy as np
+
+from pydplan_buhlmann import Compartment, Constants, depth2absolutePressure, tableOfModel
+from pydplan_expcache import decayFactors
+
+
+class CoefficientArrays():
+    """
+    the coefficients of one Buhlmann model variant as 16 element NumPy arrays
+    """
+    def __init__(self, modelUsed):
+        '''
+        :param modelUsed: the model coefficients list, one tcCoefficients object per compartment
+        :type modelUsed: Buhlmann.model
+        '''
+        self.modelUsed = modelUsed
+        self.NitrogenK = np.array([c.NitrogenK for c in modelUsed])
+        self.HeliumK   = np.array([c.HeliumK for c in modelUsed])
+        self.NitrogenA = np.array([c.NitrogenA for c in modelUsed])
+        self.NitrogenB = np.array([c.NitrogenB for c in modelUsed])
+        self.HeliumA   = np.array([c.HeliumA for c in modelUsed])
+        self.HeliumB   = np.array([c.HeliumB for c in modelUsed])
+
+
+def coefficientArrays(modelUsed):
+    '''
+    the coefficients as arrays, the shared ModelTable if modelUsed is one of the module tables
+    :param modelUsed: the model coefficients list
+    :type modelUsed: Buhlmann.model
+    :return: the coefficients as arrays
+    :rtype: CoefficientArrays or ModelTable
+    '''
+    table = tableOfModel(modelUsed)
+    if table is not None:
+        return table
+    return CoefficientArrays(modelUsed)
+
+
+def tissuePressures(model):
+    '''
+    Helium and Nitrogen pressures of all compartments of a ModelPoint or ModelPointVector as arrays
+    :param model: the model state
+    :type model: ModelPoint
+    :return: Helium and Nitrogen pressures
+    :rtype: tuple
+    '''
+    if isinstance(model, ModelPointVector):
+        return model.heliumPressure, model.nitrogenPressure
+    return (np.array([comp.heliumPressure for comp in model.tissues]),
+            np.array([comp.nitrogenPressure for comp in model.tissues]))
+
+
+class ModelPointVector():
+    """
+    object that stores a Buhlmann model state for 16 tissue compartments as NumPy arrays,
+    gives the same results as ModelPoint
+    """
+    COMPS = 16
+
+    def __init__(self, modelUsed = 'ZHL16c'):
+        self.modelUsed = modelUsed
+        self.coefficients = None
+
+        self.ambient = 0.0 # store the ambient pressure used to calculate this point
+        self.leadMaxAmbBars = -100.0
+        self.ceilings = [0.0] * self.COMPS
+        self.gfNow = 1.0
+        self.leadTissue = -1
+        self.leadCeilingMeters = -100.0
+        self.leadCeilingStop = -1
+
+        self.leadCeilingBarsNitrogen = 0.0
+        self.leadCeilingBarsHelium = 0.0
+        self.maxNitrogenPressure = 0.0
+        self.maxHeliumPressure = 0.0
+
+        # store water wapor partial pressure
+        self.waterVapor =  Constants.WaterVaporSurface
+
+        # tissue compartment state, one element per compartment
+        self.heliumPressure   = np.zeros(self.COMPS)
+        self.nitrogenPressure = np.zeros(self.COMPS)
+        self.HeliumNitrogenA  = np.zeros(self.COMPS)
+        self.HeliumNitrogenB  = np.zeros(self.COMPS)
+        self.mv      = np.zeros(self.COMPS)
+        self.ambTolP = np.zeros(self.COMPS)
+        # Compartment objects are built only when someone asks for self.tissues
+        self._tissues = None
+
+    def __deepcopy__(self, memo):
+        newobj = self.__class__.__new__(self.__class__)
+        newobj.__dict__.update(self.__dict__)
+        # copy the arrays and the ceilings list that are stored, ModelPointLazy may not have them all
+        for name, value in self.__dict__.items():
+            if isinstance(value, (np.ndarray, list)):
+                newobj.__dict__[name] = value.copy()
+        newobj._tissues = None
+        return newobj
+
+    @property
+    def tissues(self):
+        '''
+        list of Compartment objects built from the arrays, for plotting and table code
+        that accesses model.tissues[tc].nitrogenPressure etc.
+        :return: list of 16 Compartment objects
+        :rtype: list
+        '''
+        if self._tissues is None:
+            self._tissues = []
+            for index in range(self.COMPS):
+                comp = Compartment(index)
+                comp.heliumPressure = float(self.heliumPressure[index])
+                comp.nitrogenPressure = float(self.nitrogenPressure[index])
+                comp.HeliumNitrogenA = float(self.HeliumNitrogenA[index])
+                comp.HeliumNitrogenB = float(self.HeliumNitrogenB[index])
+                comp.mv = float(self.mv[index])
+                comp.ambTolP = float(self.ambTolP[index])
+                self._tissues.append(comp)
+        return self._tissues
+
+    def useCoefficients(self, mc):
+        '''
+        convert the model coefficients list to arrays, only if it was changed
+        :param mc: the model coefficients list
+        :type mc: Buhlmann.model
+        :return: the coefficients as arrays
+        :rtype: CoefficientArrays
+        '''
+        if self.coefficients is None or self.coefficients.modelUsed is not mc:
+            self.coefficients = coefficientArrays(mc)
+        return self.coefficients
+
+    def initSurface(self, mc):
+        self.useCoefficients(mc)
+        self.setNewPressures(heliumPressure=np.zeros(self.COMPS),
+                             nitrogenPressure=np.full(self.COMPS, Constants.initN2))
+
+    def setNewPressures(self, heliumPressure, nitrogenPressure):
+        '''set new pressures to all tissue compartments, and update the HeliumNitrogen A&B coefficients
+        same as Compartment.setNewPressures() but for all compartments at once
+
+        :param heliumPressure: new Helium partial pressures for all compartments
+        :type heliumPressure: numpy.ndarray
+        :param nitrogenPressure: new Nitrogen partial pressures for all compartments
+        :type nitrogenPressure: numpy.ndarray
+        :return: nothing
+        :rtype: None
+        '''
+        c = self.coefficients
+        self.heliumPressure = heliumPressure
+        self.nitrogenPressure = nitrogenPressure
+        totalPressure = heliumPressure + nitrogenPressure
+        self.HeliumNitrogenA = (c.HeliumA * heliumPressure + c.NitrogenA * nitrogenPressure) / totalPressure
+        self.HeliumNitrogenB = (c.HeliumB * heliumPressure + c.NitrogenB * nitrogenPressure) / totalPressure
+        self.mv = totalPressure / (Constants.surfacePressure / self.HeliumNitrogenB + self.HeliumNitrogenA)
+        self._tissues = None
+
+    def get_max_amb(self, gf):
+        '''
+        :return: tolerated ambient pressures of all compartments for the gradient factor gf
+        :rtype: numpy.ndarray
+        '''
+        return (((self.heliumPressure + self.nitrogenPressure) - self.HeliumNitrogenA * gf) /
+                (gf / self.HeliumNitrogenB - gf + 1.0))
+
+    def control_compartment(self, gradient):
+        pressure = self.get_max_amb(gradient) - Constants.surfacePressure
+        if pressure.max() > 0.0:
+            return int(np.argmax(pressure)) + 1
+        return 1
+
+    def ceiling(self, gradient):
+        pressure = max(0.0, float((self.get_max_amb(gradient) - Constants.surfacePressure).max()))
+        return pressure * 10.0
+
+    def ceiling_in_pabs(self, gradient):
+        return max(0.0, float(self.get_max_amb(gradient).max()))
+
+    def m_value(self, pressure):
+        p_absolute = pressure + Constants.surfacePressure
+        mv = ((self.heliumPressure + self.nitrogenPressure) /
+              (p_absolute / self.HeliumNitrogenB + self.HeliumNitrogenA))
+        return max(0.0, float(mv.max()))
+
+    def calculateAllTissues(self, modelUsed, beginPressure, endPressure,
+                            intervalMinutes,  # in minutes
+                            heliumFraction, nitrogenFraction, gfNow):
+        ''' Calculate all tissue compartments for the given model constants, see ModelPoint.calculateAllTissues()
+        :param modelUsed: the model coefficients list to be used in calculation
+        :type modelUsed: Buhlmann.model
+        :param beginPressure: bar of pressure at begin of the segment calculated
+        :type beginPressure: float
+        :param endPressure: bar of pressure at end of the segment calculated
+        :type endPressure: float
+        :param intervalMinutes: minutes of exposure of the segment
+        :type intervalMinutes: float
+        :param heliumFraction: fraction of Helium, 1.0 = 100%, 0.0 = no helium
+        :type heliumFraction: float
+        :param nitrogenFraction: fraction of Nitrogen
+        :type nitrogenFraction: float
+        :param gfNow: gradient factor for ceiling calculation
+        :type gfNow: float
+        :return: nothing
+        :rtype: None
+        '''
+        c = self.useCoefficients(modelUsed)
+        heliumInspired = (beginPressure - self.waterVapor) * heliumFraction
+        nitrogenInspired = (beginPressure - self.waterVapor) * nitrogenFraction
+
+        if beginPressure == endPressure :
+            # constant depth case, gas rate not changing
+            heliumBarPerMin = 0.0
+            nitrogenBarPerMin = 0.0
+        else:
+            # ascending or descending, calculate BAR/min change rate for inert gases
+            barPerMin = (endPressure - beginPressure) / intervalMinutes
+            heliumBarPerMin   = barPerMin * heliumFraction
+            nitrogenBarPerMin = barPerMin * nitrogenFraction
+
+        expHe = decayFactors.get(c, 'He', intervalMinutes).array
+        expN2 = decayFactors.get(c, 'N2', intervalMinutes).array
+        if heliumBarPerMin != 0 or nitrogenBarPerMin != 0:
+            # ascending or descending -> Schreiner equation, as in Compartment.calculateCompartment()
+            heliumNew = (heliumInspired + heliumBarPerMin * (intervalMinutes - (1.0 / c.HeliumK)) -
+                         (heliumInspired - self.heliumPressure - (heliumBarPerMin / c.HeliumK)) * expHe)
+            nitrogenNew = (nitrogenInspired + nitrogenBarPerMin * (intervalMinutes - (1.0 / c.NitrogenK)) -
+                           (nitrogenInspired - self.nitrogenPressure - (nitrogenBarPerMin / c.NitrogenK)) * expN2)
+        else:
+            # at constant depth -> Haldane equation
+            heliumNew = self.heliumPressure + (heliumInspired - self.heliumPressure) * (1.0 - expHe)
+            nitrogenNew = self.nitrogenPressure + (nitrogenInspired - self.nitrogenPressure) * (1.0 - expN2)
+        self.setNewPressures(heliumPressure=heliumNew, nitrogenPressure=nitrogenNew)
+
+        self.ambient = endPressure
+        self.gfNow = gfNow
+        self.updateCeilings()
+        # search for maximum pressures
+        maxNitrogen = float(nitrogenNew.max())
+        if maxNitrogen > 0.0:
+            self.maxNitrogenPressure = maxNitrogen
+        maxHelium = float(heliumNew.max())
+        if maxHelium > 0.0:
+            self.maxHeliumPressure = maxHelium
+
+    def updateCeilings(self):
+        '''
+        calculate the tolerated ambient pressures and the ceilings of all compartments
+        for the current ambient pressure and gfNow, and find the leading tissue
+        '''
+        self.ambTolP = self.ambient / self.HeliumNitrogenB + self.HeliumNitrogenA
+        # the actual ceilings to use, based on gfNow
+        maxAmbBars = self.get_max_amb(self.gfNow) - Constants.surfacePressure
+        ceilings = maxAmbBars * 10.0
+        self.ceilings = ceilings.tolist()
+        # find out the leading tissue and record it, first one wins on a tie like in ModelPoint
+        lead = int(np.argmax(ceilings))
+        if ceilings[lead] > -100.0:
+            self.leadTissue = lead
+            self.leadMaxAmbBars = float(maxAmbBars[lead])
+            self.leadCeilingMeters = self.ceilings[lead]
+            self.leadCeilingStop = int(math.ceil(self.leadCeilingMeters / 3.0) * 3.0)
+
+    def calculateAllTissuesDepth(self, modelUsed, beginDepth, endDepth,
+                            intervalMinutes,  # in minutes
+                            heliumFraction, nitrogenFraction, gfNow):
+        """
+        same as calculateAllTissues() but depths as arguments, instead of pressures
+        """
+        beginPressure = depth2absolutePressure(beginDepth)
+        endPressure = depth2absolutePressure(endDepth)
+        self.calculateAllTissues(modelUsed, beginPressure, endPressure,
+                                intervalMinutes,  # in minutes
+                                heliumFraction, nitrogenFraction, gfNow)
+
+
+class ModelPointLazy(ModelPointVector):
+    """
+    ModelPointVector that stores only the inert gas pressures, the ambient pressure and gfNow of each step.
+    the combined A&B coefficients, M-values, tolerated pressures and ceilings are calculated
+    when they are read for the first time after the step, so a step nobody looks at costs only the
+    Haldane or Schreiner equation
+    """
+    # attributes calculated from the tissue pressures only
+    PRESSURE_DERIVED = ('HeliumNitrogenA', 'HeliumNitrogenB', 'mv')
+    # attributes calculated from the tissue pressures, the ambient pressure and gfNow
+    STEP_DERIVED = ('ambTolP', 'ceilings', 'leadTissue', 'leadMaxAmbBars', 'leadCeilingMeters', 'leadCeilingStop')
+
+    def __getattr__(self, name):
+        # called only for attributes that are not stored, that is the derived ones after a new step
+        if name in ModelPointLazy.PRESSURE_DERIVED:
+            ModelPointVector.setNewPressures(self, self.heliumPressure, self.nitrogenPressure)
+        elif name in ModelPointLazy.STEP_DERIVED:
+            ModelPointVector.updateCeilings(self)
+        else:
+            raise AttributeError(name)
+        return self.__dict__[name]
+
+    def setNewPressures(self, heliumPressure, nitrogenPressure):
+        self.heliumPressure = heliumPressure
+        self.nitrogenPressure = nitrogenPressure
+        for name in ModelPointLazy.PRESSURE_DERIVED:
+            self.__dict__.pop(name, None)
+        self._tissues = None
+
+    def updateCeilings(self):
+        for name in ModelPointLazy.STEP_DERIVED:
+            self.__dict__.pop(name, None)
@@ -0,0 +1,200 @@
+#
+# (c) 2018 Ian Leiman, ian.leiman@gmail.com
+# pydplan_zfactor.py
+# part of PYDPLAN, a Python Dive Planner with PyQt5 GUI
+# real gas tank pressures, a precomputed compressibility (Z factor) table of Van der Waals gas mixes
+#
+# with the ideal gas law a tank of V liters at p bar holds p * V surface liters. at 232 and 300 bar fills,
+# and for Helium rich mixes, the gas is less compressible than that and the tank holds less gas, so the
+# ideal pressure drop overstates the reserve. vdw_calc.py solves the Van der Waals equation with fsolve()
+# for each state, which is too slow to do at every profile point, so the equation is solved here once for
+# a grid of pressure x O2 x He x temperature, and Z is interpolated from the grid by index arithmetic.
+import numpy as np
+
+from pydplan_buhlmann import Constants
+from vdw_calc import ideal_gas_n, vdw_mix_ab
+
+# gas constant in l bar / (K mol), the same as in vdw_calc.py
+R = 0.0831451
+# grid of the table: pressure in bar, O2 and He fractions, temperature in Celsius
+PRESSURE_GRID = (0.0, 500.0, 5.0)
+FRACTION_GRID = (0.0, 1.0, 0.05)
+TEMPERATURE_GRID = (-10.0, 50.0, 5.0)
+# the gas in the tanks is at this temperature during the dive
+TANK_TEMPERATURE = float(Constants.surfaceTemperature)
+# Newton iterations when solving the Van der Waals equation for the mols, 6 reach the rounding error
+NEWTON_STEPS = 8
+
+
+def gridAxis(grid):
+    '''
+    :return: the values of a (first, last, step) grid, last included
+    :rtype: numpy.ndarray
+    '''
+    first, last, step = grid
+    return np.linspace(first, last, int(round((last - first) / step)) + 1)
+
+
+def solveMols(p, V, T, a, b):
+    '''
+    mols n in volume V at pressure p, the root of van_der_waals_n() of vdw_calc.py, by Newton iteration
+    seeded with the ideal gas law like in vdw_solve_mols(). works on NumPy arrays, so a whole grid is solved
+    at once
+
+    :param p: pressure in bar
+    :param V: volume in liters
+    :param T: temperature in Kelvin
+    :param a: Van der Waals a of the mix, vdw_mix_ab()
+    :param b: Van der Waals b of the mix, vdw_mix_ab()
+    :return: mols
+    :rtype: numpy.ndarray
+    '''
+    n = ideal_gas_n(p, V, T)
+    for _ in range(NEWTON_STEPS):
+        f = (p + n * n * a / (V * V)) * (V - n * b) - n * R * T
+        df = 2.0 * n * a / (V * V) * (V - n * b) - b * (p + n * n * a / (V * V)) - R * T
+        n = n - f / df
+    return n
+
+
+class ZTable():
+    """
+    compressibility Z = pV / (nRT) of O2, He, N2 mixes over a grid of pressure x O2 x He x temperature
+    """
+    def __init__(self, pressureGrid = PRESSURE_GRID, fractionGrid = FRACTION_GRID,
+                 temperatureGrid = TEMPERATURE_GRID):
+        '''
+        :param pressureGrid: (first, last, step) in bar
+        :type pressureGrid: tuple
+        :param fractionGrid: (first, last, step) of the O2 and He fractions
+        :type fractionGrid: tuple
+        :param temperatureGrid: (first, last, step) in Celsius
+        :type temperatureGrid: tuple
+        '''
+        self.grids = (pressureGrid, fractionGrid, fractionGrid, temperatureGrid)
+        pressure, o2, he, temperature = (gridAxis(grid) for grid in self.grids)
+        # the mixing rules are quadratic in the fractions, so a and b are also defined where O2 + He > 1,
+        # those cells are only used for interpolating the mixes next to them
+        mixAB = np.array([[vdw_mix_ab(o2_f, he_f, 1.0 - o2_f - he_f) for he_f in he] for o2_f in o2])
+        a = mixAB[np.newaxis, :, :, 0, np.newaxis]
+        b = mixAB[np.newaxis, :, :, 1, np.newaxis]
+        p = pressure[:, np.newaxis, np.newaxis, np.newaxis]
+        T = temperature[np.newaxis, np.newaxis, np.newaxis, :] + 273.0
+        n = solveMols(p, 1.0, T, a, b)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = p / (n * R * T)
+        # at zero pressure the gas is ideal
+        z[0] = 1.0
+        self.z = z
+        self.shape = np.array(z.shape)
+
+    def __call__(self, pressure, o2, he, temperature = TANK_TEMPERATURE):
+        '''
+        Z interpolated from the 16 grid points around the state, pressures outside of the grid are
+        extrapolated from the nearest cell
+
+        :param pressure: pressure in bar, a float or a NumPy array
+        :param o2: O2 fraction 0.0 ... 1.0
+        :type o2: float
+        :param he: He fraction 0.0 ... 1.0
+        :type he: float
+        :param temperature: temperature in Celsius
+        :type temperature: float
+        :return: Z, with the shape of pressure
+        '''
+        pressure = np.asarray(pressure, dtype=float)
+        state = (pressure, o2, he, temperature)
+        # index of the cell and the position in it along each axis, found by index arithmetic
+        cells = []
+        for value, (first, last, step), size in zip(state, self.grids, self.shape):
+            position = (value - first) / step
+            index = np.clip(np.floor(position).astype(int), 0, size - 2)
+            cells.append((index, position - index))
+        z = 0.0
+        for corner in range(16):
+            weight = 1.0
+            index = []
+            for axis, (cell, fraction) in enumerate(cells):
+                if corner >> axis & 1:
+                    weight = weight * fraction
+                    index.append(cell + 1)
+                else:
+                    weight = weight * (1.0 - fraction)
+                    index.append(cell)
+            z = z + weight * self.z[tuple(index)]
+        return z
+
+
+# the table is built when it is first used, it takes a fraction of a second
+zTable = None
+# surface liters per liter of tank volume at each pressure of the grid, for each gas
+contentCurves = {}
+
+
+def compressibility(pressure, o2, he, temperature = TANK_TEMPERATURE):
+    '''
+    Z of a mix from the shared ZTable
+
+    :param pressure: pressure in bar, a float or a NumPy array
+    :param o2: O2 fraction 0.0 ... 1.0
+    :param he: He fraction 0.0 ... 1.0
+    :param temperature: temperature in Celsius
+    :return: Z
+    '''
+    global zTable
+    if zTable is None:
+        zTable = ZTable()
+    return zTable(pressure, o2, he, temperature)
+
+
+def contentCurve(o2, he):
+    '''
+    :param o2: O2 in percent
+    :param he: He in percent
+    :return: the pressure grid in bar and the surface liters of gas per liter of tank volume at each pressure
+    :rtype: tuple
+    '''
+    key = (float(o2), float(he))
+    if key not in contentCurves:
+        pressure = gridAxis(PRESSURE_GRID)
+        o2_f, he_f = o2 / 100.0, he / 100.0
+        # the same amount of gas takes p / Z(p) * Z(surface) liters at the surface
+        surfaceZ = compressibility(Constants.surfacePressure, o2_f, he_f)
+        contentCurves[key] = (pressure, pressure / compressibility(pressure, o2_f, he_f) * surfaceZ)
+    return contentCurves[key]
+
+
+def extrapolate(x, xGrid, yGrid):
+    '''
+    np.interp() that goes on along the first and the last segment outside of the grid
+    '''
+    x = np.asarray(x, dtype=float)
+    index = np.clip(np.searchsorted(xGrid, x) - 1, 0, len(xGrid) - 2)
+    slope = (yGrid[index + 1] - yGrid[index]) / (xGrid[index + 1] - xGrid[index])
+    return yGrid[index] + (x - xGrid[index]) * slope
+
+
+def gasContent(tank, pressure):
+    '''
+    surface liters of gas in a tank at a pressure, the real gas version of pressure * tank.liters
+
+    :param tank: the tank, its size and gas are used
+    :type tank: ScubaTank
+    :param pressure: tank pressure in bar, a float or a NumPy array
+    :return: surface liters
+    '''
+    pressureGrid, content = contentCurve(tank.o2, tank.he)
+    return tank.liters * extrapolate(pressure, pressureGrid, content)
+
+
+def tankPressure(tank, liters):
+    '''
+    tank pressure when a tank holds liters of gas, the inverse of gasContent()
+
+    :param tank: the tank, its size and gas are used
+    :type tank: ScubaTank
+    :param liters: surface liters of gas in the tank, a float or a NumPy array
+    :return: tank pressure in bar
+    '''
+    pressureGrid, content = contentCurve(tank.o2, tank.he)
+    return extrapolate(np.asarray(liters, dtype=float) / tank.liters, content, pressureGrid)
@@ -10,7 +10,6 @@
 #    and there is no error checking what so ever, so crashes are more than likely
 
 import math
-from scipy.optimize import fsolve
 
 class GasMix():
     def __init__(self, o2_f, he_f, name, mols, pressure, temp_C, volume):
@@ -80,6 +79,8 @@ def vdw_solve_pressure(mols, volume, o2_f, he_f, n2_f, temperature):
     :return:
     :rtype:
     '''
+    # scipy is only needed by the solvers, the rest of the module is used by the planner without it
+    from scipy.optimize import fsolve
     temp_K = temperature +273.0
     mix_a, mix_b = vdw_mix_ab(o2_f, he_f, n2_f)
     seed_p = ideal_gas_p(n=mols, V=volume, T=temp_K)
@@ -105,6 +106,7 @@ def vdw_solve_mols(pressure, volume, o2_f, he_f, n2_f, temperature):
     :return:
     :rtype:
     '''
+    from scipy.optimize import fsolve
     temp_K = temperature +273.0
     mix_a, mix_b = vdw_mix_ab(o2_f, he_f, n2_f)
     seed_n = ideal_gas_n(pressure, volume, temp_K)